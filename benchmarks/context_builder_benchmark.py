@@ -0,0 +1,63 @@
+"""
+Measures how long it takes to pick the message history sent with each chat turn.
+
+Compares the old loop, which counted and inserted one message at a time, with
+history_window on a MessageHistory, which binary-searches running token sums:
+
+    python benchmarks/context_builder_benchmark.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+import token_counter  # noqa: E402
+from chat import create_chat_message  # noqa: E402
+from message_history import MessageHistory, history_window  # noqa: E402
+
+MODEL = "gpt-3.5-turbo"
+HISTORY_SIZE = 10000
+NUMBER = 20
+
+
+def make_history():
+    history = MessageHistory()
+    for i in range(HISTORY_SIZE // 2):
+        history.append(create_chat_message("user", f"Determine which next command to use, turn {i}"))
+        history.append(create_chat_message("assistant", f'{{"command": {{"name": "google", "args": {{"input": "query {i}"}}}}}}'))
+    return history
+
+
+def insert_loop(context, history, budget):
+    used = 0
+    index = len(history) - 1
+    insertion_index = len(context)
+    while index >= 0:
+        tokens_to_add = token_counter.count_message_tokens([history[index]], MODEL)
+        if used + tokens_to_add > budget:
+            break
+        context.insert(insertion_index, history[index])
+        used += tokens_to_add
+        index -= 1
+    return context
+
+
+def prefix_sum_slice(context, history, budget):
+    first_message_index, _ = history_window(history, budget, MODEL)
+    context[len(context):] = history[first_message_index:]
+    return context
+
+
+def main():
+    history = make_history()
+    # Count every message once so both variants only pay for packing
+    history.prefix_sums(MODEL)
+    print(f"{HISTORY_SIZE} messages")
+    for budget in (3000, 100000, 10 ** 9):
+        for name, build in (("insert loop", insert_loop), ("prefix sums", prefix_sum_slice)):
+            seconds = timeit.timeit(lambda: build([], history, budget), number=NUMBER)
+            print(f"{name:<16}budget {budget:>10}{seconds / NUMBER * 1e3:>10.2f} ms/turn")
+
+
+if __name__ == "__main__":
+    main()
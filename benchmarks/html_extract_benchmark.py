@@ -0,0 +1,55 @@
+"""
+Compares the HTML extraction backends on the saved pages in benchmarks/pages.
+
+For every page it reports the throughput of each backend and whether its text
+and links match those of the soup backend, the BeautifulSoup html.parser path
+browse used before.
+
+    python benchmarks/html_extract_benchmark.py [number of runs]
+"""
+import difflib
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+from html_extract import EXTRACTORS, get_extractor  # noqa: E402
+
+PAGES = os.path.join(os.path.dirname(__file__), 'pages', '*.html')
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() if a != b else 1.0
+
+
+def main(number=20):
+    reference = get_extractor("soup")
+    extractors = [get_extractor(name) for name in EXTRACTORS]
+    totals = {extractor.name: 0.0 for extractor in extractors}
+    total_bytes = 0
+
+    print(f"{'page':<24}{'KB':>7}" + "".join(f"{extractor.name + ' MB/s':>14}" for extractor in extractors)
+          + f"{'text match':>12}{'links match':>13}")
+    for path in sorted(glob.glob(PAGES)):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        size = len(html.encode("utf-8"))
+        total_bytes += size * number
+        expected_text, expected_links = reference.extract(html)
+
+        row = f"{os.path.basename(path):<24}{size / 1024:>7.0f}"
+        for extractor in extractors:
+            seconds = timeit.timeit(lambda: extractor.extract(html), number=number)
+            totals[extractor.name] += seconds
+            row += f"{size * number / seconds / 1e6:>14.2f}"
+
+        text, links = get_extractor("lxml").extract(html)
+        row += f"{similarity(text, expected_text):>12.4f}{similarity(links, expected_links):>13.4f}"
+        print(row)
+
+    print("total" + " " * 26 + "".join(f"{total_bytes / totals[extractor.name] / 1e6:>14.2f}" for extractor in extractors))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,70 @@
+"""
+Measures the per-call overhead of token counting.
+
+Compares resolving the encoding on every call, as token_counter used to do,
+with the memoized encodings in token_counter, and counting many strings one
+by one with counting them in a single encode_batch call.
+
+    python benchmarks/token_counter_benchmark.py
+"""
+import os
+import sys
+import timeit
+
+import tiktoken
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
+import token_counter  # noqa: E402
+
+MESSAGES = [
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "Summarize the following text in one sentence."},
+]
+TEXT = "Auto-GPT counts tokens for every message it sends. " * 4
+NUMBER = 2000
+CHUNKS = [f"Chunk {i} of a scraped page. " * 50 for i in range(200)]
+
+
+def uncached_count_string_tokens(string, model_name):
+    return len(tiktoken.encoding_for_model(model_name).encode(string))
+
+
+def uncached_count_message_tokens(messages, model):
+    encoding = tiktoken.encoding_for_model(model)
+    if model == "gpt-3.5-turbo":
+        return uncached_count_message_tokens(messages, "gpt-3.5-turbo-0301")
+    num_tokens = 0
+    for message in messages:
+        num_tokens += 4
+        for value in message.values():
+            num_tokens += len(encoding.encode(value))
+    return num_tokens + 3
+
+
+def report(name, seconds):
+    print(f"{name:<40}{seconds / NUMBER * 1e6:>10.1f} us/call")
+
+
+def main():
+    model = "gpt-3.5-turbo"
+    # Load the BPE file once so neither variant pays for it
+    token_counter.count_string_tokens(TEXT, model)
+
+    report("count_string_tokens (uncached)",
+           timeit.timeit(lambda: uncached_count_string_tokens(TEXT, model), number=NUMBER))
+    report("count_string_tokens (memoized)",
+           timeit.timeit(lambda: token_counter.count_string_tokens(TEXT, model), number=NUMBER))
+    report("count_message_tokens (uncached)",
+           timeit.timeit(lambda: uncached_count_message_tokens(MESSAGES, model), number=NUMBER))
+    report("count_message_tokens (memoized)",
+           timeit.timeit(lambda: token_counter.count_message_tokens(MESSAGES, model), number=NUMBER))
+
+    number = 20
+    one_by_one = timeit.timeit(lambda: [token_counter.count_string_tokens(chunk, model) for chunk in CHUNKS], number=number)
+    batched = timeit.timeit(lambda: token_counter.count_strings_tokens(CHUNKS, model), number=number)
+    print(f"{'200 chunks one by one':<40}{one_by_one / number * 1e3:>10.1f} ms")
+    print(f"{'200 chunks with count_strings_tokens':<40}{batched / number * 1e3:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,7 @@ def create_agent(task, prompt, model):
     agent_reply = create_chat_completion(
         model=model,
         messages=messages,
+        call_site="start_agent",
     )
 
     # Update full message history
@@ -46,6 +47,7 @@ def message_agent(key, message):
     agent_reply = create_chat_completion(
         model=model,
         messages=messages,
+        call_site="message_agent",
     )
 
     # Update full message history
@@ -1,5 +1,8 @@
+import hashlib
+import json
 import yaml
 import os
+import token_counter
 from prompt import get_prompt
 
 
@@ -31,6 +34,8 @@ class AIConfig:
 
     # Soon this will go in a folder where it remembers more stuff about the run(s)
     SAVE_FILE = os.path.join(os.path.dirname(__file__), '..', 'ai_settings.yaml')
+    # Token counts of the full prompt, so the unchanged prompt is not tokenized on every start
+    PROMPT_CACHE_FILE = os.path.join(os.path.dirname(__file__), '..', 'ai_settings.prompt_cache.json')
 
     @classmethod
     def load(cls: object, config_file: str=SAVE_FILE) -> object:
@@ -93,3 +98,44 @@ class AIConfig:
 
         full_prompt += f"\n\n{get_prompt()}"
         return full_prompt
+
+    def prompt_cache_key(self) -> str:
+        """
+        Returns a hash of the full prompt, so any change to the settings or to the prompt template invalidates the cache.
+
+        Parameters:
+            None
+
+        Returns:
+            key (str): A hex digest.
+        """
+        return hashlib.sha256(self.construct_full_prompt().encode("utf-8")).hexdigest()
+
+    def get_prompt_tokens(self, model: str, cache_file: str=PROMPT_CACHE_FILE) -> int:
+        """
+        Returns the number of tokens the full prompt uses as a system message, read from the cache file
+        if the settings have not changed since it was written.
+
+        Parameters:
+            model (str): The model to count tokens for.
+            cache_file (str): The path to the prompt cache. DEFAULT: "../ai_settings.prompt_cache.json"
+
+        Returns:
+            tokens (int): The tokens used by the prompt message, without the reply primer.
+        """
+        key = self.prompt_cache_key()
+        try:
+            with open(cache_file, encoding='utf-8') as file:
+                cache = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            cache = {}
+        if cache.get("key") != key:
+            cache = {"key": key, "token_counts": {}}
+
+        if model not in cache["token_counts"]:
+            prompt_message = {"role": "system", "content": self.construct_full_prompt()}
+            cache["token_counts"][model] = token_counter.count_message_tokens(
+                [prompt_message], model) - token_counter.REPLY_PRIMER_TOKENS
+            with open(cache_file, "w", encoding='utf-8') as file:
+                json.dump(cache, file, indent=4)
+        return cache["token_counts"][model]
@@ -19,7 +19,7 @@ def evaluate_code(code: str) -> List[str]:
     args = [code]
     description_string = """Analyzes the given code and returns a list of suggestions for improvements."""
 
-    result_string = call_ai_function(function_string, args, description_string)
+    result_string = call_ai_function(function_string, args, description_string, call_site="evaluate_code")
 
     return result_string
 
@@ -41,7 +41,7 @@ def improve_code(suggestions: List[str], code: str) -> str:
     args = [json.dumps(suggestions), code]
     description_string = """Improves the provided code based on the suggestions provided, making no other changes."""
 
-    result_string = call_ai_function(function_string, args, description_string)
+    result_string = call_ai_function(function_string, args, description_string, call_site="improve_code")
     return result_string
 
 
@@ -62,5 +62,5 @@ def write_tests(code: str, focus: List[str]) -> str:
     args = [code, json.dumps(focus)]
     description_string = """Generates test cases for the existing code, focusing on specific areas if required."""
 
-    result_string = call_ai_function(function_string, args, description_string)
+    result_string = call_ai_function(function_string, args, description_string, call_site="write_tests")
     return result_string
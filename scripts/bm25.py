@@ -0,0 +1,57 @@
+"""Okapi BM25 lexical relevance scoring of texts against a query."""
+import math
+import re
+from collections import Counter
+from typing import List, Sequence
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into lower-cased words."""
+    return WORD.findall(text.lower())
+
+
+def bm25_scores(documents: Sequence[str], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """
+    Returns the BM25 score of every document for the query, higher is more relevant.
+
+    Args:
+        documents: The texts to score.
+        query: The query, e.g. a question.
+        k1: How quickly repeating a query word stops adding to the score.
+        b: How much long documents are penalized.
+    """
+    query_words = set(tokenize(query))
+    term_counts = []
+    lengths = []
+    for document in documents:
+        words = tokenize(document)
+        lengths.append(len(words))
+        term_counts.append(Counter(word for word in words if word in query_words))
+    if not documents:
+        return []
+
+    average_length = sum(lengths) / len(lengths) or 1
+    document_frequency = Counter(word for counts in term_counts for word in counts)
+    # The +1 keeps the weight of words found in most documents positive
+    idf = {word: math.log(1 + (len(documents) - df + 0.5) / (df + 0.5)) for word, df in document_frequency.items()}
+
+    scores = []
+    for counts, length in zip(term_counts, lengths):
+        score = 0.0
+        for word, count in counts.items():
+            score += idf[word] * count * (k1 + 1) / (count + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+def top_k(documents: Sequence[str], query: str, k: int) -> List[int]:
+    """
+    Returns the indices of the k documents most relevant to the query, in document order.
+
+    Ties go to the earlier documents, so when no document mentions the query the first k are returned.
+    """
+    scores = bm25_scores(documents, query)
+    best = sorted(range(len(documents)), key=lambda i: (-scores[i], i))[:k]
+    return sorted(best)
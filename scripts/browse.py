@@ -1,11 +1,60 @@
+import codecs
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from bs4 import BeautifulSoup
+import bm25
+from cassette import get_cassette
 from config import Config
+from html_extract import get_extractor
+from http_cache import HTTPCache
+import http_pool
+from llm_cache import SummaryCache
 from llm_utils import create_chat_completion
+from logger import logger
+from singleflight import SingleFlight
+import token_counter
+from usage_tracker import usage_tracker
 from urllib.parse import urlparse, urljoin
 
 cfg = Config()
 
+# Pages kept for get_page, most recently used last
+PAGE_CACHE_SIZE = 32
+
+http_cache = HTTPCache(
+    cfg.http_cache_dir,
+    default_ttl=cfg.http_cache_ttl,
+    max_size_bytes=cfg.http_cache_max_size_mb * 1024 * 1024,
+) if cfg.http_cache_enabled else None
+
+summary_cache = SummaryCache(
+    cfg.summary_cache_dir,
+    ttl=cfg.summary_cache_ttl,
+    max_size_bytes=cfg.summary_cache_max_size_mb * 1024 * 1024,
+) if cfg.summary_cache_enabled else None
+
+# Extracts the text and the links of browsed pages
+html_extractor = get_extractor(cfg.browse_html_extractor)
+
+
+def get_http_cache_stats():
+    """Returns the HTTP cache hit counters, or None when the cache is disabled"""
+    return http_cache.get_stats() if http_cache else None
+
+
+def get_summary_cache():
+    """Returns the summary cache, or None when it is disabled or a cassette must see every call"""
+    return summary_cache if get_cassette(cfg) is None else None
+
+
+def get_summary_cache_stats():
+    """Returns the summary cache hit counters, or None when the cache is disabled"""
+    return summary_cache.get_stats() if summary_cache else None
+
 
 # Function to check if the URL is valid
 def is_valid_url(url):
@@ -27,6 +76,99 @@ def check_local_file_access(url):
     return any(url.startswith(prefix) for prefix in local_prefixes)
 
 
+# Bytes read from the network at a time while downloading a page
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+TRUNCATED_MARKER = "\n\n[Content truncated: the page is larger than {max_bytes} bytes]"
+META_CHARSET = re.compile(r"""<meta[^>]*charset=["']?([\w.:-]+)""", flags=re.IGNORECASE)
+TEXT_CONTENT_TYPES = {"application/xhtml+xml", "application/xml", "application/json", "application/javascript"}
+
+
+def is_text_content_type(content_type):
+    """Return whether a Content-Type header names a type whose text can be read"""
+    mime_type = content_type.split(";")[0].strip().lower()
+    return mime_type.startswith("text/") or mime_type in TEXT_CONTENT_TYPES \
+        or mime_type.endswith(("+xml", "+json"))
+
+
+def _get_encoding(headers, first_chunk):
+    """Return the charset of the Content-Type header, else of a <meta> tag, else utf-8"""
+    content_type = headers.get("Content-Type", "")
+    candidates = []
+    if "charset" in content_type.lower():
+        candidates.append(requests.utils.get_encoding_from_headers(headers))
+    candidates += META_CHARSET.findall(first_chunk[:4096].decode("ascii", "ignore"))
+    for encoding in candidates:
+        try:
+            return codecs.lookup(encoding).name
+        except (LookupError, TypeError):
+            continue
+    return "utf-8"
+
+
+def download(url, headers=None, timeout=None):
+    """
+    Stream a page, reading at most BROWSE_MAX_BYTES of its body.
+
+    Aborts with a ValueError before downloading anything else than text. The body
+    is decoded as it arrives into response.decoded_text, and response.truncated
+    tells whether the page was cut short. response.content holds the bytes read.
+    """
+    # The host's request slot is held until the body has been read
+    with http_pool.session.host_slot(url):
+        return _read_body(http_pool.session.get(url, headers=headers, timeout=timeout, stream=True))
+
+
+def _read_body(response):
+    try:
+        if response.status_code >= 300:
+            response._content = b""
+            return response
+
+        content_type = response.headers.get("Content-Type", "")
+        if content_type and not is_text_content_type(content_type):
+            raise ValueError(f"Unsupported content type {content_type.split(';')[0].strip()}")
+
+        max_bytes = cfg.browse_max_bytes
+        body = []
+        text = []
+        size = 0
+        decoder = None
+        response.truncated = False
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if decoder is None:
+                # Without a Content-Type, NUL bytes give binary files away
+                if not content_type and b"\x00" in chunk[:1024]:
+                    raise ValueError("Unsupported content type: the page is binary")
+                response.encoding = _get_encoding(response.headers, chunk)
+                decoder = codecs.getincrementaldecoder(response.encoding)(errors="replace")
+            if size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                response.truncated = True
+            body.append(chunk)
+            text.append(decoder.decode(chunk))
+            size += len(chunk)
+            if response.truncated:
+                break
+
+        if decoder is not None and not response.truncated:
+            text.append(decoder.decode(b"", final=True))
+        response._content = b"".join(body)
+        response.decoded_text = "".join(text)
+        return response
+    finally:
+        response.close()
+
+
+def response_text(response):
+    """Return the text of a response from get_response, ending with a marker when it was truncated"""
+    text = getattr(response, "decoded_text", None)
+    if text is None:
+        text = response.text
+    if getattr(response, "truncated", False):
+        text += TRUNCATED_MARKER.format(max_bytes=cfg.browse_max_bytes)
+    return text
+
+
 def get_response(url, headers=cfg.user_agent_header, timeout=10):
     try:
         # Restrict access to local files
@@ -39,7 +181,10 @@ def get_response(url, headers=cfg.user_agent_header, timeout=10):
 
         sanitized_url = sanitize_url(url)
 
-        response = requests.get(sanitized_url, headers=headers, timeout=timeout)
+        if http_cache:
+            response = http_cache.get(sanitized_url, headers=headers, timeout=timeout, fetch=download)
+        else:
+            response = download(sanitized_url, headers=headers, timeout=timeout)
 
         # Check if the response contains an HTTP error
         if response.status_code >= 400:
@@ -55,31 +200,81 @@ def get_response(url, headers=cfg.user_agent_header, timeout=10):
         return None, "Error: " + str(re)
 
 
-def scrape_text(url):
-    """Scrape text from a webpage"""
+class WebPage:
+    """
+    A downloaded page. The HTML is parsed once, on first use, by the
+    BROWSE_HTML_EXTRACTOR backend, which returns the text and the links together.
+    """
+
+    def __init__(self, url, html):
+        self.url = url
+        self.html = html
+        self.fetched_at = time.time()
+        self._text = None
+        self._links = None
+        self._lock = threading.Lock()
+
+    def _extract(self):
+        with self._lock:
+            if self._text is None:
+                self._text, self._links = html_extractor.extract(self.html)
+
+    @property
+    def text(self):
+        """The visible text of the page, one phrase per line"""
+        self._extract()
+        return self._text
+
+    @property
+    def links(self):
+        """The (text, url) of every hyperlink on the page"""
+        self._extract()
+        return self._links
+
+
+def fetch_page(url):
+    """Download a page, returning (WebPage, None) or (None, error message)"""
     response, error_message = get_response(url)
     if error_message:
-        return error_message
+        return None, error_message
+    return WebPage(url, response_text(response)), None
 
-    soup = BeautifulSoup(response.text, "html.parser")
 
-    for script in soup(["script", "style"]):
-        script.extract()
+_page_cache = OrderedDict()
+_page_cache_lock = threading.Lock()
+_page_flight = SingleFlight()
 
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = '\n'.join(chunk for chunk in chunks if chunk)
 
-    return text
+def get_page(url):
+    """
+    Return (WebPage, None) or (None, error message) for a URL, reusing a page
+    fetched less than BROWSE_PAGE_TTL seconds ago.
+
+    Concurrent requests for the same URL share one download. Errors are not cached.
+    """
+    with _page_cache_lock:
+        page = _page_cache.get(url)
+        if page is not None and time.time() - page.fetched_at < cfg.browse_page_ttl:
+            _page_cache.move_to_end(url)
+            return page, None
+
+    page, error_message = _page_flight.do(url, fetch_page, url)
+    if page is not None:
+        with _page_cache_lock:
+            _page_cache[url] = page
+            _page_cache.move_to_end(url)
+            while len(_page_cache) > PAGE_CACHE_SIZE:
+                _page_cache.popitem(last=False)
+    return page, error_message
+
 
+def scrape_text(url):
+    """Scrape text from a webpage"""
+    page, error_message = fetch_page(url)
+    if error_message:
+        return error_message
 
-def extract_hyperlinks(soup):
-    """Extract hyperlinks from a BeautifulSoup object"""
-    hyperlinks = []
-    for link in soup.find_all('a', href=True):
-        hyperlinks.append((link.text, link['href']))
-    return hyperlinks
+    return page.text
 
 
 def format_hyperlinks(hyperlinks):
@@ -92,37 +287,151 @@ def format_hyperlinks(hyperlinks):
 
 def scrape_links(url):
     """Scrape links from a webpage"""
-    response, error_message = get_response(url)
+    page, error_message = fetch_page(url)
     if error_message:
         return error_message
 
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    hyperlinks = extract_hyperlinks(soup)
-
-    return format_hyperlinks(hyperlinks)
-
-
-def split_text(text, max_length=8192):
-    """Split text into chunks of a maximum length"""
-    paragraphs = text.split("\n")
-    current_length = 0
-    current_chunk = []
-
-    for paragraph in paragraphs:
-        if current_length + len(paragraph) + 1 <= max_length:
-            current_chunk.append(paragraph)
-            current_length += len(paragraph) + 1
-        else:
-            yield "\n".join(current_chunk)
-            current_chunk = [paragraph]
-            current_length = len(paragraph) + 1
-
-    if current_chunk:
-        yield "\n".join(current_chunk)
+    return format_hyperlinks(page.links)
+
+
+# Tokens the model may use to answer about one chunk or one group of summaries
+SUMMARY_MAX_TOKENS = 300
+# Tokens taken by the instructions around the text in create_message
+SUMMARY_PROMPT_TOKENS = 100
+# Paragraphs whose tokens are counted in one batch while splitting
+SPLIT_BATCH_SIZE = 64
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_token_budget(model):
+    """Return the most tokens of page text sent to a model in one summary request"""
+    token_limit = cfg.smart_token_limit if model == cfg.smart_llm_model else cfg.fast_token_limit
+    return max(1, min(cfg.browse_chunk_tokens, token_limit - SUMMARY_MAX_TOKENS - SUMMARY_PROMPT_TOKENS))
+
+
+def _iter_paragraphs(text):
+    """Yield the lines of text one at a time"""
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def _iter_pieces(text, max_tokens, model):
+    """
+    Yield (separator, piece, tokens) for every piece of text that fits max_tokens.
+
+    Paragraphs are kept whole when they fit, otherwise they are split into
+    sentences, and sentences that still do not fit are cut every max_tokens
+    tokens. The separator is what joined the piece to the previous one.
+    """
+    paragraphs = _iter_paragraphs(text)
+    while True:
+        batch = list(itertools.islice(paragraphs, SPLIT_BATCH_SIZE))
+        if not batch:
+            return
+        for paragraph, tokens in zip(batch, token_counter.count_strings_tokens(batch, model)):
+            if tokens <= max_tokens:
+                yield "\n", paragraph, tokens
+                continue
+            separator = "\n"
+            sentences = [sentence for sentence in SENTENCE_END.split(paragraph) if sentence]
+            for sentence, sentence_tokens in zip(sentences, token_counter.count_strings_tokens(sentences, model)):
+                if sentence_tokens <= max_tokens:
+                    yield separator, sentence, sentence_tokens
+                else:
+                    for i, (piece, piece_tokens) in enumerate(_hard_split(sentence, max_tokens, model)):
+                        yield separator if i == 0 else "", piece, piece_tokens
+                separator = " "
+
+
+def _hard_split(sentence, max_tokens, model):
+    """
+    Yield (piece, tokens) cutting a sentence every max_tokens tokens.
+
+    A token may end inside a multi-byte character, so each cut is moved back to
+    the nearest token boundary that is also a character boundary.
+    """
+    encoding = token_counter.get_encoding(model)
+    # Text such as "<|endoftext|>" on a page is plain text, not a special token
+    encoded = encoding.encode(sentence, disallowed_special=())
+    data = sentence.encode("utf-8")
+    # Byte offset at which each token starts
+    offsets = list(itertools.accumulate(
+        (len(encoding.decode_single_token_bytes(token)) for token in encoded), initial=0))
+
+    def inside_character(index):
+        # UTF-8 continuation bytes look like 10xxxxxx
+        return index < len(encoded) and data[offsets[index]] & 0xC0 == 0x80
+
+    start = 0
+    while start < len(encoded):
+        end = min(start + max_tokens, len(encoded))
+        while end > start and inside_character(end):
+            end -= 1
+        if end == start:
+            # A single character takes more than max_tokens tokens, keep it whole
+            end = start + max_tokens
+            while inside_character(end):
+                end += 1
+        yield data[offsets[start]:offsets[end]].decode("utf-8"), end - start
+        start = end
+
+
+def _join_pieces(pieces):
+    return pieces[0][1] + "".join(separator + piece for separator, piece, _ in pieces[1:])
+
+
+def split_text(text, max_tokens=None, model=None, overlap=None):
+    """
+    Split text into chunks of at most max_tokens tokens, yielding them one by one.
+
+    Chunks end on paragraph boundaries where possible, then on sentence
+    boundaries. Each chunk after the first starts with up to `overlap` tokens
+    from the end of the previous one.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int, optional): Tokens per chunk. Defaults to chunk_token_budget(model).
+        model (str, optional): The model whose tokenizer is used. Defaults to the fast model.
+        overlap (int, optional): Tokens repeated between chunks, at most half of max_tokens.
+            Defaults to BROWSE_CHUNK_OVERLAP.
+    """
+    model = model or cfg.fast_llm_model
+    max_tokens = max_tokens or chunk_token_budget(model)
+    overlap = min(cfg.browse_chunk_overlap if overlap is None else overlap, max_tokens // 2)
+
+    # A text clearly within the budget is a single chunk, it is only tokenized when close to it
+    if token_counter.estimator.bounds(text)[1] <= max_tokens:
+        yield text
+        return
+
+    # Counts a separator token per piece, a slight overestimate
+    chunk = []
+    chunk_tokens = 0
+    for separator, piece, tokens in _iter_pieces(text, max_tokens, model):
+        if chunk and chunk_tokens + tokens + 1 > max_tokens:
+            yield _join_pieces(chunk)
+            tail = []
+            tail_tokens = 0
+            for item in reversed(chunk):
+                if tail_tokens + item[2] + 1 > overlap:
+                    break
+                tail.insert(0, item)
+                tail_tokens += item[2] + 1
+            chunk, chunk_tokens = tail, tail_tokens
+            while chunk and chunk_tokens + tokens + 1 > max_tokens:
+                chunk_tokens -= chunk.pop(0)[2] + 1
+        chunk.append((separator, piece, tokens))
+        chunk_tokens += tokens + 1
+
+    if chunk:
+        yield _join_pieces(chunk)
 
 
 def create_message(chunk, question):
@@ -133,37 +442,134 @@ def create_message(chunk, question):
     }
 
 
+def summarize_chunk(chunk, question):
+    """Answer the question about one chunk of text, or summarize it"""
+    model = cfg.fast_llm_model
+    cache = get_summary_cache()
+    if cache:
+        summary = cache.get_chunk(chunk, question, model)
+        if summary is not None:
+            usage_tracker.record("summarize_text", model, cached=True)
+            return summary
+
+    summary = create_chat_completion(
+        model=model,
+        messages=[create_message(chunk, question)],
+        max_tokens=SUMMARY_MAX_TOKENS,
+        call_site="summarize_text",
+    )
+    if cache:
+        cache.set_chunk(chunk, question, model, summary)
+    return summary
+
+
+def group_summaries(summaries, token_budget, model):
+    """
+    Split summaries, in order, into groups whose joined text fits token_budget.
+
+    Every group holds at least two summaries so that each reduce round shrinks
+    the list even when the budget is tight.
+    """
+    # Summaries clearly within the budget make a single group, they are only tokenized when close to it
+    if sum(token_counter.estimator.bounds(summary)[1] + 1 for summary in summaries) <= token_budget:
+        return [list(summaries)] if summaries else []
+
+    groups = []
+    group = []
+    group_tokens = 0
+    for summary, tokens in zip(summaries, token_counter.count_strings_tokens(summaries, model)):
+        if len(group) >= 2 and group_tokens + tokens + 1 > token_budget:
+            groups.append(group)
+            group = []
+            group_tokens = 0
+        group.append(summary)
+        group_tokens += tokens + 1
+    if group:
+        groups.append(group)
+    return groups
+
+
+def map_in_order(executor, fn, items, window):
+    """
+    Like executor.map, but only takes `window` items ahead of the results,
+    so a generator of items is never read into memory all at once.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def select_relevant_chunks(chunks, question, top_k):
+    """Return the top_k chunks scoring highest against the question with BM25, in page order"""
+    if len(chunks) <= top_k:
+        return chunks
+    selected = [chunks[i] for i in bm25.top_k(chunks, question, top_k)]
+    logger.debug(f"Selected the {len(selected)} of {len(chunks)} chunks most relevant to the question.")
+    return selected
+
+
 def summarize_text(text, question):
-    """Summarize text using the LLM model"""
+    """
+    Summarize text using the LLM model.
+
+    A page that fits in one chunk is answered with a single call. Otherwise
+    only the BROWSE_SUMMARY_TOP_K chunks most relevant to the question are
+    summarized, concurrently, at most BROWSE_SUMMARY_WORKERS at a time. While
+    the joined summaries do not fit in one request they are summarized again
+    in groups, then the remaining ones are combined into the final answer.
+
+    Chunk summaries and final answers are kept in the summary cache, so
+    browsing a page again for the same question makes no calls.
+    """
     if not text:
         return "Error: No text to summarize"
 
-    text_length = len(text)
-    print(f"Text length: {text_length} characters")
-
-    summaries = []
-    chunks = list(split_text(text))
-
-    for i, chunk in enumerate(chunks):
-        print(f"Summarizing chunk {i + 1} / {len(chunks)}")
-        messages = [create_message(chunk, question)]
-
-        summary = create_chat_completion(
-            model=cfg.fast_llm_model,
-            messages=messages,
-            max_tokens=300,
-        )
-        summaries.append(summary)
+    model = cfg.fast_llm_model
+    cache = get_summary_cache()
+    # Chunking and selection change the final summary, so a page is cached per settings
+    settings = {
+        "chunk_tokens": chunk_token_budget(model),
+        "chunk_overlap": cfg.browse_chunk_overlap,
+        "top_k": cfg.browse_summary_top_k,
+    }
+    if cache:
+        final_summary = cache.get_page(text, question, model, settings)
+        if final_summary is not None:
+            logger.debug("Summary found in the summary cache.")
+            return final_summary
+
+    logger.debug(f"Text length: {len(text)} characters")
+    chunks = split_text(text)
+    first_chunks = list(itertools.islice(chunks, 2))
+    if len(first_chunks) == 1:
+        final_summary = summarize_chunk(first_chunks[0], question)
+    else:
+        chunks = itertools.chain(first_chunks, chunks)
+        if cfg.browse_summary_top_k > 0:
+            chunks = select_relevant_chunks(list(chunks), question, cfg.browse_summary_top_k)
+        final_summary = _map_reduce(chunks, question, model)
+
+    if cache:
+        cache.set_page(text, question, model, final_summary, settings)
+    return final_summary
 
-    print(f"Summarized {len(chunks)} chunks.")
 
-    combined_summary = "\n".join(summaries)
-    messages = [create_message(combined_summary, question)]
+def _map_reduce(chunks, question, model):
+    token_budget = cfg.fast_token_limit - SUMMARY_MAX_TOKENS - SUMMARY_PROMPT_TOKENS
+    workers = max(1, cfg.browse_summary_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        summaries = list(map_in_order(executor, lambda chunk: summarize_chunk(chunk, question), chunks,
+                                      window=2 * workers))
+        logger.debug(f"Summarized {len(summaries)} chunks.")
 
-    final_summary = create_chat_completion(
-        model=cfg.fast_llm_model,
-        messages=messages,
-        max_tokens=300,
-    )
+        groups = group_summaries(summaries, token_budget, model)
+        while len(groups) > 1:
+            summaries = list(executor.map(lambda group: summarize_chunk("\n".join(group), question), groups))
+            logger.debug(f"Reduced {len(groups)} groups of summaries.")
+            groups = group_summaries(summaries, token_budget, model)
 
-    return final_summary
+    return summarize_chunk("\n".join(summaries), question)
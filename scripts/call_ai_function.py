@@ -7,7 +7,7 @@ from llm_utils import create_chat_completion
 
 # This is a magic function that can do anything with no-code. See
 # https://github.com/Torantulino/AI-Functions for more info.
-def call_ai_function(function, args, description, model=None):
+def call_ai_function(function, args, description, model=None, call_site="ai_function"):
     """Call an AI function"""
     if model is None:
         model = cfg.smart_llm_model
@@ -24,7 +24,7 @@ def call_ai_function(function, args, description, model=None):
     ]
 
     response = create_chat_completion(
-        model=model, messages=messages, temperature=0
+        model=model, messages=messages, temperature=0, call_site=call_site
     )
 
     return response
@@ -0,0 +1,125 @@
+"""Record/replay layer for LLM and embedding requests."""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+CASSETTE_MODES = ["off", "record", "replay", "strict"]
+
+# Message content that changes on every run and must not affect matching
+DEFAULT_IGNORE_PATTERNS = [r"^The current time and date is .*$"]
+
+
+class CassetteMissError(Exception):
+    """Raised in strict mode when a request has no recorded response."""
+
+
+class Cassette:
+    """
+    Records request/response pairs to a JSON lines file and replays them.
+
+    Modes:
+        record: Always send requests and record the responses.
+        replay: Replay recorded responses, sending and recording requests that were not recorded.
+        strict: Replay recorded responses, raising CassetteMissError for requests that were not recorded.
+
+    A request recorded several times replays its responses in the order they were recorded,
+    repeating the last one once they are used up. Files ending in .gz are gzip compressed.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", ignore_patterns: Optional[List[str]] = None) -> None:
+        if mode not in CASSETTE_MODES[1:]:
+            raise ValueError(f"Invalid cassette mode '{mode}', expected one of {CASSETTE_MODES[1:]}")
+        self.path = path
+        self.mode = mode
+        if ignore_patterns is None:
+            ignore_patterns = DEFAULT_IGNORE_PATTERNS
+        self.ignore_patterns = [re.compile(pattern, re.MULTILINE) for pattern in ignore_patterns]
+        self.recordings = {}
+        self._cursors = {}
+        self._lock = threading.Lock()
+        if mode != "record":
+            self._load()
+
+    def _open(self, file_mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, file_mode + "t", encoding="utf-8")
+        return open(self.path, file_mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with self._open("r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self.recordings.setdefault(entry["key"], []).append(entry["response"])
+
+    def _normalize(self, value: Any) -> Any:
+        if isinstance(value, str):
+            for pattern in self.ignore_patterns:
+                value = pattern.sub("", value)
+            return value
+        if isinstance(value, dict):
+            return {key: self._normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._normalize(item) for item in value]
+        return value
+
+    def make_key(self, kind: str, request: Dict[str, Any]) -> str:
+        """Returns a hash identifying the request, ignoring volatile content."""
+        payload = json.dumps([kind, self._normalize(request)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def play(self, kind: str, request: Dict[str, Any]) -> Optional[Any]:
+        """
+        Returns the recorded response for the request, or None if it must be sent.
+
+        Raises:
+            CassetteMissError: In strict mode, if the request was never recorded.
+        """
+        if self.mode == "record":
+            return None
+        key = self.make_key(kind, request)
+        with self._lock:
+            responses = self.recordings.get(key)
+            if not responses:
+                if self.mode == "strict":
+                    raise CassetteMissError(f"No recorded {kind} response for request {key} in {self.path}")
+                return None
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+            return responses[min(cursor, len(responses) - 1)]
+
+    def record(self, kind: str, request: Dict[str, Any], response: Any) -> None:
+        """Appends a request/response pair to the cassette file."""
+        key = self.make_key(kind, request)
+        line = json.dumps({"key": key, "kind": kind, "response": response}, ensure_ascii=False)
+        with self._lock:
+            self.recordings.setdefault(key, []).append(response)
+            # Responses recorded during replay have been played already
+            self._cursors[key] = len(self.recordings[key])
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._open("a") as f:
+                f.write(line + "\n")
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette(cfg) -> Optional[Cassette]:
+    """Returns the process wide cassette, or None if record/replay is off."""
+    global _cassette
+    if cfg.llm_cassette_mode == "off":
+        return None
+    with _cassette_lock:
+        if _cassette is None or _cassette.path != cfg.llm_cassette_path or _cassette.mode != cfg.llm_cassette_mode:
+            _cassette = Cassette(cfg.llm_cassette_path, cfg.llm_cassette_mode)
+    return _cassette
@@ -1,15 +1,46 @@
+import functools
 import time
 import openai
 from dotenv import load_dotenv
 from config import Config
 import token_counter
-from llm_utils import create_chat_completion
+from json_utils import StreamingJsonScanner
+from llm_utils import create_chat_completion, create_chat_completion_stream, get_cache_stats, get_router_stats, get_singleflight_stats
+from memory.base import embedding_flight
+from memory.prefetch import build_query
+from usage_tracker import usage_tracker
 from logger import logger
+from message_history import history_window
 import logging
 
 cfg = Config()
 
 
+class ChatMessage(dict):
+    """
+    A chat message that remembers its token count per encoding once it has been counted,
+    so messages kept in the history are never re-tokenized.
+
+    The counts are an attribute rather than a key, so they are never sent to the API.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_counts = {}
+
+    def __setitem__(self, key, value):
+        self.token_counts.clear()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.token_counts.clear()
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self.token_counts.clear()
+        super().update(*args, **kwargs)
+
+
 def create_chat_message(role, content):
     """
     Create a chat message with the given role and content.
@@ -19,19 +50,79 @@ def create_chat_message(role, content):
     content (str): The content of the message.
 
     Returns:
-    dict: A dictionary containing the role and content of the message.
+    ChatMessage: A dictionary containing the role and content of the message.
+    """
+    return ChatMessage(role=role, content=content)
+
+
+@functools.lru_cache(maxsize=8)
+def create_system_prompt_message(prompt):
+    """
+    Create the system message holding the prompt.
+
+    The prompt is the same on every cycle, so the same message is returned for it
+    and its token count is remembered across cycles.
+
+    Args:
+    prompt (str): The prompt explaining the rules to the AI.
+
+    Returns:
+    ChatMessage: The system message. It must not be modified.
+    """
+    return create_chat_message("system", prompt)
+
+
+# Counted once to find the tokens left for the memories themselves
+EMPTY_MEMORY_MESSAGE = create_chat_message("system", "This reminds you of these events from your past:\n[]\n\n")
+
+
+def pack_relevant_memory(relevant_memory, token_budget, model):
+    """
+    Choose the memories shown to the AI within a token budget.
+
+    Each memory is tokenized once. Memories are taken most relevant first, skipping
+    those that no longer fit, so a long memory does not crowd out the shorter ones after it.
+
+    Args:
+    relevant_memory (list): The retrieved memories, most relevant first.
+    token_budget (int): The number of tokens available for the memories.
+    model (str): The model used to count tokens.
+
+    Returns:
+    list: The chosen memories, most relevant first.
     """
-    return {"role": role, "content": content}
+    relevant_memory = list(relevant_memory or [])
+    # Memories are shown as a list, count each one with its separator
+    texts = [f"{memory!r}, " for memory in relevant_memory]
+    if sum(token_counter.max_string_tokens(text) for text in texts) <= token_budget:
+        # Everything fits even at one token per byte, no need for exact counts
+        return relevant_memory
+
+    packed = []
+    for memory, tokens in zip(relevant_memory, token_counter.count_strings_tokens(texts, model)):
+        if tokens <= token_budget:
+            packed.append(memory)
+            token_budget -= tokens
+    return packed
 
 
 def generate_context(prompt, relevant_memory, full_message_history, model):
     current_context = [
+        create_system_prompt_message(prompt),
         create_chat_message(
-            "system", prompt),
-        create_chat_message(
-            "system", f"The current time and date is {time.strftime('%c')}"),
-        create_chat_message(
-            "system", f"This reminds you of these events from your past:\n{relevant_memory}\n\n")]
+            "system", f"The current time and date is {time.strftime('%c')}")]
+
+    if relevant_memory:
+        # The prompt and time are counted once, the remaining budget goes to the memories
+        static_tokens = token_counter.count_message_tokens(current_context + [EMPTY_MEMORY_MESSAGE], model)
+        relevant_memory = pack_relevant_memory(relevant_memory, cfg.memory_token_limit - static_tokens, model)
+    current_context.append(create_chat_message(
+        "system", f"This reminds you of these events from your past:\n{relevant_memory}\n\n"))
+    # Messages compacted out of the history are represented by their summary
+    history_summary = getattr(full_message_history, "summary", "")
+    if history_summary:
+        current_context.append(create_chat_message(
+            "system", f"This is a summary of your earlier conversation:\n{history_summary}\n\n"))
 
     # Add messages from the full message history until we reach the token limit
     next_message_to_add_index = len(full_message_history) - 1
@@ -41,13 +132,33 @@ def generate_context(prompt, relevant_memory, full_message_history, model):
     return next_message_to_add_index, current_tokens_used, insertion_index, current_context
 
 
+def stream_chat_completion(on_field, **kwargs):
+    """
+    Stream a chat completion, reporting each top-level field of the JSON reply as it completes.
+
+    Args:
+    on_field (callable): Called with (key, value) for every completed top-level field.
+    **kwargs: Passed to create_chat_completion_stream.
+
+    Returns:
+    str: The full reply.
+    """
+    scanner = StreamingJsonScanner()
+    for piece in create_chat_completion_stream(**kwargs):
+        for key, value in scanner.feed(piece):
+            on_field(key, value)
+    return scanner.buffer
+
+
 # TODO: Change debug from hardcode to argument
 def chat_with_ai(
         prompt,
         user_input,
         full_message_history,
         permanent_memory,
-        token_limit):
+        token_limit,
+        on_field=None,
+        relevant_memory=None):
     """Interact with the OpenAI API, sending the prompt, user input, message history, and permanent memory."""
     while True:
         try:
@@ -60,6 +171,10 @@ def chat_with_ai(
             full_message_history (list): The list of all messages sent between the user and the AI.
             permanent_memory (Obj): The memory object containing the permanent memory.
             token_limit (int): The maximum number of tokens allowed in the API call.
+            on_field (callable, optional): If given, the reply is streamed and on_field(key, value) is
+                called for each top-level field of the JSON reply as soon as it has fully arrived.
+            relevant_memory (list, optional): Memories already looked up for this cycle, e.g. by a
+                memory.MemoryPrefetcher. Looked up from permanent_memory if not given.
 
             Returns:
             str: The AI's response.
@@ -70,40 +185,29 @@ def chat_with_ai(
             logger.debug(f"Token limit: {token_limit}")
             send_token_limit = token_limit - 1000
 
-            relevant_memory = '' if len(full_message_history) ==0 else  permanent_memory.get_relevant(str(full_message_history[-9:]), 10)
+            if relevant_memory is None:
+                relevant_memory = '' if len(full_message_history) ==0 else  permanent_memory.get_relevant(build_query(full_message_history), 10)
 
             logger.debug(f'Memory Stats: {permanent_memory.get_stats()}')
+            logger.debug(f'LLM Cache Stats: {get_cache_stats()}')
+            logger.debug(f'LLM Router Stats: {get_router_stats()}')
+            logger.debug(f'Estimated API cost so far: ${usage_tracker.get_total_cost():.4f}')
+            logger.debug(f'Single-flight Stats: completions {get_singleflight_stats()}, embeddings {embedding_flight.get_stats()}')
 
             next_message_to_add_index, current_tokens_used, insertion_index, current_context = generate_context(
                 prompt, relevant_memory, full_message_history, model)
 
-            while current_tokens_used > 2500:
-                # remove memories until we are under 2500 tokens
-                relevant_memory = relevant_memory[1:]
-                next_message_to_add_index, current_tokens_used, insertion_index, current_context = generate_context(
-                    prompt, relevant_memory, full_message_history, model)
-
-            current_tokens_used += token_counter.count_message_tokens([create_chat_message("user", user_input)], model) # Account for user input (appended later)
+            user_message = create_chat_message("user", user_input)
+            current_tokens_used += token_counter.count_message_tokens([user_message], model) # Account for user input (appended later)
 
-            while next_message_to_add_index >= 0:
-                # print (f"CURRENT TOKENS USED: {current_tokens_used}")
-                message_to_add = full_message_history[next_message_to_add_index]
-
-                tokens_to_add = token_counter.count_message_tokens([message_to_add], model)
-                if current_tokens_used + tokens_to_add > send_token_limit:
-                    break
-
-                # Add the most recent message to the start of the current context, after the two system prompts.
-                current_context.insert(insertion_index, full_message_history[next_message_to_add_index])
-
-                # Count the currently used tokens
-                current_tokens_used += tokens_to_add
-
-                # Move to the next most recent message in the full message history
-                next_message_to_add_index -= 1
+            # Add the most recent messages that fit in the remaining budget, after the system prompts
+            first_message_index, history_tokens = history_window(
+                full_message_history, send_token_limit - current_tokens_used, model)
+            current_context[insertion_index:insertion_index] = full_message_history[first_message_index:]
+            current_tokens_used += history_tokens
 
             # Append user input, the length of this is accounted for above
-            current_context.extend([create_chat_message("user", user_input)])
+            current_context.append(user_message)
 
             # Calculate remaining tokens
             tokens_remaining = token_limit - current_tokens_used
@@ -123,16 +227,24 @@ def chat_with_ai(
             logger.debug("----------- END OF CONTEXT ----------------")
 
             # TODO: use a model defined elsewhere, so that model can contain temperature and other settings we care about
-            assistant_reply = create_chat_completion(
-                model=model,
-                messages=current_context,
-                max_tokens=tokens_remaining,
-            )
+            if on_field is None:
+                assistant_reply = create_chat_completion(
+                    model=model,
+                    messages=current_context,
+                    max_tokens=tokens_remaining,
+                    call_site="chat",
+                )
+            else:
+                assistant_reply = stream_chat_completion(
+                    on_field,
+                    model=model,
+                    messages=current_context,
+                    max_tokens=tokens_remaining,
+                    call_site="chat",
+                )
 
             # Update full message history
-            full_message_history.append(
-                create_chat_message(
-                    "user", user_input))
+            full_message_history.append(user_message)
             full_message_history.append(
                 create_chat_message(
                     "assistant", assistant_reply))
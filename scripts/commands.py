@@ -1,5 +1,7 @@
 import browse
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from memory import get_memory
 import datetime
 import agent_manager as agents
@@ -9,13 +11,23 @@ import ai_functions as ai
 from file_operations import read_file, write_to_file, append_to_file, delete_file, search_files
 from execute_code import execute_python_file, execute_shell
 from json_parser import fix_and_parse_json
+from prompt import PARALLEL_SAFE_COMMANDS
 from image_gen import generate_image
+import http_pool
+import duckduckgo_search
 from duckduckgo_search import ddg
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 cfg = Config()
 
+# ddg sends its requests through a session of its own, give it the shared pools and retries
+if hasattr(getattr(duckduckgo_search, "utils", None), "SESSION"):
+    http_pool.mount_on(duckduckgo_search.utils.SESSION)
+
+# Custom Search API services, one per thread as their HTTP client is not thread safe
+_search_services = threading.local()
+
 
 def is_valid_int(value):
     try:
@@ -51,6 +63,80 @@ def get_command(response):
         return "Error:", str(e)
 
 
+def get_commands(response):
+    """
+    Parse a response listing several commands and return a list of (command name, arguments).
+
+    A response with a single "command" object is accepted too. Invalid entries are
+    returned as ("Error:", message) like get_command does.
+    """
+    try:
+        response_json = fix_and_parse_json(response)
+
+        if "commands" not in response_json:
+            return [get_command(response)]
+
+        commands = response_json["commands"]
+        if not isinstance(commands, list) or not commands:
+            return [("Error:", "'commands' must be a non-empty list")]
+
+        parsed = []
+        for i, command in enumerate(commands):
+            if not isinstance(command, dict) or "name" not in command:
+                parsed.append(("Error:", f"Missing 'name' field in command {i + 1}"))
+            else:
+                parsed.append((command["name"], command.get("args", {})))
+        return parsed
+    except json.decoder.JSONDecodeError:
+        return [("Error:", "Invalid JSON")]
+    # All other errors, return "Error: + error message"
+    except Exception as e:
+        return [("Error:", str(e))]
+
+
+def is_parallel_safe(command_name):
+    """Return whether a command only reads and may run at the same time as other such commands"""
+    return command_name in PARALLEL_SAFE_COMMANDS
+
+
+def execute_commands(commands, max_workers=None):
+    """
+    Execute several commands and return their results in the same order.
+
+    Consecutive parallel-safe commands run at the same time in a worker pool. Any
+    other command waits for the commands before it and runs alone, so commands after
+    it see its effects. Entries that failed to parse are not executed, their result
+    is the error message.
+
+    Args:
+        commands (list): (command name, arguments) pairs, e.g. from get_commands.
+        max_workers (int, optional): Size of the worker pool. Defaults to MULTI_COMMAND_WORKERS.
+
+    Returns:
+        list: The result of each command.
+    """
+    results = [None] * len(commands)
+    pending = []
+    with ThreadPoolExecutor(max_workers=max_workers or cfg.multi_command_workers,
+                            thread_name_prefix="command") as executor:
+        def run_pending():
+            futures = [(i, executor.submit(execute_command, name, arguments)) for i, name, arguments in pending]
+            for i, future in futures:
+                results[i] = future.result()
+            pending.clear()
+
+        for i, (command_name, arguments) in enumerate(commands):
+            if command_name is not None and command_name.lower().startswith("error"):
+                results[i] = arguments
+            elif is_parallel_safe(command_name):
+                pending.append((i, command_name, arguments))
+            else:
+                run_pending()
+                results[i] = execute_command(command_name, arguments)
+        run_pending()
+    return results
+
+
 def execute_command(command_name, arguments):
     """Execute the command and return the result"""
     memory = get_memory(cfg)
@@ -137,6 +223,14 @@ def google_search(query, num_results=8):
     return json.dumps(search_results, ensure_ascii=False, indent=4)
 
 
+def get_search_service(api_key):
+    """Return this thread's Custom Search API service, built once so its discovery document and connection are reused"""
+    if getattr(_search_services, "api_key", None) != api_key:
+        _search_services.service = build("customsearch", "v1", developerKey=api_key)
+        _search_services.api_key = api_key
+    return _search_services.service
+
+
 def google_official_search(query, num_results=8):
     """Return the results of a google search using the official Google API"""
     from googleapiclient.discovery import build
@@ -149,7 +243,7 @@ def google_official_search(query, num_results=8):
         custom_search_engine_id = cfg.custom_search_engine_id
 
         # Initialize the Custom Search API service
-        service = build("customsearch", "v1", developerKey=api_key)
+        service = get_search_service(api_key)
 
         # Send the search query and retrieve the results
         result = service.cse().list(q=query, cx=custom_search_engine_id, num=num_results).execute()
@@ -190,15 +284,18 @@ def browse_website(url, question):
 
 def get_text_summary(url, question):
     """Return the results of a google search"""
-    text = browse.scrape_text(url)
+    page, error_message = browse.get_page(url)
+    text = error_message or page.text
     summary = browse.summarize_text(text, question)
     return """ "Result" : """ + summary
 
 
 def get_hyperlinks(url):
     """Return the results of a google search"""
-    link_list = browse.scrape_links(url)
-    return link_list
+    page, error_message = browse.get_page(url)
+    if error_message:
+        return error_message
+    return browse.format_hyperlinks(page.links)
 
 
 def commit_memory(string):
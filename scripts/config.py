@@ -38,22 +38,51 @@ class Config(metaclass=Singleton):
         self.continuous_mode = False
         self.continuous_limit = 0
         self.speak_mode = False
+        self.stream_mode = os.getenv("STREAM_MODE", "False") == 'True'
 
         self.fast_llm_model = os.getenv("FAST_LLM_MODEL", "gpt-3.5-turbo")
         self.smart_llm_model = os.getenv("SMART_LLM_MODEL", "gpt-4")
         self.fast_token_limit = int(os.getenv("FAST_TOKEN_LIMIT", 4000))
         self.smart_token_limit = int(os.getenv("SMART_TOKEN_LIMIT", 8000))
 
+        # Local copy of tiktoken's BPE files, so token counting works offline once populated
+        self.tiktoken_cache_dir = os.getenv("TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'tiktoken_cache'))
+
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.temperature = float(os.getenv("TEMPERATURE", "1"))
         self.use_azure = os.getenv("USE_AZURE") == 'True'
         self.execute_local_commands = os.getenv('EXECUTE_LOCAL_COMMANDS', 'False') == 'True'
+        # Let the AI reply with a list of commands, read-only ones run concurrently
+        self.multi_command = os.getenv("MULTI_COMMAND", "False") == 'True'
+        self.multi_command_workers = int(os.getenv("MULTI_COMMAND_WORKERS", 4))
+
+        # Persistent cache for deterministic (temperature 0) completions
+        self.llm_cache_enabled = os.getenv("LLM_CACHE", "True") == 'True'
+        self.llm_cache_dir = os.getenv("LLM_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'llm_cache'))
+        self.llm_cache_ttl = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 60 * 60))
+        self.llm_cache_max_size_mb = int(os.getenv("LLM_CACHE_MAX_SIZE_MB", 100))
+        self.llm_cache_hot_entries = int(os.getenv("LLM_CACHE_HOT_ENTRIES", 256))
+
+        # Route each call between the fast and smart models based on prompt size and live latency/errors
+        self.llm_router_enabled = os.getenv("LLM_ROUTER", "False") == 'True'
+        self.llm_router_cooldown = float(os.getenv("LLM_ROUTER_COOLDOWN", 30))
+        # Call sites that may use whichever model is currently faster
+        self.llm_router_interchangeable_call_sites = [
+            site.strip() for site in os.getenv("LLM_ROUTER_INTERCHANGEABLE_CALL_SITES", "summarize_text,fix_json").split(",")
+            if site.strip()]
+
+        # Record/replay of LLM and embedding requests: off, record, replay or strict
+        self.llm_cassette_mode = os.getenv("LLM_CASSETTE_MODE", "off")
+        self.llm_cassette_path = os.getenv("LLM_CASSETTE_PATH", os.path.join(os.path.dirname(__file__), '..', 'cassettes', 'auto-gpt.jsonl.gz'))
 
         if self.use_azure:
             self.load_azure_config()
             openai.api_type = self.openai_api_type
             openai.api_base = self.openai_api_base
             openai.api_version = self.openai_api_version
+        elif os.getenv("OPENAI_API_BASE"):
+            # e.g. the bundled mock server (scripts/mock_openai_server.py) for load testing
+            openai.api_base = os.getenv("OPENAI_API_BASE")
 
         self.elevenlabs_api_key = os.getenv("ELEVENLABS_API_KEY")
         self.elevenlabs_voice_1_id = os.getenv("ELEVENLABS_VOICE_1_ID")
@@ -74,6 +103,38 @@ class Config(metaclass=Singleton):
         # User agent headers to use when browsing web
         # Some websites might just completely deny request with an error code if no user agent was found.
         self.user_agent_header = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/83.0.4103.97 Safari/537.36"}
+        # Seconds a browsed page is reused by later commands on the same URL
+        self.browse_page_ttl = float(os.getenv("BROWSE_PAGE_TTL", 60))
+        # Chunks of a browsed page summarized at the same time
+        self.browse_summary_workers = int(os.getenv("BROWSE_SUMMARY_WORKERS", 8))
+        # Chunks of a page most relevant to the question that are summarized, 0 summarizes them all
+        self.browse_summary_top_k = int(os.getenv("BROWSE_SUMMARY_TOP_K", 5))
+        # Backend extracting text and links from pages: lxml, or soup for BeautifulSoup's html.parser
+        self.browse_html_extractor = os.getenv("BROWSE_HTML_EXTRACTOR", "lxml")
+        # Bytes of a page downloaded at most, the rest is cut off
+        self.browse_max_bytes = int(os.getenv("BROWSE_MAX_BYTES", 2 * 1024 * 1024))
+        # Disk cache of chunk and page summaries, keyed by content hash and question
+        self.summary_cache_enabled = os.getenv("SUMMARY_CACHE", "True") == 'True'
+        self.summary_cache_dir = os.getenv("SUMMARY_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'summary_cache'))
+        self.summary_cache_ttl = float(os.getenv("SUMMARY_CACHE_TTL", 7 * 24 * 60 * 60))
+        self.summary_cache_max_size_mb = int(os.getenv("SUMMARY_CACHE_MAX_SIZE_MB", 50))
+        # Tokens of page text per summarized chunk, and tokens repeated between consecutive chunks
+        self.browse_chunk_tokens = int(os.getenv("BROWSE_CHUNK_TOKENS", 2000))
+        self.browse_chunk_overlap = int(os.getenv("BROWSE_CHUNK_OVERLAP", 0))
+        # Disk cache of browsed pages, revalidated with ETag/Last-Modified once stale
+        self.http_cache_enabled = os.getenv("HTTP_CACHE", "True") == 'True'
+        self.http_cache_dir = os.getenv("HTTP_CACHE_DIR", os.path.join(os.path.dirname(__file__), '..', 'http_cache'))
+        # Seconds a page without Cache-Control or Expires headers is reused
+        self.http_cache_ttl = float(os.getenv("HTTP_CACHE_TTL", 600))
+        self.http_cache_max_size_mb = int(os.getenv("HTTP_CACHE_MAX_SIZE_MB", 50))
+        # Connection pools of the session shared by browsing, search, speech and image generation
+        self.http_pool_connections = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+        self.http_pool_maxsize = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+        # Connection errors are retried with exponential backoff
+        self.http_max_retries = int(os.getenv("HTTP_MAX_RETRIES", 3))
+        self.http_retry_backoff = float(os.getenv("HTTP_RETRY_BACKOFF", 0.5))
+        # Requests in flight to a single host at any time
+        self.http_max_per_host = int(os.getenv("HTTP_MAX_PER_HOST", 4))
         self.redis_host = os.getenv("REDIS_HOST", "localhost")
         self.redis_port = os.getenv("REDIS_PORT", "6379")
         self.redis_password = os.getenv("REDIS_PASSWORD", "")
@@ -82,6 +143,13 @@ class Config(metaclass=Singleton):
         # Note that indexes must be created on db 0 in redis, this is not configurable.
 
         self.memory_backend = os.getenv("MEMORY_BACKEND", 'local')
+        # Tokens available for the system prompt and the relevant memories shown with it
+        self.memory_token_limit = int(os.getenv("MEMORY_TOKEN_LIMIT", 2500))
+        # Look up the next cycle's relevant memories while a command executes
+        self.memory_prefetch = os.getenv("MEMORY_PREFETCH", "False") == 'True'
+        # Older messages are summarized and archived once the history holds this many (0 keeps everything)
+        self.history_max_messages = int(os.getenv("HISTORY_MAX_MESSAGES", 0))
+        self.history_archive_path = os.getenv("HISTORY_ARCHIVE_PATH", os.path.join(os.path.dirname(__file__), '..', 'logs', 'message_history.jsonl'))
         # Initialize the OpenAI API client
         openai.api_key = self.openai_api_key
 
@@ -138,6 +206,10 @@ class Config(metaclass=Singleton):
         """Set the speak mode value."""
         self.speak_mode = value
 
+    def set_stream_mode(self, value: bool):
+        """Set the stream mode value."""
+        self.stream_mode = value
+
     def set_fast_llm_model(self, value: str):
         """Set the fast LLM model value."""
         self.fast_llm_model = value
@@ -0,0 +1,123 @@
+"""Extract the visible text and the hyperlinks of an HTML page."""
+import abc
+from typing import List, Tuple
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Tags whose content is never shown
+SKIPPED_TAGS = {"script", "style"}
+
+
+def clean_text(text: str) -> str:
+    """Strips every line and returns the non-empty phrases, one per line"""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def extract_hyperlinks(soup) -> List[Tuple[str, str]]:
+    """Extract hyperlinks from a BeautifulSoup object"""
+    hyperlinks = []
+    for link in soup.find_all('a', href=True):
+        hyperlinks.append((link.text, link['href']))
+    return hyperlinks
+
+
+class HTMLExtractor(abc.ABC):
+    """Base class of the extraction backends"""
+
+    name = None
+
+    @abc.abstractmethod
+    def extract(self, html: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """Returns the visible text of a page, one phrase per line, and the (text, url) of its hyperlinks."""
+        pass
+
+
+class SoupExtractor(HTMLExtractor):
+    """Parses the page into a tree with BeautifulSoup and the pure-Python html.parser, then walks it"""
+
+    name = "soup"
+
+    def extract(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+        for script in soup(list(SKIPPED_TAGS)):
+            script.extract()
+        return clean_text(soup.get_text()), extract_hyperlinks(soup)
+
+
+class _TextAndLinks:
+    """lxml parser target collecting the text and the links as the page is parsed, without building a tree"""
+
+    def __init__(self):
+        self.text = []
+        # (url, text parts) of every link, in document order
+        self.links = []
+        self.skip_depth = 0
+        # Text parts of the links being read, None for anchors without a href
+        self.open_links = []
+
+    def start(self, tag, attrib):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            parts = None
+            if href is not None:
+                parts = []
+                self.links.append((href, parts))
+            self.open_links.append(parts)
+
+    def end(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skip_depth -= 1
+        elif tag == "a" and self.open_links:
+            self.open_links.pop()
+
+    def data(self, data):
+        if self.skip_depth:
+            return
+        self.text.append(data)
+        for parts in self.open_links:
+            if parts is not None:
+                parts.append(data)
+
+    def close(self):
+        return self
+
+
+class LxmlExtractor(HTMLExtractor):
+    """
+    Extracts the text and the links in a single pass of libxml2's HTML parser.
+
+    Nothing is kept of the page but the text and the links, so large pages are
+    cheap in both time and memory.
+    """
+
+    name = "lxml"
+
+    def extract(self, html):
+        if not html.strip():
+            return "", []
+        target = _TextAndLinks()
+        parser = etree.HTMLParser(target=target)
+        parser.feed(html)
+        parser.close()
+        return clean_text("".join(target.text)), [("".join(parts), href) for href, parts in target.links]
+
+
+EXTRACTORS = {extractor.name: extractor for extractor in (SoupExtractor, LxmlExtractor)}
+
+
+def get_extractor(name: str = "lxml") -> HTMLExtractor:
+    """Returns the named extraction backend, the soup one if lxml is not installed"""
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor: {name}, choose from {', '.join(EXTRACTORS)}")
+    if name == "lxml" and etree is None:
+        return SoupExtractor()
+    return EXTRACTORS[name]()
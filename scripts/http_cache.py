@@ -0,0 +1,171 @@
+"""Disk-backed HTTP cache for pages fetched while browsing."""
+import base64
+import hashlib
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from llm_cache import DiskLRUCache
+
+# Response headers that are not worth keeping
+SKIPPED_HEADERS = {"set-cookie", "connection", "keep-alive", "transfer-encoding", "content-encoding", "content-length"}
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Parses a Cache-Control header into a dict of lower-cased directives and their values."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers, default_ttl: float) -> float:
+    """
+    Returns how many seconds a response may be reused without revalidation.
+
+    Uses max-age, then Expires, then default_ttl for responses that carry no
+    freshness information. no-cache responses must always be revalidated.
+    """
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives:
+        return 0
+    max_age = directives.get("max-age") or ""
+    if max_age.isdigit():
+        age = headers.get("Age") or ""
+        return max(0, int(max_age) - (int(age) if age.isdigit() else 0))
+    if headers.get("Expires") is not None:
+        expires = _parse_http_date(headers.get("Expires"))
+        # An invalid Expires date means already expired
+        if expires is None:
+            return 0
+        date = _parse_http_date(headers.get("Date")) or time.time()
+        return max(0, expires - date)
+    return default_ttl
+
+
+class HTTPCache:
+    """
+    Caches successful GET responses on disk.
+
+    Fresh responses are served without a request. Stale ones that carry an ETag or
+    Last-Modified are revalidated with a conditional request, a 304 reply refreshes
+    the stored copy. Responses marked no-store or Vary: * are never stored.
+    """
+
+    def __init__(self, directory: str, default_ttl: float = 600, max_size_bytes: int = 50 * 1024 * 1024) -> None:
+        self.store = DiskLRUCache(directory, max_size_bytes=max_size_bytes, hot_entries=32)
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+            fetch: Optional[Callable] = None) -> requests.Response:
+        """
+        Returns the response for a GET request, from the cache when possible.
+
+        Args:
+            url: The URL to get.
+            headers: Request headers.
+            timeout: Request timeout in seconds.
+            fetch: Function making the request, called like requests.get. Defaults to requests.get.
+        """
+        fetch = fetch or requests.get
+        key = self.make_key(url)
+        entry = self.store.get(key)
+
+        if entry is not None and time.time() < entry["expires"]:
+            self._count("hits")
+            return self._to_response(url, entry)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry["headers"].get("etag"):
+                request_headers["If-None-Match"] = entry["headers"]["etag"]
+            if entry["headers"].get("last-modified"):
+                request_headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+
+        response = fetch(url, headers=request_headers, timeout=timeout)
+
+        if entry is not None and response.status_code == 304:
+            self._count("revalidated")
+            entry["headers"].update(self._headers_to_store(response.headers))
+            entry["expires"] = time.time() + freshness_lifetime(CaseInsensitiveDict(entry["headers"]), self.default_ttl)
+            self.store.set(key, entry)
+            return self._to_response(url, entry)
+
+        self._count("misses")
+        self._store(key, response)
+        return response
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @staticmethod
+    def _headers_to_store(headers) -> Dict[str, str]:
+        return {name.lower(): value for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS}
+
+    def _store(self, key: str, response: requests.Response) -> None:
+        if response.status_code != 200 or getattr(response, "truncated", False):
+            return
+        headers = response.headers
+        directives = parse_cache_control(headers.get("Cache-Control"))
+        if "no-store" in directives or headers.get("Vary", "").strip() == "*":
+            return
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        has_validator = headers.get("ETag") or headers.get("Last-Modified")
+        if lifetime <= 0 and not has_validator:
+            # Could never be used again
+            return
+        self.store.set(key, {
+            "status_code": response.status_code,
+            "headers": self._headers_to_store(headers),
+            "encoding": response.encoding,
+            "body": base64.b64encode(response.content).decode("ascii"),
+            "expires": time.time() + lifetime,
+        })
+
+    @staticmethod
+    def _to_response(url: str, entry: Dict) -> requests.Response:
+        response = requests.Response()
+        response.url = url
+        response.status_code = entry["status_code"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = entry["encoding"]
+        response._content = base64.b64decode(entry["body"])
+        response.from_cache = True
+        return response
+
+    def get_stats(self) -> Dict[str, float]:
+        """Returns the hit counters, the hit rate and the size of the store."""
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.revalidated) / lookups if lookups else 0.0,
+                "entries": len(self.store),
+                "size_bytes": self.store.size_bytes(),
+            }
@@ -0,0 +1,151 @@
+"""Shared HTTP session for outbound requests: browsing, search, speech and image generation."""
+import contextlib
+import threading
+from typing import Dict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+
+cfg = Config()
+
+
+class CountingAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that remembers how many connections and requests its pools
+    have handled, including pools already evicted from the pool manager.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._retired_connections = 0
+        self._retired_requests = 0
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def retire(pool):
+            self._retired_connections += pool.num_connections
+            self._retired_requests += pool.num_requests
+            dispose(pool)
+
+        pools.dispose_func = retire
+
+    def get_counts(self):
+        """Returns the number of connections opened and requests sent through this adapter."""
+        connections, sent = self._retired_connections, self._retired_requests
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                sent += pool.num_requests
+        return connections, sent
+
+
+class PooledSession(requests.Session):
+    """
+    A requests.Session that keeps connections alive in pools shared by every
+    caller, retries connection errors with exponential backoff and caps the
+    number of requests in flight to each host.
+
+    Only failures to connect are retried, the request never reached the server
+    so retrying is safe for any method. Read errors and error statuses are
+    returned to the caller as usual.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, max_retries: int = 3,
+                 backoff_factor: float = 0.5, max_per_host: int = 4) -> None:
+        super().__init__()
+        retry = Retry(total=max_retries, connect=max_retries, read=False, status=0, other=0,
+                      backoff_factor=backoff_factor, raise_on_status=False)
+        for prefix in ("http://", "https://"):
+            self.mount(prefix, CountingAdapter(
+                pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry))
+        self.max_per_host = max_per_host
+        self._host_slots = {}
+        self._lock = threading.Lock()
+        # Hosts whose slot the current thread holds
+        self._held = threading.local()
+        self.requests = 0
+        self.waited_for_host = 0
+
+    def _get_host_slot(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    @contextlib.contextmanager
+    def host_slot(self, url: str):
+        """
+        Holds one of the request slots of the url's host.
+
+        Requests only hold a slot until their headers arrive, so a caller reading
+        a streamed body wraps both the request and the reading in this. Requests
+        made by the same thread while it holds the slot do not take another one.
+        """
+        host = urlparse(url).netloc.lower()
+        held = getattr(self._held, "hosts", None)
+        if held is None:
+            held = self._held.hosts = set()
+        if host in held:
+            yield
+            return
+        slot = self._get_host_slot(host)
+        if not slot.acquire(blocking=False):
+            with self._lock:
+                self.waited_for_host += 1
+            slot.acquire()
+        held.add(host)
+        try:
+            yield
+        finally:
+            held.discard(host)
+            slot.release()
+
+    def request(self, method, url, *args, **kwargs):
+        with self._lock:
+            self.requests += 1
+        with self.host_slot(url):
+            return super().request(method, url, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Returns the requests made, the connections opened and how often a connection was reused."""
+        connections = sent = 0
+        for adapter in self.adapters.values():
+            if isinstance(adapter, CountingAdapter):
+                adapter_connections, adapter_sent = adapter.get_counts()
+                connections += adapter_connections
+                sent += adapter_sent
+        reused = max(0, sent - connections)
+        return {
+            "requests": self.requests,
+            "connections_opened": connections,
+            "connections_reused": reused,
+            "reuse_rate": reused / sent if sent else 0.0,
+            "waited_for_host": self.waited_for_host,
+        }
+
+
+session = PooledSession(
+    pool_connections=cfg.http_pool_connections,
+    pool_maxsize=cfg.http_pool_maxsize,
+    max_retries=cfg.http_max_retries,
+    backoff_factor=cfg.http_retry_backoff,
+    max_per_host=cfg.http_max_per_host,
+)
+
+
+def mount_on(other: requests.Session) -> None:
+    """Makes a session created by a third-party library use the shared connection pools and retries."""
+    for prefix, adapter in session.adapters.items():
+        other.mount(prefix, adapter)
+
+
+def get_stats():
+    """Return the connection reuse counters of the shared session"""
+    return session.get_stats()
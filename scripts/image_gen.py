@@ -1,8 +1,8 @@
-import requests
 import io
 import os.path
 from PIL import Image
 from config import Config
+import http_pool
 import uuid
 import openai
 from base64 import b64decode
@@ -43,7 +43,7 @@ def generate_image(prompt):
         API_URL = "https://api-inference.huggingface.co/models/CompVis/stable-diffusion-v1-4"
         headers = {"Authorization": "Bearer " + cfg.huggingface_api_token}
 
-        response = requests.post(API_URL, headers=headers, json={
+        response = http_pool.session.post(API_URL, headers=headers, json={
             "inputs": prompt,
         })
 
@@ -90,7 +90,7 @@ def fix_json(json_str: str, schema: str) -> str:
     if not json_str.startswith("`"):
         json_str = "```json\n" + json_str + "\n```"
     result_string = call_ai_function(
-        function_string, args, description_string, model=cfg.fast_llm_model
+        function_string, args, description_string, model=cfg.fast_llm_model, call_site="fix_json"
     )
     logger.debug("------------ JSON FIX ATTEMPT ---------------")
     logger.debug(f"Original JSON: {json_str}")
@@ -125,3 +125,86 @@ def correct_json(json_str: str) -> str:
         if balanced_str := balance_braces(json_str):
             return balanced_str
     return json_str
+
+
+class StreamingJsonScanner:
+    """
+    Incrementally scans a streamed JSON object and reports each top-level
+    field as soon as its value has been fully received.
+
+    Any text before the first opening brace is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.done = False
+        self._string_start = None
+        self._candidate_key = None
+        self._current_key = None
+        self._value_start = None
+
+    def feed(self, text: str) -> list:
+        """
+        Add the next piece of the stream.
+
+        Args:
+            text (str): The streamed text.
+
+        Returns:
+            list: (key, value) tuples for the top-level fields completed by this piece.
+        """
+        completed = []
+        start = len(self.buffer)
+        self.buffer += text
+        for pos in range(start, len(self.buffer)):
+            if self.done:
+                break
+            char = self.buffer[pos]
+            if self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self._current_key is None:
+                        self._candidate_key = self.buffer[self._string_start + 1:pos]
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self._string_start = pos
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                if self.depth == 1:
+                    self._complete_field(pos, completed)
+                    self.done = True
+                self.depth -= 1
+                if self.depth == 1 and self._current_key is not None:
+                    self._complete_field(pos + 1, completed)
+            elif self.depth == 1 and char == ':' and self._candidate_key is not None:
+                self._current_key = self._candidate_key
+                self._candidate_key = None
+                self._value_start = pos + 1
+            elif self.depth == 1 and char == ',':
+                self._complete_field(pos, completed)
+        return completed
+
+    def _complete_field(self, end: int, completed: list) -> None:
+        if self._current_key is None:
+            return
+        raw_value = self.buffer[self._value_start:end].strip()
+        key = self._current_key
+        self._current_key = None
+        try:
+            completed.append((key, json.loads(raw_value)))
+        except json.JSONDecodeError:
+            pass
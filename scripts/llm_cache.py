@@ -0,0 +1,260 @@
+"""Persistent caches of LLM responses and browsing summaries."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class DiskLRUCache:
+    """
+    A size-bounded key/value store of JSON documents on disk, fronted by an
+    in-process hot tier.
+
+    Entries older than `ttl` seconds are treated as misses and removed.
+    When the store grows past `max_size_bytes`, the least recently used
+    entries are evicted. Recency is tracked in memory for hits on both tiers,
+    and starts from the file modification times when the store is opened.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None,
+                 max_size_bytes: int = 100 * 1024 * 1024, hot_entries: int = 256) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size_bytes = max_size_bytes
+        self.hot_entries = hot_entries
+        self._hot = OrderedDict()
+        self._sizes = {}
+        # Time each entry was last written or read
+        self._last_used = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                self._sizes[entry.name[:-5]] = stat.st_size
+                self._last_used[entry.name[:-5]] = stat.st_mtime
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the value stored under key, or None if missing or expired.
+        """
+        with self._lock:
+            if key in self._hot:
+                created, value = self._hot[key]
+                if not self._expired(created):
+                    self._hot.move_to_end(key)
+                    self._last_used[key] = time.time()
+                    return value
+                self._remove(key)
+                return None
+
+            if key not in self._sizes:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                return None
+            if self._expired(entry["created"]):
+                self._remove(key)
+                return None
+            # Refresh the modification time so recency survives a restart
+            os.utime(path)
+            self._last_used[key] = time.time()
+            self._remember(key, entry["created"], entry["value"])
+            return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a JSON serializable value under key."""
+        created = time.time()
+        data = json.dumps({"created": created, "value": value}, ensure_ascii=False)
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._sizes[key] = os.path.getsize(path)
+            self._last_used[key] = created
+            self._remember(key, created, value)
+            self._evict()
+
+    def clear(self) -> None:
+        """Removes every entry from both tiers."""
+        with self._lock:
+            for key in list(self._sizes):
+                self._remove(key)
+            self._hot.clear()
+
+    def size_bytes(self) -> int:
+        """Returns the number of bytes currently used on disk."""
+        return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def _remember(self, key: str, created: float, value: Any) -> None:
+        self._hot[key] = (created, value)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_entries:
+            self._hot.popitem(last=False)
+
+    def _remove(self, key: str) -> None:
+        self._hot.pop(key, None)
+        self._sizes.pop(key, None)
+        self._last_used.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        total = sum(self._sizes.values())
+        if total <= self.max_size_bytes:
+            return
+
+        for key in sorted(self._sizes, key=lambda key: self._last_used.get(key, 0)):
+            if total <= self.max_size_bytes:
+                break
+            total -= self._sizes[key]
+            self._remove(key)
+
+
+class LLMResponseCache:
+    """
+    Caches chat completions keyed by (model, messages, temperature, max_tokens).
+
+    Only deterministic calls (temperature 0) should be routed through this cache.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None,
+                 max_size_bytes: int = 100 * 1024 * 1024, hot_entries: int = 256) -> None:
+        self.store = DiskLRUCache(directory, ttl, max_size_bytes, hot_entries)
+        self.hits = 0
+        self.misses = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float,
+                 max_tokens: Optional[int]) -> str:
+        """Returns a content hash identifying the request."""
+        payload = json.dumps(
+            {
+                "model": model,
+                "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model, messages, temperature, max_tokens) -> Optional[str]:
+        """Returns the cached completion for the request, or None on a miss."""
+        entry = self.store.get(self.make_key(model, messages, temperature, max_tokens))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            usage = entry.get("usage") or {}
+            self.saved_prompt_tokens += usage.get("prompt_tokens", 0)
+            self.saved_completion_tokens += usage.get("completion_tokens", 0)
+        return entry["content"]
+
+    def set(self, model, messages, temperature, max_tokens, content: str,
+            usage: Optional[Dict[str, int]] = None) -> None:
+        """Stores a completion and its token usage."""
+        key = self.make_key(model, messages, temperature, max_tokens)
+        self.store.set(key, {"content": content, "usage": dict(usage or {})})
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and the tokens saved by cache hits."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+            "entries": len(self.store),
+            "size_bytes": self.store.size_bytes(),
+        }
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases a question and collapses its whitespace and trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip(" ?.!")
+
+
+class SummaryCache:
+    """
+    Caches browsing summaries: the summary of each chunk, keyed by
+    (chunk hash, normalized question, model), and the final summary of each
+    page, keyed by (page hash, normalized question, model, settings), where the
+    settings are those changing which chunks the page is summarized from.
+
+    Chunks shared by several pages, such as navigation and footers, are only
+    summarized once.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None,
+                 max_size_bytes: int = 50 * 1024 * 1024, hot_entries: int = 256) -> None:
+        self.store = DiskLRUCache(directory, ttl, max_size_bytes, hot_entries)
+        self.chunk_hits = 0
+        self.chunk_misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(kind: str, text: str, question: str, model: str, settings: Optional[Dict] = None) -> str:
+        """Returns a hash identifying the summary of a chunk or a page ("chunk" or "page") for a question."""
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        payload = json.dumps([kind, text_hash, normalize_question(question), model, settings],
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get(self, kind: str, text: str, question: str, model: str, settings: Optional[Dict] = None) -> Optional[str]:
+        entry = self.store.get(self.make_key(kind, text, question, model, settings))
+        with self._lock:
+            counter = f"{kind}_{'misses' if entry is None else 'hits'}"
+            setattr(self, counter, getattr(self, counter) + 1)
+        return None if entry is None else entry["summary"]
+
+    def get_chunk(self, chunk: str, question: str, model: str) -> Optional[str]:
+        """Returns the cached summary of a chunk, or None on a miss."""
+        return self._get("chunk", chunk, question, model)
+
+    def set_chunk(self, chunk: str, question: str, model: str, summary: str) -> None:
+        self.store.set(self.make_key("chunk", chunk, question, model), {"summary": summary})
+
+    def get_page(self, text: str, question: str, model: str, settings: Optional[Dict] = None) -> Optional[str]:
+        """Returns the cached final summary of a page summarized with the given settings, or None on a miss."""
+        return self._get("page", text, question, model, settings)
+
+    def set_page(self, text: str, question: str, model: str, summary: str, settings: Optional[Dict] = None) -> None:
+        self.store.set(self.make_key("page", text, question, model, settings), {"summary": summary})
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters of chunk and page summaries."""
+        return {
+            "chunk_hits": self.chunk_hits,
+            "chunk_misses": self.chunk_misses,
+            "page_hits": self.page_hits,
+            "page_misses": self.page_misses,
+            "entries": len(self.store),
+            "size_bytes": self.store.size_bytes(),
+        }
@@ -1,52 +1,368 @@
+import threading
 import time
 import openai
 from colorama import Fore
+from cassette import get_cassette
 from config import Config
+from llm_cache import LLMResponseCache
+from logger import logger
+from singleflight import SingleFlight
+import token_counter
+from usage_tracker import usage_tracker
 
 cfg = Config()
 
 openai.api_key = cfg.openai_api_key
 
 
+response_cache = LLMResponseCache(
+    cfg.llm_cache_dir,
+    ttl=cfg.llm_cache_ttl,
+    max_size_bytes=cfg.llm_cache_max_size_mb * 1024 * 1024,
+    hot_entries=cfg.llm_cache_hot_entries,
+) if cfg.llm_cache_enabled else None
+
+
+def get_cache_stats():
+    """Return the response cache counters, or None if the cache is disabled"""
+    return response_cache.get_stats() if response_cache else None
+
+
+# Identical completions requested concurrently share a single API call
+completion_flight = SingleFlight()
+
+
+def get_singleflight_stats():
+    """Return how many completion calls were made and how many were saved by sharing in-flight requests"""
+    return completion_flight.get_stats()
+
+
+def get_usage_stats():
+    """Return token, cost and latency aggregates per call site"""
+    return usage_tracker.get_stats()
+
+
+def get_router_stats():
+    """Return the model router latency and failure stats, or None if routing is disabled"""
+    return router.get_stats() if router else None
+
+
+class ModelRouter:
+    """
+    Chooses the model for each call and fails over between the fast and smart models.
+
+    The requested model is preferred unless the prompt does not fit its token limit,
+    it recently returned a rate limit or server error, or the call site accepts
+    either model and the other one is currently much faster.
+
+    Models and token limits left as None are read from the config on every call,
+    so --gpt3only and --gpt4only apply even though the router is created first.
+    Nothing is routed while the fast and smart models are the same.
+    """
+
+    def __init__(self, fast_model=None, smart_model=None, fast_token_limit=None, smart_token_limit=None,
+                 cooldown=30.0, interchangeable_call_sites=(), latency_ratio=0.5, smoothing=0.2):
+        self._fast_model = fast_model
+        self._smart_model = smart_model
+        self._fast_token_limit = fast_token_limit
+        self._smart_token_limit = smart_token_limit
+        self.cooldown = cooldown
+        self.interchangeable_call_sites = set(interchangeable_call_sites)
+        self.latency_ratio = latency_ratio
+        self.smoothing = smoothing
+        self.latency = {}
+        self.failures = {}
+        self.cooldown_until = {}
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    @property
+    def fast_model(self):
+        return self._fast_model or cfg.fast_llm_model
+
+    @property
+    def smart_model(self):
+        return self._smart_model or cfg.smart_llm_model
+
+    def token_limit(self, model):
+        """Returns the token limit of a routed model"""
+        if model == self.fast_model:
+            return self._fast_token_limit or cfg.fast_token_limit
+        return self._smart_token_limit or cfg.smart_token_limit
+
+    def other_model(self, model):
+        """Returns the alternative to model, or None if model is not routed"""
+        fast_model, smart_model = self.fast_model, self.smart_model
+        if fast_model == smart_model:
+            return None
+        if model == fast_model:
+            return smart_model
+        if model == smart_model:
+            return fast_model
+        return None
+
+    def in_cooldown(self, model):
+        return self.cooldown_until.get(model, 0) > time.time()
+
+    def candidates(self, model, messages, max_tokens=None, call_site=None):
+        """
+        Returns the models to try for a call, in order of preference.
+
+        Args:
+            model (str): The model requested by the caller.
+            messages (list): The messages to send.
+            max_tokens (int, optional): Tokens reserved for the completion.
+            call_site (str, optional): Where the call comes from.
+        """
+        other = self.other_model(model)
+        if other is None:
+            return [model]
+
+        # Callers such as chat_with_ai ask for exactly the tokens the model has left after
+        # the prompt, so the prompt must be counted exactly, an estimate would overflow
+        needed = _max_prompt_tokens(messages) + (max_tokens or 0)
+        if needed > min(self.token_limit(model), self.token_limit(other)):
+            needed = token_counter.count_message_tokens(messages, model) + (max_tokens or 0)
+        fitting = [m for m in (model, other) if needed <= self.token_limit(m)]
+        if not fitting:
+            return [model]
+        if model not in fitting:
+            logger.debug(f"Router: {call_site} prompt ({needed} tokens) does not fit {model}, using {other}")
+            return [other]
+        if other not in fitting:
+            return [model]
+
+        ordered = [model, other]
+        with self._lock:
+            requested_latency = self.latency.get(model)
+            other_latency = self.latency.get(other)
+        if (call_site in self.interchangeable_call_sites and requested_latency and other_latency
+                and other_latency < requested_latency * self.latency_ratio):
+            logger.debug(f"Router: {call_site} prefers {other} ({other_latency:.2f}s) over {model} ({requested_latency:.2f}s)")
+            ordered = [other, model]
+        # Models that recently failed go last
+        ordered.sort(key=self.in_cooldown)
+        if ordered[0] != model:
+            logger.debug(f"Router: routing {call_site} call from {model} to {ordered[0]}")
+        return ordered
+
+    def record_success(self, model, latency):
+        with self._lock:
+            previous = self.latency.get(model)
+            self.latency[model] = latency if previous is None else \
+                (1 - self.smoothing) * previous + self.smoothing * latency
+
+    def record_failure(self, model, reason):
+        with self._lock:
+            self.failures[model] = self.failures.get(model, 0) + 1
+            self.cooldown_until[model] = time.time() + self.cooldown
+        logger.debug(f"Router: {model} failed ({reason}), cooling down for {self.cooldown}s")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "latency": dict(self.latency),
+                "failures": dict(self.failures),
+                "fallbacks": self.fallbacks,
+                "cooling_down": [m for m in self.cooldown_until if self.in_cooldown(m)],
+            }
+
+
+def _max_prompt_tokens(messages):
+    """An upper bound of the prompt size without tokenizing it"""
+    return sum(token_counter.max_string_tokens(message["content"]) + len(message["role"]) + 4
+               for message in messages) + 3
+
+
+def _estimate_prompt_tokens(messages):
+    """Cheap estimate of the prompt size, without tokenizing it"""
+    return sum(token_counter.estimate_string_tokens(message["content"]) + 4 for message in messages) + 3
+
+
+# Follows the models of the config, which the command line arguments may change after import
+router = ModelRouter(
+    cooldown=cfg.llm_router_cooldown,
+    interchangeable_call_sites=cfg.llm_router_interchangeable_call_sites,
+) if cfg.llm_router_enabled else None
+
+
+def _send_completion_request(model, messages, temperature, max_tokens, stream):
+    if cfg.use_azure:
+        return openai.ChatCompletion.create(
+            deployment_id=cfg.get_azure_deployment_id_for_model(model),
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream
+        )
+    else:
+        return openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=stream
+        )
+
+
 # Overly simple abstraction until we create something better
 # simple retry mechanism when getting a rate error or a bad gateway
-def create_chat_completion(messages, model=None, temperature=cfg.temperature, max_tokens=None)->str:
-    """Create a chat completion using the OpenAI API"""
-    response = None
+def _create_completion_request(model, messages, temperature, max_tokens, stream=False, call_site=None):
+    """
+    Send a chat completion request to the OpenAI API, retrying on rate limits and bad gateways.
+
+    With the model router enabled, a rate limit or server error moves the call to the
+    other model straight away, and only waits once every candidate has failed.
+    """
+    if router:
+        candidates = router.candidates(model, messages, max_tokens, call_site)
+    else:
+        candidates = [model]
+
+    started = time.time()
+    failed_attempts = 0
     num_retries = 5
     for attempt in range(num_retries):
-        try:
-            if cfg.use_azure:
-                response = openai.ChatCompletion.create(
-                    deployment_id=cfg.get_azure_deployment_id_for_model(model),
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-            else:
-                response = openai.ChatCompletion.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-            break
-        except openai.error.RateLimitError:
-            if cfg.debug_mode:
-                print(Fore.RED + "Error: ", "API Rate Limit Reached. Waiting 20 seconds..." + Fore.RESET)
-            time.sleep(20)
-        except openai.error.APIError as e:
-            if e.http_status == 502:
+        for candidate in candidates:
+            start = time.time()
+            try:
+                response = _send_completion_request(candidate, messages, temperature, max_tokens, stream)
+            except openai.error.RateLimitError:
+                failed_attempts += 1
+                if router:
+                    router.record_failure(candidate, "rate limit")
+                    continue
+                if cfg.debug_mode:
+                    print(Fore.RED + "Error: ", "API Rate Limit Reached. Waiting 20 seconds..." + Fore.RESET)
+                break
+            except (openai.error.APIError, openai.error.ServiceUnavailableError) as e:
+                failed_attempts += 1
+                status = e.http_status or 503
+                if router and status >= 500:
+                    router.record_failure(candidate, f"HTTP {status}")
+                    continue
+                if status != 502 or attempt == num_retries - 1:
+                    raise
                 if cfg.debug_mode:
                     print(Fore.RED + "Error: ", "API Bad gateway. Waiting 20 seconds..." + Fore.RESET)
-                time.sleep(20)
-            else:
-                raise
-            if attempt == num_retries - 1:
-                raise
+                break
+
+            if router:
+                router.record_success(candidate, time.time() - start)
+                if candidate != model:
+                    router.fallbacks += 1
+            if stream:
+                return _track_stream(response, call_site, candidate, messages, started, failed_attempts)
+            usage = response.get("usage") or {}
+            usage_tracker.record(
+                call_site, candidate, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                latency=time.time() - started, retries=failed_attempts)
+            return response
+
+        if router and cfg.debug_mode:
+            print(Fore.RED + "Error: ", "All models are failing. Waiting 20 seconds..." + Fore.RESET)
+        time.sleep(20)
+
+    raise RuntimeError("Failed to get response after 5 retries")
+
+
+def _track_stream(response, call_site, model, messages, started, retries):
+    """Pass a streamed response through, recording its estimated usage once it is complete"""
+    characters = 0
+    for chunk in response:
+        characters += len(chunk.choices[0].delta.get("content") or "")
+        yield chunk
+    usage_tracker.record(
+        call_site, model, _estimate_prompt_tokens(messages), characters // 4,
+        latency=time.time() - started, retries=retries)
+
+
+def _request_completion(model, messages, temperature, max_tokens, call_site=None):
+    """Return the content and token usage of a completion, replaying it from the cassette if one is active"""
+    cassette = get_cassette(cfg)
+    request = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    if cassette:
+        recorded = cassette.play("chat", request)
+        if recorded is not None:
+            usage = recorded.get("usage") or {}
+            usage_tracker.record(call_site, model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+            return recorded["content"], recorded.get("usage")
+
+    response = _create_completion_request(model, messages, temperature, max_tokens, call_site=call_site)
+    content = response.choices[0].message["content"]
+    usage = dict(response.get("usage") or {})
+
+    if cassette:
+        cassette.record("chat", request, {"content": content, "usage": usage})
+    return content, usage
+
+
+def use_response_cache(temperature):
+    """
+    Return whether a call may be answered from the response cache: only
+    deterministic calls can be, and none while a cassette records or replays,
+    as every call must reach the cassette for a replay to be complete.
+    """
+    return response_cache is not None and temperature == 0 and get_cassette(cfg) is None
+
+
+def create_chat_completion(messages, model=None, temperature=cfg.temperature, max_tokens=None, call_site=None)->str:
+    """Create a chat completion using the OpenAI API. call_site names the caller for routing and accounting"""
+    use_cache = use_response_cache(temperature)
+    if use_cache:
+        cached = response_cache.get(model, messages, temperature, max_tokens)
+        if cached is not None:
+            usage_tracker.record(call_site, model, cached=True)
+            return cached
+
+    key = LLMResponseCache.make_key(model, messages, temperature, max_tokens)
+    content, usage = completion_flight.do(
+        key, _request_completion, model, messages, temperature, max_tokens, call_site)
+
+    if use_cache:
+        response_cache.set(model, messages, temperature, max_tokens, content, usage)
+
+    return content
+
+
+def create_chat_completion_stream(messages, model=None, temperature=cfg.temperature, max_tokens=None, call_site=None):
+    """
+    Create a chat completion using the OpenAI API, yielding the content as it arrives.
+
+    Retries only happen before the first token has been received.
+
+    Yields:
+        str: The next piece of the completion.
+    """
+    use_cache = use_response_cache(temperature)
+    if use_cache:
+        cached = response_cache.get(model, messages, temperature, max_tokens)
+        if cached is not None:
+            usage_tracker.record(call_site, model, cached=True)
+            yield cached
+            return
+
+    cassette = get_cassette(cfg)
+    request = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    if cassette:
+        recorded = cassette.play("chat", request)
+        if recorded is not None:
+            usage_tracker.record(call_site, model, _estimate_prompt_tokens(messages), len(recorded["content"]) // 4)
+            yield recorded["content"]
+            return
+
+    response = _create_completion_request(model, messages, temperature, max_tokens, stream=True, call_site=call_site)
 
-    if response is None:
-        raise RuntimeError("Failed to get response after 5 retries")
+    pieces = []
+    for chunk in response:
+        piece = chunk.choices[0].delta.get("content")
+        if piece:
+            pieces.append(piece)
+            yield piece
 
-    return response.choices[0].message["content"]
+    content = "".join(pieces)
+    if cassette:
+        cassette.record("chat", request, {"content": content, "usage": {}})
+    if use_cache:
+        response_cache.set(model, messages, temperature, max_tokens, content)
@@ -1,9 +1,13 @@
+import atexit
 import json
 import random
+import browse
+import http_pool
 import commands as cmd
 import utils
-from memory import get_memory, get_supported_memory_backends
+from memory import get_memory, get_supported_memory_backends, MemoryPrefetcher
 import chat
+import token_counter
 from colorama import Fore, Style
 from spinner import Spinner
 import time
@@ -17,6 +21,8 @@ import argparse
 from logger import logger
 import logging
 from prompt import get_prompt
+from usage_tracker import REPORT_FILE, usage_tracker
+from message_history import MessageHistory
 
 cfg = Config()
 
@@ -61,6 +67,45 @@ def attempt_to_fix_json_by_finding_outermost_brackets(json_string):
     return json_string
 
 
+def print_thoughts(assistant_thoughts):
+    """Prints the thoughts object of the assistant's reply to the console"""
+    global ai_name
+    global cfg
+    assistant_thoughts_reasoning = None
+    assistant_thoughts_plan = None
+    assistant_thoughts_speak = None
+    assistant_thoughts_criticism = None
+    assistant_thoughts_text = assistant_thoughts.get("text")
+
+    if assistant_thoughts:
+        assistant_thoughts_reasoning = assistant_thoughts.get("reasoning")
+        assistant_thoughts_plan = assistant_thoughts.get("plan")
+        assistant_thoughts_criticism = assistant_thoughts.get("criticism")
+        assistant_thoughts_speak = assistant_thoughts.get("speak")
+
+    logger.typewriter_log(f"{ai_name.upper()} THOUGHTS:", Fore.YELLOW, assistant_thoughts_text)
+    logger.typewriter_log("REASONING:", Fore.YELLOW, assistant_thoughts_reasoning)
+
+    if assistant_thoughts_plan:
+        logger.typewriter_log("PLAN:", Fore.YELLOW, "")
+        # If it's a list, join it into a string
+        if isinstance(assistant_thoughts_plan, list):
+            assistant_thoughts_plan = "\n".join(assistant_thoughts_plan)
+        elif isinstance(assistant_thoughts_plan, dict):
+            assistant_thoughts_plan = str(assistant_thoughts_plan)
+
+        # Split the input_string using the newline character and dashes
+        lines = assistant_thoughts_plan.split('\n')
+        for line in lines:
+            line = line.lstrip("- ")
+            logger.typewriter_log("- ", Fore.GREEN, line.strip())
+
+    logger.typewriter_log("CRITICISM:", Fore.YELLOW, assistant_thoughts_criticism)
+    # Speak the assistant's thoughts
+    if cfg.speak_mode and assistant_thoughts_speak:
+        speak.say_text(assistant_thoughts_speak)
+
+
 def print_assistant_thoughts(assistant_reply):
     """Prints the assistant's thoughts to the console"""
     global ai_name
@@ -82,40 +127,7 @@ def print_assistant_thoughts(assistant_reply):
                 logger.error("Error: Invalid JSON\n", assistant_reply)
                 assistant_reply_json = attempt_to_fix_json_by_finding_outermost_brackets(assistant_reply_json)
 
-        assistant_thoughts_reasoning = None
-        assistant_thoughts_plan = None
-        assistant_thoughts_speak = None
-        assistant_thoughts_criticism = None
-        assistant_thoughts = assistant_reply_json.get("thoughts", {})
-        assistant_thoughts_text = assistant_thoughts.get("text")
-
-        if assistant_thoughts:
-            assistant_thoughts_reasoning = assistant_thoughts.get("reasoning")
-            assistant_thoughts_plan = assistant_thoughts.get("plan")
-            assistant_thoughts_criticism = assistant_thoughts.get("criticism")
-            assistant_thoughts_speak = assistant_thoughts.get("speak")
-
-        logger.typewriter_log(f"{ai_name.upper()} THOUGHTS:", Fore.YELLOW, assistant_thoughts_text)
-        logger.typewriter_log("REASONING:", Fore.YELLOW, assistant_thoughts_reasoning)
-
-        if assistant_thoughts_plan:
-            logger.typewriter_log("PLAN:", Fore.YELLOW, "")
-            # If it's a list, join it into a string
-            if isinstance(assistant_thoughts_plan, list):
-                assistant_thoughts_plan = "\n".join(assistant_thoughts_plan)
-            elif isinstance(assistant_thoughts_plan, dict):
-                assistant_thoughts_plan = str(assistant_thoughts_plan)
-
-            # Split the input_string using the newline character and dashes
-            lines = assistant_thoughts_plan.split('\n')
-            for line in lines:
-                line = line.lstrip("- ")
-                logger.typewriter_log("- ", Fore.GREEN, line.strip())
-
-        logger.typewriter_log("CRITICISM:", Fore.YELLOW, assistant_thoughts_criticism)
-        # Speak the assistant's thoughts
-        if cfg.speak_mode and assistant_thoughts_speak:
-            speak.say_text(assistant_thoughts_speak)
+        print_thoughts(assistant_reply_json.get("thoughts", {}))
 
         return assistant_reply_json
     except json.decoder.JSONDecodeError as e:
@@ -129,6 +141,40 @@ def print_assistant_thoughts(assistant_reply):
         logger.error("Error: \n", call_stack)
 
 
+def print_next_actions(commands_to_run):
+    """Prints the commands about to be executed"""
+    for command_name, arguments in commands_to_run:
+        logger.typewriter_log(
+            "NEXT ACTION: ",
+            Fore.CYAN,
+            f"COMMAND = {Fore.CYAN}{command_name}{Style.RESET_ALL}  ARGUMENTS = {Fore.CYAN}{arguments}{Style.RESET_ALL}")
+
+
+def format_command_result(command_name, result):
+    """Formats the result of a command, or its parse error, for the message history"""
+    if command_name is not None and command_name.lower().startswith("error"):
+        return f"Command {command_name} threw the following error: {result}"
+    return f"Command {command_name} returned: {result}"
+
+
+def print_usage_summary():
+    """Prints the tokens, cost and latency spent per call site"""
+    if usage_tracker.call_sites:
+        logger.debug("----------- API USAGE PER CALL SITE ----------------")
+        for line in usage_tracker.summary().split("\n"):
+            logger.debug(line)
+    http_cache_stats = browse.get_http_cache_stats()
+    if http_cache_stats and http_cache_stats["hits"] + http_cache_stats["revalidated"] + http_cache_stats["misses"]:
+        logger.debug(f"HTTP cache: {http_cache_stats}")
+    summary_cache_stats = browse.get_summary_cache_stats()
+    if summary_cache_stats and summary_cache_stats["chunk_hits"] + summary_cache_stats["chunk_misses"] \
+            + summary_cache_stats["page_hits"] + summary_cache_stats["page_misses"]:
+        logger.debug(f"Summary cache: {summary_cache_stats}")
+    http_pool_stats = http_pool.get_stats()
+    if http_pool_stats["requests"]:
+        logger.debug(f"HTTP connections: {http_pool_stats}")
+
+
 def construct_prompt():
     """Construct the prompt for the AI to respond to"""
     config = AIConfig.load()
@@ -155,6 +201,9 @@ Continue (y/n): """)
     ai_name = config.ai_name
 
     full_prompt = config.construct_full_prompt()
+    # Seed the prompt's token count so it is not tokenized again on every cycle
+    token_counter.remember_message_tokens(
+        chat.create_system_prompt_message(full_prompt), cfg.fast_llm_model, config.get_prompt_tokens(cfg.fast_llm_model))
     return full_prompt
 
 
@@ -223,6 +272,7 @@ def parse_arguments():
     parser.add_argument('--continuous', action='store_true', help='Enable Continuous Mode')
     parser.add_argument('--continuous-limit', '-l', type=int, dest="continuous_limit", help='Defines the number of times to run in continuous mode')
     parser.add_argument('--speak', action='store_true', help='Enable Speak Mode')
+    parser.add_argument('--stream', action='store_true', help='Enable Stream Mode')
     parser.add_argument('--debug', action='store_true', help='Enable Debug Mode')
     parser.add_argument('--gpt3only', action='store_true', help='Enable GPT3.5 Only Mode')
     parser.add_argument('--gpt4only', action='store_true', help='Enable GPT4 Only Mode')
@@ -256,6 +306,12 @@ def parse_arguments():
         logger.typewriter_log("Speak Mode: ", Fore.GREEN, "ENABLED")
         cfg.set_speak_mode(True)
 
+    if args.stream:
+        cfg.set_stream_mode(True)
+
+    if cfg.stream_mode:
+        logger.typewriter_log("Stream Mode: ", Fore.GREEN, "ENABLED")
+
     if args.gpt3only:
         logger.typewriter_log("GPT3.5 Only Mode: ", Fore.GREEN, "ENABLED")
         cfg.set_smart_llm_model(cfg.fast_llm_model)
@@ -280,11 +336,15 @@ def main():
     check_openai_api_key()
     parse_arguments()
     logger.set_level(logging.DEBUG if cfg.debug_mode else logging.INFO)
+    atexit.register(print_usage_summary)
+    # Only the agent writes the usage report, not every process importing the LLM helpers
+    usage_tracker.report_file = REPORT_FILE
+    atexit.register(usage_tracker.dump)
     ai_name = ""
     prompt = construct_prompt()
     # print(prompt)
     # Initialize variables
-    full_message_history = []
+    full_message_history = MessageHistory(max_messages=cfg.history_max_messages, archive_path=cfg.history_archive_path)
     result = None
     next_action_count = 0
     # Make a constant:
@@ -329,6 +389,23 @@ class Agent:
         self.next_action_count = next_action_count
         self.prompt = prompt
         self.user_input = user_input
+        self.memory_prefetcher = MemoryPrefetcher(memory) if cfg.memory_prefetch else None
+        # Memories prefetched for the next cycle
+        self.relevant_memory = None
+
+    def stream_field_handler(self, spinner, streamed_fields):
+        """
+        Returns a callback for chat.chat_with_ai that prints the thoughts and validates the
+        command as soon as each has been streamed, recording them in streamed_fields.
+        """
+        def on_field(key, value):
+            if key == "thoughts" and isinstance(value, dict):
+                spinner.stop()
+                print_thoughts(value)
+                streamed_fields["thoughts"] = value
+            elif key == "command" and isinstance(value, dict) and "name" in value:
+                streamed_fields["command"] = cmd.get_command(json.dumps({"command": value}))
+        return on_field
 
     def start_interaction_loop(self):
         # Interaction Loop
@@ -341,23 +418,39 @@ class Agent:
                 break
 
             # Send message to AI, get response
-            with Spinner("Thinking... "):
+            streamed_fields = {}
+            with Spinner("Thinking... ") as spinner:
+                on_field = None
+                if cfg.stream_mode:
+                    on_field = self.stream_field_handler(spinner, streamed_fields)
                 assistant_reply = chat.chat_with_ai(
                     self.prompt,
                     self.user_input,
                     self.full_message_history,
                     self.memory,
-                    cfg.fast_token_limit)  # TODO: This hardcodes the model to use GPT3.5. Make this an argument
+                    cfg.fast_token_limit,  # TODO: This hardcodes the model to use GPT3.5. Make this an argument
+                    on_field=on_field,
+                    relevant_memory=self.relevant_memory)
+                self.relevant_memory = None
 
-            # Print Assistant thoughts
-            print_assistant_thoughts(assistant_reply)
+            # Print Assistant thoughts, unless they were already printed while streaming
+            if "thoughts" not in streamed_fields:
+                print_assistant_thoughts(assistant_reply)
 
             # Get command name and arguments
             try:
-                command_name, arguments = cmd.get_command(
-                    attempt_to_fix_json_by_finding_outermost_brackets(assistant_reply))
+                if cfg.multi_command:
+                    commands_to_run = cmd.get_commands(
+                        attempt_to_fix_json_by_finding_outermost_brackets(assistant_reply))
+                elif "command" in streamed_fields:
+                    # Already validated as soon as the command object finished streaming
+                    commands_to_run = [streamed_fields["command"]]
+                else:
+                    commands_to_run = [cmd.get_command(
+                        attempt_to_fix_json_by_finding_outermost_brackets(assistant_reply))]
+                command_name, arguments = commands_to_run[0]
                 if cfg.speak_mode:
-                    speak.say_text(f"I want to execute {command_name}")
+                    speak.say_text(f"I want to execute {', '.join(str(name) for name, _ in commands_to_run)}")
             except Exception as e:
                 logger.error("Error: \n", str(e))
 
@@ -366,10 +459,7 @@ class Agent:
                 # Get key press: Prompt the user to press enter to continue or escape
                 # to exit
                 self.user_input = ""
-                logger.typewriter_log(
-                    "NEXT ACTION: ",
-                    Fore.CYAN,
-                    f"COMMAND = {Fore.CYAN}{command_name}{Style.RESET_ALL}  ARGUMENTS = {Fore.CYAN}{arguments}{Style.RESET_ALL}")
+                print_next_actions(commands_to_run)
                 print(
                     f"Enter 'y' to authorise command, 'y -N' to run N continuous commands, 'n' to exit program, or enter feedback for {self.ai_name}...",
                     flush=True)
@@ -404,18 +494,30 @@ class Agent:
                     break
             else:
                 # Print command
-                logger.typewriter_log(
-                    "NEXT ACTION: ",
-                    Fore.CYAN,
-                    f"COMMAND = {Fore.CYAN}{command_name}{Style.RESET_ALL}  ARGUMENTS = {Fore.CYAN}{arguments}{Style.RESET_ALL}")
+                print_next_actions(commands_to_run)
 
             # Execute command
-            if command_name is not None and command_name.lower().startswith("error"):
-                result = f"Command {command_name} threw the following error: " + arguments
-            elif command_name == "human_feedback":
+            if command_name == "human_feedback":
                 result = f"Human feedback: {self.user_input}"
+            elif len(commands_to_run) > 1:
+                if self.memory_prefetcher:
+                    self.memory_prefetcher.start(self.full_message_history, chat.create_chat_message(
+                        "system", "\n\n".join(format_command_result(name, "") for name, _ in commands_to_run)))
+                # Independent commands run concurrently, their results go back in one message
+                results = cmd.execute_commands(commands_to_run)
+                result = "\n\n".join(
+                    format_command_result(name, command_result)
+                    for (name, _), command_result in zip(commands_to_run, results))
+                if self.next_action_count > 0:
+                    self.next_action_count -= 1
+            elif command_name is not None and command_name.lower().startswith("error"):
+                result = format_command_result(command_name, arguments)
             else:
-                result = f"Command {command_name} returned: {cmd.execute_command(command_name, arguments)}"
+                if self.memory_prefetcher:
+                    # Hide the next cycle's memory lookup behind the command
+                    self.memory_prefetcher.start(self.full_message_history, chat.create_chat_message(
+                        "system", format_command_result(command_name, "")))
+                result = format_command_result(command_name, cmd.execute_command(command_name, arguments))
                 if self.next_action_count > 0:
                     self.next_action_count -= 1
 
@@ -423,18 +525,20 @@ class Agent:
                             f"\nResult: {result} " \
                             f"\nHuman Feedback: {self.user_input} "
 
-            self.memory.add(memory_to_add)
-
             # Check if there's a result from the command append it to the message
             # history
             if result is not None:
-                self.full_message_history.append(chat.create_chat_message("system", result))
-                logger.typewriter_log("SYSTEM: ", Fore.YELLOW, result)
+                result_message = chat.create_chat_message("system", result)
             else:
-                self.full_message_history.append(
-                    chat.create_chat_message(
-                        "system", "Unable to execute command"))
-                logger.typewriter_log("SYSTEM: ", Fore.YELLOW, "Unable to execute command")
+                result_message = chat.create_chat_message("system", "Unable to execute command")
+
+            if self.memory_prefetcher:
+                # Finish the lookup before adding to the memory it searches
+                self.relevant_memory = self.memory_prefetcher.finish(memory_to_add, result_message)
+            self.memory.add(memory_to_add)
+
+            self.full_message_history.append(result_message)
+            logger.typewriter_log("SYSTEM: ", Fore.YELLOW, result_message["content"])
 
 
 if __name__ == "__main__":
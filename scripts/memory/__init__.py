@@ -1,5 +1,6 @@
 from memory.local import LocalCache
 from memory.no_memory import NoMemory
+from memory.prefetch import MemoryPrefetcher
 
 # List of supported memory backends
 # Add a backend to this list if the import attempt is successful
@@ -55,5 +56,6 @@ __all__ = [
     "LocalCache",
     "RedisMemory",
     "PineconeMemory",
-    "NoMemory"
+    "NoMemory",
+    "MemoryPrefetcher"
 ]
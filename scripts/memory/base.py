@@ -1,17 +1,45 @@
 """Base class for memory providers."""
 import abc
+import time
+from cassette import get_cassette
 from config import AbstractSingleton, Config
+from singleflight import SingleFlight
+from usage_tracker import usage_tracker
 import openai
 
 cfg = Config()
 
+# Identical embeddings requested concurrently share a single API call
+embedding_flight = SingleFlight()
 
-def get_ada_embedding(text):
+
+def get_ada_embedding(text, call_site=None):
     text = text.replace("\n", " ")
+    return embedding_flight.do(text, _create_ada_embedding, text, call_site)
+
+
+def _create_ada_embedding(text, call_site=None):
+    cassette = get_cassette(cfg)
+    request = {"model": "text-embedding-ada-002", "input": text}
+    if cassette:
+        recorded = cassette.play("embedding", request)
+        if recorded is not None:
+            usage_tracker.record(call_site, "text-embedding-ada-002", len(text) // 4)
+            return recorded
+
+    started = time.time()
     if cfg.use_azure:
-        return openai.Embedding.create(input=[text], engine=cfg.get_azure_deployment_id_for_model("text-embedding-ada-002"))["data"][0]["embedding"]
+        response = openai.Embedding.create(input=[text], engine=cfg.get_azure_deployment_id_for_model("text-embedding-ada-002"))
     else:
-        return openai.Embedding.create(input=[text], model="text-embedding-ada-002")["data"][0]["embedding"]
+        response = openai.Embedding.create(input=[text], model="text-embedding-ada-002")
+    embedding = response["data"][0]["embedding"]
+    usage_tracker.record(
+        call_site, "text-embedding-ada-002", response.get("usage", {}).get("prompt_tokens", 0),
+        latency=time.time() - started)
+
+    if cassette:
+        cassette.record("embedding", request, embedding)
+    return embedding
 
 
 class MemoryProviderSingleton(AbstractSingleton):
@@ -29,6 +57,7 @@ class MemoryProviderSingleton(AbstractSingleton):
 
     @abc.abstractmethod
     def get_relevant(self, data, num_relevant=5):
+        """Returns the stored texts most relevant to data, most relevant first."""
         pass
 
     @abc.abstractmethod
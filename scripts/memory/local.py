@@ -3,6 +3,7 @@ import orjson
 from typing import Any, List, Optional
 import numpy as np
 import os
+import threading
 from memory.base import MemoryProviderSingleton, get_ada_embedding
 
 
@@ -27,6 +28,7 @@ class LocalCache(MemoryProviderSingleton):
     # on load, load our database
     def __init__(self, cfg) -> None:
         self.filename = f"{cfg.memory_index}.json"
+        self._lock = threading.Lock()
         if os.path.exists(self.filename):
             try:
                 with open(self.filename, 'w+b') as f:
@@ -56,26 +58,27 @@ class LocalCache(MemoryProviderSingleton):
         """
         if 'Command Error:' in text:
             return ""
-        self.data.texts.append(text)
-
-        embedding = get_ada_embedding(text)
+        embedding = get_ada_embedding(text, call_site="memory_add")
 
         vector = np.array(embedding).astype(np.float32)
         vector = vector[np.newaxis, :]
-        self.data.embeddings = np.concatenate(
-            [
-                self.data.embeddings,
-                vector,
-            ],
-            axis=0,
-        )
-
-        with open(self.filename, 'wb') as f:
-            out = orjson.dumps(
-                self.data,
-                option=SAVE_OPTIONS
+        # Commands running concurrently may add at the same time
+        with self._lock:
+            self.data.texts.append(text)
+            self.data.embeddings = np.concatenate(
+                [
+                    self.data.embeddings,
+                    vector,
+                ],
+                axis=0,
             )
-            f.write(out)
+
+            with open(self.filename, 'wb') as f:
+                out = orjson.dumps(
+                    self.data,
+                    option=SAVE_OPTIONS
+                )
+                f.write(out)
         return text
 
     def clear(self) -> str:
@@ -109,7 +112,7 @@ class LocalCache(MemoryProviderSingleton):
 
         Returns: List[str]
         """
-        embedding = get_ada_embedding(text)
+        embedding = get_ada_embedding(text, call_site="memory_get_relevant")
 
         scores = np.dot(self.data.embeddings, embedding)
 
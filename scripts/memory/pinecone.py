@@ -33,7 +33,7 @@ class PineconeMemory(MemoryProviderSingleton):
         self.index = pinecone.Index(table_name)
 
     def add(self, data):
-        vector = get_ada_embedding(data)
+        vector = get_ada_embedding(data, call_site="memory_add")
         # no metadata here. We may wish to change that long term.
         resp = self.index.upsert([(str(self.vec_num), vector, {"raw_text": data})])
         _text = f"Inserting data into memory at index: {self.vec_num}:\n data: {data}"
@@ -53,9 +53,9 @@ class PineconeMemory(MemoryProviderSingleton):
         :param data: The data to compare to.
         :param num_relevant: The number of relevant data to return. Defaults to 5
         """
-        query_embedding = get_ada_embedding(data)
+        query_embedding = get_ada_embedding(data, call_site="memory_get_relevant")
         results = self.index.query(query_embedding, top_k=num_relevant, include_metadata=True)
-        sorted_results = sorted(results.matches, key=lambda x: x.score)
+        sorted_results = sorted(results.matches, key=lambda x: x.score, reverse=True)
         return [str(item['metadata']["raw_text"]) for item in sorted_results]
 
     def get_stats(self):
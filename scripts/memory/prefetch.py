@@ -0,0 +1,83 @@
+"""Background retrieval of relevant memories for the next cycle."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from bm25 import bm25_scores
+from logger import logger
+
+
+def build_query(full_message_history, pending_message=None) -> str:
+    """
+    Returns the text relevant memories are looked up with: the last 9 messages.
+
+    Args:
+        full_message_history: The message history.
+        pending_message: A message about to be appended to the history, counted as its last message.
+    """
+    messages = list(full_message_history[-9:])
+    if pending_message is not None:
+        messages = (messages + [pending_message])[-9:]
+    return str(messages)
+
+
+class MemoryPrefetcher:
+    """
+    Looks up the relevant memories of the next cycle while the current command executes.
+
+    The command result is not known when the lookup starts, so a placeholder
+    message stands in for it and the lookup sees the same window of the history
+    as a lookup made after the command. The memory recorded for the command is
+    merged in once the lookup has finished, ranked among the others by how well
+    it matches the history with the actual result.
+    """
+
+    def __init__(self, memory, num_relevant: int = 10) -> None:
+        self.memory = memory
+        self.num_relevant = num_relevant
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-prefetch")
+        self._future = None
+        self._recent_messages = []
+
+    def start(self, full_message_history, pending_message=None) -> None:
+        """
+        Starts looking up memories for the given history in the background.
+
+        Args:
+            full_message_history: The message history.
+            pending_message: A placeholder for the message the command result will be appended as.
+        """
+        self._recent_messages = list(full_message_history[-9:])
+        self._future = self._executor.submit(
+            self.memory.get_relevant, build_query(full_message_history, pending_message), self.num_relevant)
+
+    def finish(self, added_memory: Optional[str] = None, result_message=None) -> Optional[List[str]]:
+        """
+        Waits for the running lookup and returns its memories, most relevant first.
+
+        Args:
+            added_memory: A memory added after the lookup started, merged into the result.
+            result_message: The message the command result is appended to the history as,
+                used to rank the added memory.
+
+        Returns:
+            The relevant memories, or None if no lookup was started or it failed, in
+            which case the caller should look them up itself.
+        """
+        future, self._future = self._future, None
+        if future is None:
+            return None
+        try:
+            relevant_memory = future.result()
+        except Exception as e:
+            logger.error("Error prefetching relevant memories: ", str(e))
+            return None
+        if relevant_memory is None:
+            return None
+        if added_memory is None:
+            return list(relevant_memory)
+        others = [memory for memory in relevant_memory if memory != added_memory][:self.num_relevant - 1]
+        # The backends do not return their scores, so the added memory goes before
+        # the first memory that matches the query worse than it does
+        scores = bm25_scores([added_memory] + others, build_query(self._recent_messages, result_message))
+        position = next((i for i, score in enumerate(scores[1:]) if score < scores[0]), len(others))
+        return others[:position] + [added_memory] + others[position:]
@@ -83,7 +83,7 @@ class RedisMemory(MemoryProviderSingleton):
         """
         if 'Command Error:' in data:
             return ""
-        vector = get_ada_embedding(data)
+        vector = get_ada_embedding(data, call_site="memory_add")
         vector = np.array(vector).astype(np.float32).tobytes()
         data_dict = {
             b"data": data,
@@ -131,7 +131,7 @@ class RedisMemory(MemoryProviderSingleton):
 
         Returns: A list of the most relevant data.
         """
-        query_embedding = get_ada_embedding(data)
+        query_embedding = get_ada_embedding(data, call_site="memory_get_relevant")
         base_query = f"*=>[KNN {num_relevant} @embedding $vector AS vector_score]"
         query = Query(base_query).return_fields(
             "data",
@@ -0,0 +1,231 @@
+import bisect
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import token_counter
+from config import Config
+from llm_utils import create_chat_completion
+from logger import logger
+
+cfg = Config()
+
+SUMMARY_PROMPT = (
+    "Progressively summarize the conversation between an autonomous AI and its user below, "
+    "adding onto the previous summary and returning a new summary. Keep the goals, decisions, "
+    "command results and open tasks, leave out everything else.")
+# Tokens the summary may use
+SUMMARY_MAX_TOKENS = 500
+
+
+def summarize_messages(summary: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Folds messages into a rolling summary using the fast model.
+
+    Messages are summarized in batches that fit in the fast model's context, each
+    batch extending the summary of the previous ones.
+
+    Args:
+        summary (str): The summary of earlier messages, may be empty.
+        messages (list): The messages to add to the summary, oldest first.
+
+    Returns:
+        str: The new summary.
+    """
+    model = cfg.fast_llm_model
+    batch_budget = cfg.fast_token_limit - 2 * SUMMARY_MAX_TOKENS - 200
+    lines = [f"{message['role'].capitalize()}: {message['content']}" for message in messages]
+    batch, batch_tokens = [], 0
+    for line, tokens in zip(lines, token_counter.count_strings_tokens(lines, model)):
+        if tokens > batch_budget:
+            # A single huge message (e.g. a scraped page) keeps its beginning only
+            line, tokens = line[:batch_budget * 3], batch_budget
+        if batch and batch_tokens + tokens > batch_budget:
+            summary = _summarize_batch(summary, batch, model)
+            batch, batch_tokens = [], 0
+        batch.append(line)
+        batch_tokens += tokens
+    if batch:
+        summary = _summarize_batch(summary, batch, model)
+    return summary
+
+
+def _summarize_batch(summary, lines, model):
+    lines = "\n".join(lines)
+    messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Previous summary:\n{summary or 'None'}\n\nNew messages:\n{lines}\n\nNew summary:"},
+    ]
+    return create_chat_completion(
+        model=model,
+        messages=messages,
+        temperature=0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        call_site="compact_history",
+    ).strip()
+
+
+class MessageHistory(list):
+    """
+    The full message history, keeping running token sums per model so the most
+    recent messages fitting a token budget can be found with a binary search.
+
+    Sums are extended lazily as messages are appended; any other change to the
+    list discards them.
+
+    With max_messages set, the history is compacted whenever it grows past that
+    many messages: a background thread folds the oldest messages, down to half of
+    max_messages, into the rolling summary and appends them to the archive file.
+    The messages stay in the history until their summary is ready, then both are
+    swapped in at once on the next append, so no message is ever missing from
+    both the history and the summary.
+    """
+
+    def __init__(self, messages=(), max_messages=0, archive_path=None, summarize=summarize_messages):
+        super().__init__(messages)
+        self._prefix_sums = {}
+        self.max_messages = max_messages
+        self.archive_path = archive_path
+        self.summarize = summarize
+        self.summary = ""
+        self.archived_messages = 0
+        self._compaction = None
+        # (compacted messages, new summary) of a finished compaction, not applied yet
+        self._compacted = None
+
+    def prefix_sums(self, model: str) -> List[int]:
+        """
+        Returns the cumulative token counts of the history for a model.
+
+        Element i is the number of tokens used by the first i messages, each counted
+        as if sent on its own, so the list has one more element than the history.
+        """
+        sums = self._prefix_sums.setdefault(model, [0])
+        for tokens in token_counter.count_each_message_tokens(self[len(sums) - 1:], model):
+            sums.append(sums[-1] + tokens)
+        return sums
+
+    def _invalidate(self):
+        self._prefix_sums.clear()
+
+    def append(self, message):
+        super().append(message)
+        self._maybe_compact()
+
+    def extend(self, messages):
+        super().extend(messages)
+        self._maybe_compact()
+
+    def wait_for_compaction(self, timeout=None):
+        """Blocks until the running compaction, if any, has finished and applies its summary."""
+        if self._compaction:
+            self._compaction.join(timeout)
+        self._apply_compaction()
+
+    def _maybe_compact(self):
+        self._apply_compaction()
+        if not self.max_messages or len(self) <= self.max_messages:
+            return
+        if self._compaction and self._compaction.is_alive():
+            # Compact again on the next append once the summary has caught up
+            return
+        messages = self[:len(self) - self.max_messages // 2]
+        self._compaction = threading.Thread(target=self._compact, args=(messages,), daemon=True)
+        self._compaction.start()
+
+    def _apply_compaction(self):
+        if self._compaction and self._compaction.is_alive() or not self._compacted:
+            return
+        messages, summary = self._compacted
+        self._compacted = None
+        count = len(messages)
+        # The history was edited while summarizing, the next compaction starts over
+        if len(self) < count or any(a is not b for a, b in zip(self, messages)):
+            return
+        self._drop_oldest(count)
+        self.summary = summary
+
+    def _drop_oldest(self, count):
+        dropped = self[:count]
+        super().__delitem__(slice(0, count))
+        # Shift the running sums instead of recounting the remaining messages
+        self._prefix_sums = {
+            model: [total - sums[count] for total in sums[count:]]
+            for model, sums in self._prefix_sums.items() if len(sums) > count}
+        self.archived_messages += count
+        return dropped
+
+    def _compact(self, messages):
+        try:
+            summary = self.summarize(self.summary, messages)
+            if self.archive_path:
+                directory = os.path.dirname(self.archive_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.archive_path, "a", encoding="utf-8") as f:
+                    for message in messages:
+                        f.write(json.dumps(dict(message)) + "\n")
+            self._compacted = (messages, summary)
+        except Exception as e:
+            # The messages stay in the history and are compacted again on the next append
+            logger.error("Error compacting the message history: ", str(e))
+
+    def __setitem__(self, index, value):
+        self._invalidate()
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self._invalidate()
+        super().__delitem__(index)
+
+    def __iadd__(self, messages):
+        self.extend(messages)
+        return self
+
+    def insert(self, index, message):
+        self._invalidate()
+        super().insert(index, message)
+
+    def pop(self, index=-1):
+        self._invalidate()
+        return super().pop(index)
+
+    def remove(self, message):
+        self._invalidate()
+        super().remove(message)
+
+    def clear(self):
+        self._invalidate()
+        super().clear()
+
+    def sort(self, *args, **kwargs):
+        self._invalidate()
+        super().sort(*args, **kwargs)
+
+    def reverse(self):
+        self._invalidate()
+        super().reverse()
+
+
+def history_window(history: List[Dict[str, str]], token_budget: int, model: str) -> Tuple[int, int]:
+    """
+    Finds the longest run of most recent messages that fits in a token budget.
+
+    Args:
+        history (list): The full message history, ideally a MessageHistory.
+        token_budget (int): The number of tokens available for history messages.
+        model (str): The model used to count tokens.
+
+    Returns:
+        tuple: The index of the first message to send and the tokens used by the messages from there on.
+    """
+    if isinstance(history, MessageHistory):
+        sums = history.prefix_sums(model)
+    else:
+        sums = [0]
+        for tokens in token_counter.count_each_message_tokens(history, model):
+            sums.append(sums[-1] + tokens)
+    total = sums[-1]
+    start = min(bisect.bisect_left(sums, total - token_budget), len(sums) - 1)
+    return start, total - sums[start]
@@ -0,0 +1,295 @@
+"""
+A lightweight stand-in for the OpenAI chat completion and embedding endpoints.
+
+Point the agent at it with OPENAI_API_BASE=http://localhost:8000/v1 to measure
+throughput, retry and rate limit behaviour without calling OpenAI:
+
+    python scripts/mock_openai_server.py --latency lognormal:-1,0.5 --token-delay 0.005 --rate-limit-rate 0.05
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 1536
+
+DEFAULT_REPLY = {
+    "thoughts": {
+        "text": "I am running against a mock server.",
+        "reasoning": "The mock server always suggests doing nothing.",
+        "plan": "- do nothing",
+        "criticism": "None",
+        "speak": "Doing nothing."
+    },
+    "command": {
+        "name": "do_nothing",
+        "args": {}
+    }
+}
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution into a function returning a delay in seconds.
+
+    Supported specs: "constant:S", "uniform:LOW,HIGH", "normal:MEAN,STD",
+    "lognormal:MU,SIGMA" and "exponential:MEAN". Negative samples are clamped to 0.
+    """
+    name, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",")] if params else []
+    distributions = {
+        "constant": (1, lambda rng, a: a),
+        "uniform": (2, lambda rng, a, b: rng.uniform(a, b)),
+        "normal": (2, lambda rng, mean, std: rng.gauss(mean, std)),
+        "lognormal": (2, lambda rng, mu, sigma: rng.lognormvariate(mu, sigma)),
+        "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean) if mean > 0 else 0),
+    }
+    if name not in distributions or len(values) != distributions[name][0]:
+        raise ValueError(f"Invalid latency distribution '{spec}'")
+    sample = distributions[name][1]
+    rng = random.Random()
+    return lambda: max(0.0, sample(rng, *values))
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for usage reporting and token-proportional delays"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def fake_embedding(text):
+    """Deterministic unit vector derived from the text"""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(EMBED_DIM)]
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector]
+
+
+class MockServerSettings:
+    """Behaviour of the mock server, shared by all request handlers"""
+
+    def __init__(self, latency="constant:0", token_delay=0.0, prompt_token_delay=0.0,
+                 error_rate=0.0, error_status=500, rate_limit_rate=0.0, replies=None, seed=None):
+        self.latency = parse_latency(latency)
+        self.token_delay = token_delay
+        self.prompt_token_delay = prompt_token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate
+        self.replies = replies or [DEFAULT_REPLY]
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.next_reply = 0
+        self.stats = {"requests": 0, "completions": 0, "embeddings": 0, "rate_limited": 0, "errors": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def pick_failure(self):
+        """Returns the injected HTTP status for this request, or None"""
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return self.error_status
+        return None
+
+    def pick_reply(self):
+        """Returns the next scripted reply as a string, cycling through the script"""
+        with self.lock:
+            reply = self.replies[self.next_reply % len(self.replies)]
+            self.next_reply += 1
+        return reply if isinstance(reply, str) else json.dumps(reply, indent=4)
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = MockServerSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status):
+        if status == 429:
+            self.settings.count("rate_limited")
+            message, error_type = "Rate limit reached for requests", "requests"
+        else:
+            self.settings.count("errors")
+            message, error_type = "The server had an error while processing your request.", "server_error"
+        self._send_json(status, {"error": {"message": message, "type": error_type, "param": None, "code": None}})
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.settings.lock:
+                self._send_json(200, dict(self.settings.stats))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+            return
+
+        self.settings.count("requests")
+        time.sleep(self.settings.latency())
+        failure = self.settings.pick_failure()
+        if failure:
+            self._send_error(failure)
+            return
+
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self.settings.count("completions")
+            self._complete(request)
+        elif path.endswith("/embeddings"):
+            self.settings.count("embeddings")
+            self._embed(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _complete(self, request):
+        prompt_tokens = sum(estimate_tokens(message.get("content", "")) for message in request.get("messages", []))
+        time.sleep(prompt_tokens * self.settings.prompt_token_delay)
+
+        content = self.settings.pick_reply()
+        completion_tokens = estimate_tokens(content)
+        model = request.get("model") or "gpt-3.5-turbo"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if request.get("stream"):
+            self._stream(completion_id, created, model, content)
+            return
+
+        time.sleep(completion_tokens * self.settings.token_delay)
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _stream(self, completion_id, created, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_event(data):
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        for i, piece in enumerate(pieces):
+            time.sleep(self.settings.token_delay)
+            delta = {"content": piece}
+            if i == 0:
+                delta["role"] = "assistant"
+            send_event(json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }))
+        send_event(json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }))
+        send_event("[DONE]")
+
+    def _embed(self, request):
+        inputs = request.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        prompt_tokens = sum(estimate_tokens(text) for text in inputs)
+        time.sleep(prompt_tokens * self.settings.prompt_token_delay)
+        self._send_json(200, {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)} for i, text in enumerate(inputs)],
+            "model": request.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        })
+
+
+def create_server(host="127.0.0.1", port=8000, settings=None):
+    """
+    Create (but do not start) a mock OpenAI server.
+
+    Returns:
+        ThreadingHTTPServer: The server, call serve_forever() to start it.
+    """
+    handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"settings": settings or MockServerSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a mock OpenAI API server.')
+    parser.add_argument('--host', default="127.0.0.1", help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--latency', default="constant:0", help='Base latency distribution, e.g. uniform:0.2,0.8')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds per completion token')
+    parser.add_argument('--prompt-token-delay', type=float, default=0.0, help='Seconds per prompt token')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with --error-status')
+    parser.add_argument('--error-status', type=int, default=500, help='HTTP status of injected errors')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests failing with 429')
+    parser.add_argument('--replies', help='JSON file with a list of scripted replies (strings or objects)')
+    parser.add_argument('--seed', type=int, help='Seed for error injection')
+    args = parser.parse_args()
+
+    replies = None
+    if args.replies:
+        with open(args.replies, encoding="utf-8") as f:
+            replies = json.load(f)
+
+    settings = MockServerSettings(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        prompt_token_delay=args.prompt_token_delay,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate,
+        replies=replies,
+        seed=args.seed,
+    )
+    server = create_server(args.host, args.port, settings)
+    print(f"Mock OpenAI server listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
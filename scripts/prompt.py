@@ -1,6 +1,23 @@
+import functools
+from config import Config
 from promptgenerator import PromptGenerator
 
+cfg = Config()
 
+# Commands that only read, so they can run at the same time as each other
+PARALLEL_SAFE_COMMANDS = {
+    "google",
+    "browse_website",
+    "get_text_summary",
+    "get_hyperlinks",
+    "read_file",
+    "search_files",
+    "do_nothing",
+}
+
+
+# The prompt never changes while running, build it once
+@functools.lru_cache(maxsize=None)
 def get_prompt():
     """
     This function generates a prompt string that includes various constraints, commands, resources, and performance evaluations.
@@ -10,13 +27,16 @@ def get_prompt():
     """
 
     # Initialize the PromptGenerator object
-    prompt_generator = PromptGenerator()
+    prompt_generator = PromptGenerator(multi_command=cfg.multi_command)
 
     # Add constraints to the PromptGenerator object
     prompt_generator.add_constraint("~4000 word limit for short term memory. Your short term memory is short, so immediately save important information to files.")
     prompt_generator.add_constraint("If you are unsure how you previously did something or want to recall past events, thinking about similar events will help you remember.")
     prompt_generator.add_constraint("No user assistance")
     prompt_generator.add_constraint('Exclusively use the commands listed in double quotes e.g. "command name"')
+    if cfg.multi_command:
+        read_only = ", ".join(sorted(PARALLEL_SAFE_COMMANDS))
+        prompt_generator.add_constraint(f"You may respond with several commands at once. Commands that only read ({read_only}) run at the same time, all others run one after another in the order given.")
 
     # Define the command list
     commands = [
@@ -6,9 +6,12 @@ class PromptGenerator:
     A class for generating custom prompt strings based on constraints, commands, resources, and performance evaluations.
     """
 
-    def __init__(self):
+    def __init__(self, multi_command=False):
         """
         Initialize the PromptGenerator object with empty lists of constraints, commands, resources, and performance evaluations.
+
+        Args:
+            multi_command (bool, optional): Ask for a list of commands per response instead of a single command. Defaults to False.
         """
         self.constraints = []
         self.commands = []
@@ -29,6 +32,9 @@ class PromptGenerator:
                 }
             }
         }
+        if multi_command:
+            command = self.response_format.pop("command")
+            self.response_format["commands"] = [command]
 
     def add_constraint(self, constraint):
         """
@@ -0,0 +1,58 @@
+"""Collapse identical concurrent requests into a single call."""
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    Callers asking for a key while a call for it is in flight wait for that
+    call and receive its result (or exception) instead of making their own.
+    """
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.saved_calls = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """Returns fn(*args, **kwargs), sharing the result with concurrent callers using the same key."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.saved_calls += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Returns the number of calls made and the number saved by sharing in-flight results."""
+        return {"calls": self.calls, "saved_calls": self.saved_calls}
@@ -1,7 +1,7 @@
 import os
 from playsound import playsound
-import requests
 from config import Config
+import http_pool
 cfg = Config()
 import gtts
 import threading
@@ -37,7 +37,7 @@ def eleven_labs_speech(text, voice_index=0):
     tts_url = "https://api.elevenlabs.io/v1/text-to-speech/{voice_id}".format(
         voice_id=voices[voice_index])
     formatted_message = {"text": text}
-    response = requests.post(
+    response = http_pool.session.post(
         tts_url, headers=tts_headers, json=formatted_message)
 
     if response.status_code == 200:
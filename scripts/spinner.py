@@ -27,9 +27,16 @@ class Spinner:
         self.running = True
         self.spinner_thread = threading.Thread(target=self.spin)
         self.spinner_thread.start()
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
         """Stop the spinner"""
+        self.stop()
+
+    def stop(self):
+        """Stop the spinner if it is still running"""
+        if not self.running:
+            return
         self.running = False
         self.spinner_thread.join()
         sys.stdout.write('\r' + ' ' * (len(self.message) + 2) + '\r')
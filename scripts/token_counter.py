@@ -1,5 +1,101 @@
+import functools
+import hashlib
+import math
+import os
+import shutil
 import tiktoken
-from typing import List, Dict
+import tiktoken.model
+from typing import List, Dict, Sequence, Tuple
+from config import Config
+from logger import logger
+
+cfg = Config()
+
+# tiktoken downloads BPE files on first use and caches them in TIKTOKEN_CACHE_DIR.
+# Pointing it at our own cache directory lets a pre-populated copy be bundled for
+# offline use and fast cold starts.
+os.environ["TIKTOKEN_CACHE_DIR"] = cfg.tiktoken_cache_dir
+
+# Every reply is primed with <|start|>assistant<|message|>
+REPLY_PRIMER_TOKENS = 3
+
+BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{encoding_name}.tiktoken"
+
+
+def _install_bundled_bpe(encoding_name: str) -> None:
+    """
+    Makes a BPE file saved as <encoding_name>.tiktoken in the cache directory
+    available under the name tiktoken looks for, so it is not downloaded.
+    """
+    bundled_path = os.path.join(cfg.tiktoken_cache_dir, f"{encoding_name}.tiktoken")
+    url = BPE_URL.format(encoding_name=encoding_name)
+    cache_path = os.path.join(cfg.tiktoken_cache_dir, hashlib.sha1(url.encode()).hexdigest())
+    if os.path.exists(bundled_path) and not os.path.exists(cache_path):
+        shutil.copyfile(bundled_path, cache_path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Returns the encoding used by a model, resolving and loading it only once per model.
+
+    Args:
+    model (str): The name of the model, e.g. "gpt-3.5-turbo".
+
+    Returns:
+    tiktoken.Encoding: The encoding of the model, cl100k_base for unknown models.
+    """
+    return _get_encoding_by_name(_get_encoding_name(model))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding_name(model: str) -> str:
+    encoding_name = tiktoken.model.MODEL_TO_ENCODING.get(model)
+    if encoding_name is None:
+        # Dated versions such as gpt-4-0314 share the encoding of their base model
+        encoding_name = next((name for prefix, name in tiktoken.model.MODEL_PREFIX_TO_ENCODING.items()
+                              if model.startswith(prefix)), None)
+    if encoding_name is None:
+        logger.warn(f"Warning: model {model} not found. Using cl100k_base encoding.")
+        encoding_name = "cl100k_base"
+    return encoding_name
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding_by_name(encoding_name: str) -> tiktoken.Encoding:
+    _install_bundled_bpe(encoding_name)
+    return tiktoken.get_encoding(encoding_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _message_overheads(model: str) -> tuple:
+    """Returns the (tokens_per_message, tokens_per_name) of a chat model."""
+    if model.startswith("gpt-3.5-turbo"):
+        # !Note: gpt-3.5-turbo may change over time. Counting tokens assuming gpt-3.5-turbo-0301.
+        return 4, -1  # every message follows <|start|>{role/name}\n{content}<|end|>\n, if there's a name, the role is omitted
+    elif model.startswith("gpt-4"):
+        # !Note: gpt-4 may change over time. Counting tokens assuming gpt-4-0314.
+        return 3, 1
+    raise NotImplementedError(f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
+
+
+def _message_count_key(model: str) -> tuple:
+    """Returns the key under which a message remembers its token count for a model."""
+    tokens_per_message, tokens_per_name = _message_overheads(model)
+    return _get_encoding_name(model), tokens_per_message, tokens_per_name
+
+
+def remember_message_tokens(message: Dict[str, str], model: str, num_tokens: int) -> None:
+    """
+    Stores a token count computed earlier, e.g. loaded from disk, on a message carrying
+    a token_counts dict (see chat.ChatMessage), so count_message_tokens does not tokenize it again.
+
+    Args:
+    message (ChatMessage): The message.
+    model (str): The model the count is for.
+    num_tokens (int): The tokens used by the message alone, without the reply primer.
+    """
+    message.token_counts[_message_count_key(model)] = num_tokens
 
 
 def count_message_tokens(messages : List[Dict[str, str]], model : str = "gpt-3.5-turbo-0301") -> int:
@@ -13,36 +109,70 @@ def count_message_tokens(messages : List[Dict[str, str]], model : str = "gpt-3.5
     Returns:
     int: The number of tokens used by the list of messages.
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        logger.warn("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model == "gpt-3.5-turbo":
-        # !Node: gpt-3.5-turbo may change over time. Returning num tokens assuming gpt-3.5-turbo-0301.")
-        return count_message_tokens(messages, model="gpt-3.5-turbo-0301")
-    elif model == "gpt-4":
-        # !Note: gpt-4 may change over time. Returning num tokens assuming gpt-4-0314.")
-        return count_message_tokens(messages, model="gpt-4-0314")
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif model == "gpt-4-0314":
-        tokens_per_message = 3
-        tokens_per_name = 1
-    else:
-        raise NotImplementedError(f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
+    tokens_per_message, tokens_per_name = _message_overheads(model)
+    encoding = get_encoding(model)
+    # Messages that carry a token_counts dict (see chat.ChatMessage) are only tokenized once per encoding
+    count_key = _message_count_key(model)
     num_tokens = 0
     for message in messages:
-        num_tokens += tokens_per_message
+        token_counts = getattr(message, "token_counts", None)
+        if token_counts is not None and count_key in token_counts:
+            num_tokens += token_counts[count_key]
+            continue
+        message_tokens = tokens_per_message
         for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
+            message_tokens += len(encoding.encode(value, disallowed_special=()))
             if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+                message_tokens += tokens_per_name
+        if token_counts is not None:
+            token_counts[count_key] = message_tokens
+        num_tokens += message_tokens
+    num_tokens += REPLY_PRIMER_TOKENS
     return num_tokens
 
 
+def count_each_message_tokens(messages: Sequence[Dict[str, str]], model: str) -> List[int]:
+    """
+    Returns the number of tokens used by each message on its own, without the reply primer.
+
+    Messages whose count is not remembered yet are tokenized together with encode_batch.
+
+    Args:
+    messages (list): A list of messages.
+    model (str): The name of the model to use for tokenization.
+
+    Returns:
+    list: The token count of each message.
+    """
+    tokens_per_message, tokens_per_name = _message_overheads(model)
+    count_key = _message_count_key(model)
+    counts = [None] * len(messages)
+    pending = []
+    for i, message in enumerate(messages):
+        token_counts = getattr(message, "token_counts", None)
+        if token_counts is not None and count_key in token_counts:
+            counts[i] = token_counts[count_key]
+        else:
+            pending.append(i)
+    if not pending:
+        return counts
+
+    values = [value for i in pending for value in messages[i].values()]
+    value_counts = iter(count_strings_tokens(values, model))
+    for i in pending:
+        message = messages[i]
+        message_tokens = tokens_per_message
+        for key in message:
+            message_tokens += next(value_counts)
+            if key == "name":
+                message_tokens += tokens_per_name
+        token_counts = getattr(message, "token_counts", None)
+        if token_counts is not None:
+            token_counts[count_key] = message_tokens
+        counts[i] = message_tokens
+    return counts
+
+
 def count_string_tokens(string: str, model_name: str) -> int:
     """
     Returns the number of tokens in a text string.
@@ -54,6 +184,94 @@ def count_string_tokens(string: str, model_name: str) -> int:
     Returns:
     int: The number of tokens in the text string.
     """
-    encoding = tiktoken.encoding_for_model(model_name)
-    num_tokens = len(encoding.encode(string))
+    num_tokens = len(get_encoding(model_name).encode(string, disallowed_special=()))
+    estimator.observe(len(string), num_tokens)
     return num_tokens
+
+
+def count_strings_tokens(strings: Sequence[str], model_name: str) -> List[int]:
+    """
+    Returns the number of tokens in each of several strings, encoded in parallel with encode_batch.
+
+    Args:
+    strings (list): The text strings.
+    model_name (str): The name of the encoding to use. (e.g., "gpt-3.5-turbo")
+
+    Returns:
+    list: The number of tokens in each string.
+    """
+    if not strings:
+        return []
+    counts = [len(tokens) for tokens in get_encoding(model_name).encode_batch(list(strings), disallowed_special=())]
+    estimator.observe(sum(len(string) for string in strings), sum(counts))
+    return counts
+
+
+class TokenEstimator:
+    """
+    Estimates token counts from string lengths, calibrated against the exact counts made so far.
+
+    Estimates are only good for pre-filtering: callers use the bounds to skip exact
+    counting when a text is clearly within or clearly over a budget, and count
+    exactly when it is close.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0, margin: float = 0.5, smoothing: float = 0.05) -> None:
+        self.chars_per_token = chars_per_token
+        self.margin = margin
+        self.smoothing = smoothing
+
+    def observe(self, num_chars: int, num_tokens: int) -> None:
+        """Moves the characters per token ratio towards an exact count."""
+        # Short strings say little about the ratio
+        if num_chars < 64 or num_tokens == 0:
+            return
+        self.chars_per_token += self.smoothing * (num_chars / num_tokens - self.chars_per_token)
+
+    def estimate(self, string: str) -> int:
+        """Returns the estimated number of tokens in a string."""
+        return math.ceil(len(string) / self.chars_per_token)
+
+    def bounds(self, string: str) -> Tuple[int, int]:
+        """
+        Returns a (low, high) range around the estimate that the exact count usually falls in.
+
+        Neither bound is guaranteed, text unlike the calibration (e.g. code or non-Latin
+        scripts) can fall outside of it. Use max_string_tokens for a safe upper bound.
+        """
+        estimate = len(string) / self.chars_per_token
+        low = math.floor(estimate * (1 - self.margin))
+        high = min(math.ceil(estimate * (1 + self.margin)), len(string.encode("utf-8")))
+        return min(low, high), high
+
+
+# Calibrated by every exact count in the process
+estimator = TokenEstimator()
+
+
+def estimate_string_tokens(string: str) -> int:
+    """
+    Returns a quick estimate of the number of tokens in a text string, without tokenizing it.
+
+    Args:
+    string (str): The text string.
+
+    Returns:
+    int: The estimated number of tokens.
+    """
+    return estimator.estimate(string)
+
+
+def max_string_tokens(string: str) -> int:
+    """
+    Returns an upper bound of the number of tokens in a text string, without tokenizing it.
+
+    Every token covers at least one byte, so a string never has more tokens than UTF-8 bytes.
+
+    Args:
+    string (str): The text string.
+
+    Returns:
+    int: The largest number of tokens the string can have.
+    """
+    return len(string.encode("utf-8"))
@@ -0,0 +1,120 @@
+"""Token, cost and latency accounting per LLM and embedding call site."""
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+# Where main writes the aggregates when the agent exits
+REPORT_FILE = os.path.join('..', 'logs', 'usage.json')
+
+# USD per 1000 (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.002, 0.002),
+    "gpt-4-32k": (0.06, 0.12),
+    "gpt-4": (0.03, 0.06),
+    "text-embedding-ada-002": (0.0004, 0.0),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Returns the estimated cost in USD of a call.
+
+    Dated model versions (e.g. gpt-4-0314) are priced like their base model,
+    unknown models cost 0.
+    """
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+class UsageTracker:
+    """
+    Aggregates calls by call site.
+
+    dump() writes the aggregates to report_file, if one is set.
+    """
+
+    def __init__(self, report_file: Optional[str] = None) -> None:
+        self.report_file = report_file
+        self.call_sites = {}
+        self._lock = threading.Lock()
+
+    def record(self, call_site: Optional[str], model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency: float = 0.0, retries: int = 0, cached: bool = False) -> None:
+        """
+        Records a single call.
+
+        Args:
+            call_site: Where the call comes from, e.g. "chat" or "summarize_text".
+            model: The model that served the call.
+            prompt_tokens: Tokens sent.
+            completion_tokens: Tokens received.
+            latency: Seconds spent waiting for the call, including retries.
+            retries: Number of failed attempts before the call succeeded.
+            cached: Whether the call was answered without using the API.
+        """
+        call_site = call_site or "unknown"
+        with self._lock:
+            stats = self.call_sites.setdefault(call_site, {
+                "calls": 0,
+                "cached_calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost": 0.0,
+                "latency": 0.0,
+                "max_latency": 0.0,
+                "retries": 0,
+                "models": {},
+            })
+            stats["calls"] += 1
+            stats["retries"] += retries
+            stats["latency"] += latency
+            stats["max_latency"] = max(stats["max_latency"], latency)
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+            if cached:
+                stats["cached_calls"] += 1
+                return
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost"] += estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Returns the aggregates per call site, including the mean latency."""
+        with self._lock:
+            stats = json.loads(json.dumps(self.call_sites))
+        for site_stats in stats.values():
+            site_stats["mean_latency"] = site_stats["latency"] / site_stats["calls"]
+        return stats
+
+    def get_total_cost(self) -> float:
+        """Returns the estimated cost in USD of every call so far."""
+        with self._lock:
+            return sum(stats["cost"] for stats in self.call_sites.values())
+
+    def summary(self) -> str:
+        """Returns a human readable table of the aggregates, most expensive call site first."""
+        stats = self.get_stats()
+        lines = [f"{'call site':<24}{'calls':>7}{'cached':>8}{'prompt':>10}{'completion':>12}{'cost $':>10}{'mean s':>9}{'retries':>9}"]
+        for call_site, site_stats in sorted(stats.items(), key=lambda item: item[1]["cost"], reverse=True):
+            lines.append(
+                f"{call_site:<24}{site_stats['calls']:>7}{site_stats['cached_calls']:>8}"
+                f"{site_stats['prompt_tokens']:>10}{site_stats['completion_tokens']:>12}"
+                f"{site_stats['cost']:>10.4f}{site_stats['mean_latency']:>9.2f}{site_stats['retries']:>9}")
+        return "\n".join(lines)
+
+    def dump(self) -> None:
+        """Writes the aggregates to the report file."""
+        if not self.report_file or not self.call_sites:
+            return
+        directory = os.path.dirname(self.report_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.report_file, "w", encoding="utf-8") as f:
+            json.dump({"total_cost": self.get_total_cost(), "call_sites": self.get_stats()}, f, indent=4)
+
+
+# Shared by every LLM and embedding call in the process
+usage_tracker = UsageTracker()
@@ -95,6 +95,13 @@ class promptgenerator_tests(unittest.TestCase):
         self.assertIn("resources", prompt_string.lower())
         self.assertIn("performance evaluation", prompt_string.lower())
 
+    # Test whether the multi-command response format asks for a list of commands
+    def test_multi_command_response_format(self):
+        generator = PromptGenerator(multi_command=True)
+        self.assertNotIn("command", generator.response_format)
+        self.assertEqual(generator.response_format["commands"][0]["name"], "command name")
+        self.assertIn('"commands": [', generator.generate_prompt_string())
+
 
 # Run the tests when this script is executed
 if __name__ == '__main__':
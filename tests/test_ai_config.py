@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts import ai_config
+from scripts.ai_config import AIConfig
+
+
+class TestAIConfigPromptCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache_file = os.path.join(self.directory, "ai_settings.prompt_cache.json")
+        patch = mock.patch.object(ai_config.token_counter, "count_message_tokens", return_value=1503)
+        self.count_message_tokens = patch.start()
+        self.addCleanup(patch.stop)
+        self.config = AIConfig("Test-GPT", "a test assistant", ["Pass the tests"])
+
+    def test_count_is_cached_on_disk(self):
+        self.assertEqual(self.config.get_prompt_tokens("gpt-4", self.cache_file), 1500)
+        config = AIConfig("Test-GPT", "a test assistant", ["Pass the tests"])
+        self.assertEqual(config.get_prompt_tokens("gpt-4", self.cache_file), 1500)
+        self.assertEqual(self.count_message_tokens.call_count, 1)
+
+    def test_count_is_cached_per_model(self):
+        self.config.get_prompt_tokens("gpt-4", self.cache_file)
+        self.config.get_prompt_tokens("gpt-3.5-turbo", self.cache_file)
+        self.assertEqual(self.count_message_tokens.call_count, 2)
+
+    def test_changed_settings_are_recounted(self):
+        self.config.get_prompt_tokens("gpt-4", self.cache_file)
+        self.config.ai_goals = ["Pass more tests"]
+        self.config.get_prompt_tokens("gpt-4", self.cache_file)
+        self.assertEqual(self.count_message_tokens.call_count, 2)
+        prompt = self.count_message_tokens.call_args.args[0][0]["content"]
+        self.assertIn("Pass more tests", prompt)
+
+    def test_changed_template_is_recounted(self):
+        self.config.get_prompt_tokens("gpt-4", self.cache_file)
+        prompt = self.config.construct_full_prompt()
+        with mock.patch.object(AIConfig, "construct_full_prompt", return_value=prompt.replace("LLM", "AI")):
+            self.config.get_prompt_tokens("gpt-4", self.cache_file)
+        self.assertEqual(self.count_message_tokens.call_count, 2)
+
+    def test_corrupt_cache_is_ignored(self):
+        with open(self.cache_file, "w") as f:
+            f.write("{")
+        self.assertEqual(self.config.get_prompt_tokens("gpt-4", self.cache_file), 1500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import tests.context
+
+from scripts.bm25 import bm25_scores, tokenize, top_k
+
+
+class TestBM25(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("What's the Price, in EUR?"), ["what", "s", "the", "price", "in", "eur"])
+
+    def test_matching_documents_score_higher(self):
+        documents = ["The weather is sunny today.", "The price is 20 euros per month.", "Contact us by email."]
+        scores = bm25_scores(documents, "What is the price per month?")
+        self.assertEqual(max(range(3), key=scores.__getitem__), 1)
+        self.assertEqual(scores[2], 0)
+
+    def test_rare_words_weigh_more(self):
+        documents = ["price price", "price pricing plans", "price", "price"]
+        scores = bm25_scores(documents, "pricing price")
+        self.assertEqual(max(range(4), key=scores.__getitem__), 1)
+
+    def test_top_k_keeps_document_order(self):
+        documents = ["apples", "nothing", "bananas and apples", "apples apples apples"]
+        self.assertEqual(top_k(documents, "apples", 2), [0, 3])
+
+    def test_top_k_without_matches_keeps_the_first(self):
+        self.assertEqual(top_k(["a", "b", "c"], "zebra", 2), [0, 1])
+
+    def test_no_documents(self):
+        self.assertEqual(bm25_scores([], "query"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
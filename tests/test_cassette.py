@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts.cassette import Cassette, CassetteMissError
+from scripts.llm_cache import LLMResponseCache, SummaryCache
+# Imported from the scripts directory, as browse imports llm_utils
+import browse
+import llm_utils
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cassette.jsonl.gz")
+        self.request = {"model": "gpt-4", "messages": [{"role": "user", "content": "Hi"}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_then_replay(self):
+        recorder = Cassette(self.path, "record")
+        self.assertIsNone(recorder.play("chat", self.request))
+        recorder.record("chat", self.request, {"content": "Hello"})
+
+        player = Cassette(self.path, "strict")
+        self.assertEqual(player.play("chat", self.request), {"content": "Hello"})
+
+    def test_repeated_requests_replay_in_order(self):
+        recorder = Cassette(self.path, "record")
+        recorder.record("chat", self.request, "first")
+        recorder.record("chat", self.request, "second")
+
+        player = Cassette(self.path, "replay")
+        self.assertEqual(player.play("chat", self.request), "first")
+        self.assertEqual(player.play("chat", self.request), "second")
+        self.assertEqual(player.play("chat", self.request), "second")
+
+    def test_strict_mode_raises_on_miss(self):
+        player = Cassette(self.path, "strict")
+        with self.assertRaises(CassetteMissError):
+            player.play("chat", self.request)
+
+    def test_replay_mode_returns_none_on_miss(self):
+        self.assertIsNone(Cassette(self.path, "replay").play("embedding", {"input": "text"}))
+
+    def test_current_time_is_ignored(self):
+        recorder = Cassette(self.path, "record")
+        request = {"messages": [{"role": "system", "content": "The current time and date is Mon Jan  1 10:00:00 2024"}]}
+        recorder.record("chat", request, "reply")
+
+        later = {"messages": [{"role": "system", "content": "The current time and date is Tue Jan  2 11:00:00 2024"}]}
+        self.assertEqual(Cassette(self.path, "strict").play("chat", later), "reply")
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            Cassette(self.path, "off")
+
+
+def completion_response(content):
+    response = mock.MagicMock()
+    response.choices[0].message = {"content": content}
+    response.get.return_value = {"prompt_tokens": 10, "completion_tokens": 2}
+    return response
+
+
+class TestCassetteWithCaches(unittest.TestCase):
+    """A cassette recorded while the local caches are warm must replay on a machine where they are cold"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.messages = [{"role": "user", "content": "Hi"}]
+        patcher = mock.patch.object(llm_utils.cfg, "llm_cassette_path", os.path.join(self.directory, "cassette.jsonl"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def use(self, mode, cache_name):
+        for patcher in [
+            mock.patch.object(llm_utils.cfg, "llm_cassette_mode", mode),
+            mock.patch.object(llm_utils, "response_cache", LLMResponseCache(os.path.join(self.directory, cache_name))),
+            mock.patch.object(browse, "summary_cache", SummaryCache(os.path.join(self.directory, cache_name + "_summaries"))),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_response_cache(self):
+        self.use("record", "warm")
+        llm_utils.response_cache.set("gpt-3.5-turbo", self.messages, 0, None, "Hello")
+        with mock.patch.object(llm_utils, "_create_completion_request", return_value=completion_response("Hello")):
+            self.assertEqual(llm_utils.create_chat_completion(self.messages, "gpt-3.5-turbo", temperature=0), "Hello")
+
+        self.use("strict", "cold")
+        with mock.patch.object(llm_utils, "_create_completion_request", side_effect=AssertionError("network")):
+            self.assertEqual(llm_utils.create_chat_completion(self.messages, "gpt-3.5-turbo", temperature=0), "Hello")
+
+    def test_summary_cache(self):
+        self.use("record", "warm")
+        browse.summary_cache.set_chunk("chunk", "question", browse.cfg.fast_llm_model, "Summary")
+        with mock.patch.object(llm_utils, "_create_completion_request", return_value=completion_response("Summary")):
+            self.assertEqual(browse.summarize_chunk("chunk", "question"), "Summary")
+
+        self.use("strict", "cold")
+        with mock.patch.object(llm_utils, "_create_completion_request", side_effect=AssertionError("network")):
+            self.assertEqual(browse.summarize_chunk("chunk", "question"), "Summary")
+
+
+if __name__ == '__main__':
+    unittest.main()
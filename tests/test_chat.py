@@ -0,0 +1,48 @@
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts import chat
+
+
+def count_strings_tokens(strings, model_name):
+    # One token per character, so tests do not need an encoding
+    return [len(string) for string in strings]
+
+
+class TestPackRelevantMemory(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(chat.token_counter, "count_strings_tokens", side_effect=count_strings_tokens)
+        self.counter = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_keeps_everything_within_budget(self):
+        self.assertEqual(chat.pack_relevant_memory(["aa", "bb"], 100, "gpt-4"), ["aa", "bb"])
+        # Clearly small enough, nothing is tokenized
+        self.counter.assert_not_called()
+
+    def test_multibyte_memories_are_counted(self):
+        # 14 characters but 34 bytes, only an exact count shows that they fit
+        self.assertEqual(chat.pack_relevant_memory(["\u20ac" * 10], 20, "gpt-4"), ["\u20ac" * 10])
+        self.counter.assert_called_once()
+
+    def test_most_relevant_memories_are_kept(self):
+        # "'aa', " is 6 tokens
+        self.assertEqual(chat.pack_relevant_memory(["aa", "bb", "cc"], 12, "gpt-4"), ["aa", "bb"])
+
+    def test_long_memory_is_skipped_for_shorter_ones(self):
+        self.assertEqual(chat.pack_relevant_memory(["aa", "b" * 50, "cc"], 12, "gpt-4"), ["aa", "cc"])
+
+    def test_memories_are_counted_in_one_batch(self):
+        chat.pack_relevant_memory(["aa", "b" * 50, "cc", "dd"], 12, "gpt-4")
+        self.counter.assert_called_once()
+        self.assertEqual(len(self.counter.call_args.args[0]), 4)
+
+    def test_no_budget(self):
+        self.assertEqual(chat.pack_relevant_memory(["aa"], -10, "gpt-4"), [])
+        self.assertEqual(chat.pack_relevant_memory(None, 100, "gpt-4"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import threading
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts import commands
+
+
+class TestGetCommands(unittest.TestCase):
+
+    def test_list_of_commands(self):
+        response = json.dumps({"commands": [
+            {"name": "google", "args": {"input": "a"}},
+            {"name": "read_file", "args": {"file": "b"}},
+            {"name": "do_nothing"},
+        ]})
+        self.assertEqual(commands.get_commands(response), [
+            ("google", {"input": "a"}), ("read_file", {"file": "b"}), ("do_nothing", {})])
+
+    def test_single_command_is_accepted(self):
+        response = json.dumps({"command": {"name": "google", "args": {"input": "a"}}})
+        self.assertEqual(commands.get_commands(response), [("google", {"input": "a"})])
+
+    def test_invalid_entries(self):
+        response = json.dumps({"commands": [{"name": "google", "args": {}}, {"args": {}}]})
+        self.assertEqual(commands.get_commands(response), [
+            ("google", {}), ("Error:", "Missing 'name' field in command 2")])
+        self.assertEqual(commands.get_commands(json.dumps({"commands": []}))[0][0], "Error:")
+
+
+class TestExecuteCommands(unittest.TestCase):
+
+    def test_results_keep_the_command_order(self):
+        with mock.patch.object(commands, "execute_command", side_effect=lambda name, args: f"{name} {args['n']}"):
+            results = commands.execute_commands([("google", {"n": 1}), ("read_file", {"n": 2}), ("write_to_file", {"n": 3})])
+        self.assertEqual(results, ["google 1", "read_file 2", "write_to_file 3"])
+
+    def test_read_only_commands_run_concurrently(self):
+        # Both searches must be running at the same time to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def execute_command(name, args):
+            barrier.wait()
+            return name
+        with mock.patch.object(commands, "execute_command", side_effect=execute_command):
+            self.assertEqual(commands.execute_commands([("google", {}), ("google", {})], max_workers=2),
+                             ["google", "google"])
+
+    def test_writes_wait_for_earlier_commands(self):
+        events = []
+        lock = threading.Lock()
+
+        def execute_command(name, args):
+            with lock:
+                events.append(("start", name))
+            with lock:
+                events.append(("end", name))
+            return name
+        with mock.patch.object(commands, "execute_command", side_effect=execute_command):
+            commands.execute_commands([("read_file", {}), ("write_to_file", {}), ("read_file", {})])
+        write_start = events.index(("start", "write_to_file"))
+        self.assertEqual(events[write_start + 1], ("end", "write_to_file"))
+        self.assertEqual([event for event in events[:write_start]], [("start", "read_file"), ("end", "read_file")])
+
+    def test_parse_errors_are_not_executed(self):
+        with mock.patch.object(commands, "execute_command") as execute_command:
+            results = commands.execute_commands([("Error:", "Invalid JSON")])
+        execute_command.assert_not_called()
+        self.assertEqual(results, ["Invalid JSON"])
+
+    def test_is_parallel_safe(self):
+        self.assertTrue(commands.is_parallel_safe("browse_website"))
+        self.assertFalse(commands.is_parallel_safe("execute_shell"))
+
+
+if __name__ == '__main__':
+    unittest.main()
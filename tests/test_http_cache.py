@@ -0,0 +1,155 @@
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import tests.context
+
+from scripts import browse
+from scripts.http_cache import HTTPCache, freshness_lifetime, parse_cache_control
+
+
+class CachingHandler(BaseHTTPRequestHandler):
+    """Serves pages with different caching headers and counts the requests per path"""
+    requests_seen = {}
+
+    PAGES = {
+        "/max-age": {"Cache-Control": "max-age=60"},
+        "/etag": {"Cache-Control": "no-cache", "ETag": '"v1"'},
+        "/last-modified": {"Cache-Control": "max-age=0", "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"},
+        "/no-store": {"Cache-Control": "no-store"},
+        "/plain": {},
+    }
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests_seen[self.path] = self.requests_seen.get(self.path, 0) + 1
+        headers = self.PAGES.get(self.path)
+        if headers is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        not_modified = (self.headers.get("If-None-Match") == headers.get("ETag") and "ETag" in headers) or \
+            (self.headers.get("If-Modified-Since") == headers.get("Last-Modified") and "Last-Modified" in headers)
+        body = f"<html><body>{self.path} {self.requests_seen[self.path]}</body></html>".encode()
+        self.send_response(304 if not_modified else 200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if not_modified:
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), CachingHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        CachingHandler.requests_seen.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = HTTPCache(self.directory, default_ttl=600)
+
+    def get(self, path):
+        return self.cache.get(self.base_url + path, timeout=5)
+
+    def test_fresh_response_is_served_from_cache(self):
+        self.assertIn("/max-age 1", self.get("/max-age").text)
+        response = self.get("/max-age")
+        self.assertIn("/max-age 1", response.text)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(CachingHandler.requests_seen["/max-age"], 1)
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+
+    def test_etag_revalidation(self):
+        self.get("/etag")
+        response = self.get("/etag")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("/etag 1", response.text)
+        self.assertEqual(CachingHandler.requests_seen["/etag"], 2)
+        self.assertEqual(self.cache.get_stats()["revalidated"], 1)
+
+    def test_last_modified_revalidation(self):
+        self.get("/last-modified")
+        self.assertIn("/last-modified 1", self.get("/last-modified").text)
+        self.assertEqual(self.cache.get_stats()["revalidated"], 1)
+
+    def test_no_store_is_not_cached(self):
+        self.get("/no-store")
+        self.assertIn("/no-store 2", self.get("/no-store").text)
+        self.assertEqual(len(self.cache.store), 0)
+
+    def test_default_ttl_applies_without_caching_headers(self):
+        self.get("/plain")
+        self.assertIn("/plain 1", self.get("/plain").text)
+        cache = HTTPCache(tempfile.mkdtemp(dir=self.directory), default_ttl=0)
+        cache.get(self.base_url + "/plain")
+        self.assertIn("/plain 3", cache.get(self.base_url + "/plain").text)
+
+    def test_errors_are_not_cached(self):
+        self.get("/missing")
+        self.assertEqual(self.get("/missing").status_code, 404)
+        self.assertEqual(CachingHandler.requests_seen["/missing"], 2)
+
+    def test_cache_survives_restarts(self):
+        self.get("/max-age")
+        cache = HTTPCache(self.directory)
+        self.assertIn("/max-age 1", cache.get(self.base_url + "/max-age").text)
+        self.assertEqual(CachingHandler.requests_seen["/max-age"], 1)
+
+    def test_hit_rate(self):
+        self.get("/max-age")
+        self.get("/max-age")
+        self.assertEqual(self.cache.get_stats()["hit_rate"], 0.5)
+
+    def test_browse_get_response_uses_the_cache(self):
+        with mock.patch.object(browse, "http_cache", self.cache):
+            browse.get_response(self.base_url + "/max-age")
+            response, error_message = browse.get_response(self.base_url + "/max-age")
+        self.assertIsNone(error_message)
+        self.assertTrue(response.from_cache)
+        self.assertEqual(CachingHandler.requests_seen["/max-age"], 1)
+
+    def test_truncated_pages_are_not_cached(self):
+        with mock.patch.object(browse, "http_cache", self.cache), \
+                mock.patch.object(browse.cfg, "browse_max_bytes", 10):
+            response, _ = browse.get_response(self.base_url + "/max-age")
+        self.assertTrue(response.truncated)
+        self.assertEqual(len(self.cache.store), 0)
+
+
+class TestFreshness(unittest.TestCase):
+
+    def test_parse_cache_control(self):
+        self.assertEqual(parse_cache_control('Max-Age=60, no-cache, private="x"'),
+                         {"max-age": "60", "no-cache": None, "private": "x"})
+
+    def test_freshness_lifetime(self):
+        self.assertEqual(freshness_lifetime({"Cache-Control": "max-age=60", "Age": "10"}, 600), 50)
+        self.assertEqual(freshness_lifetime({"Cache-Control": "no-cache, max-age=60"}, 600), 0)
+        self.assertEqual(freshness_lifetime({
+            "Date": "Mon, 01 Jan 2024 00:00:00 GMT", "Expires": "Mon, 01 Jan 2024 00:02:00 GMT"}, 600), 120)
+        self.assertEqual(freshness_lifetime({"Expires": "0"}, 600), 0)
+        self.assertEqual(freshness_lifetime({}, 600), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
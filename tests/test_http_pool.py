@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import tests.context
+
+from scripts.http_pool import PooledSession
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers after a short pause, keeping the connection alive, and records the most requests seen at once"""
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestPooledSession(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        SlowHandler.max_in_flight = 0
+
+    def test_connections_are_reused(self):
+        session = PooledSession()
+        for _ in range(3):
+            self.assertEqual(session.get(self.url, timeout=5).text, "ok")
+        stats = session.get_stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+        self.assertAlmostEqual(stats["reuse_rate"], 2 / 3)
+
+    def test_requests_per_host_are_capped(self):
+        session = PooledSession(max_per_host=2)
+        with ThreadPoolExecutor(6) as executor:
+            responses = list(executor.map(lambda _: session.get(self.url, timeout=5), range(6)))
+        self.assertTrue(all(response.status_code == 200 for response in responses))
+        self.assertLessEqual(SlowHandler.max_in_flight, 2)
+        self.assertGreater(session.get_stats()["waited_for_host"], 0)
+        self.assertLessEqual(session.get_stats()["connections_opened"], 2)
+
+    def test_streamed_body_keeps_the_host_slot(self):
+        session = PooledSession(max_per_host=1)
+        other = threading.Thread(target=lambda: session.get(self.url, timeout=5))
+        with session.host_slot(self.url):
+            # The slot is not taken a second time by the request inside it
+            response = session.get(self.url, timeout=5, stream=True)
+            other.start()
+            time.sleep(0.2)
+            self.assertTrue(other.is_alive())
+            self.assertEqual(response.raw.read(), b"ok")
+            response.close()
+        other.join(5)
+        self.assertFalse(other.is_alive())
+        self.assertEqual(session.get_stats()["requests"], 2)
+        self.assertEqual(session.get_stats()["waited_for_host"], 1)
+
+    def test_only_connection_errors_are_retried(self):
+        retry = PooledSession(max_retries=5, backoff_factor=0.1).get_adapter(self.url).max_retries
+        self.assertEqual(retry.connect, 5)
+        self.assertEqual(retry.backoff_factor, 0.1)
+        self.assertFalse(retry.read)
+        self.assertEqual(retry.status, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
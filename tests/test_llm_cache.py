@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import tests.context
+
+from scripts.llm_cache import DiskLRUCache, LLMResponseCache, SummaryCache, normalize_question
+
+
+class TestDiskLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_set_and_get(self):
+        cache = DiskLRUCache(self.directory)
+        cache.set("key", {"a": 1})
+        self.assertEqual(cache.get("key"), {"a": 1})
+        self.assertIsNone(cache.get("missing"))
+
+    def test_persists_across_instances(self):
+        DiskLRUCache(self.directory).set("key", "value")
+        self.assertEqual(DiskLRUCache(self.directory).get("key"), "value")
+
+    def test_expired_entries_are_misses(self):
+        cache = DiskLRUCache(self.directory, ttl=0.01)
+        cache.set("key", "value")
+        time.sleep(0.05)
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskLRUCache(self.directory, hot_entries=0)
+        cache.set("old", "x" * 100)
+        cache.set("new", "x" * 100)
+        # Make "old" the most recently used entry
+        past = time.time() - 100
+        os.utime(os.path.join(self.directory, "new.json"), (past, past))
+        cache.get("old")
+        cache.max_size_bytes = cache.size_bytes() - 1
+        cache.set("newest", "x")
+        self.assertIsNone(cache.get("new"))
+        self.assertEqual(cache.get("old"), "x" * 100)
+        self.assertEqual(cache.get("newest"), "x")
+
+    def test_hot_hits_count_as_use(self):
+        cache = DiskLRUCache(self.directory, hot_entries=16)
+        for key in "abcd":
+            cache.set(key, "x" * 100)
+        for _ in range(5):
+            self.assertEqual(cache.get("a"), "x" * 100)
+        cache.max_size_bytes = cache.size_bytes() - 1
+        cache.set("e", "x")
+        self.assertEqual(cache.get("a"), "x" * 100)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "x" * 100)
+
+    def test_recency_survives_restarts(self):
+        cache = DiskLRUCache(self.directory)
+        cache.set("old", "x" * 100)
+        cache.set("new", "x" * 100)
+        past = time.time() - 100
+        os.utime(os.path.join(self.directory, "new.json"), (past, past))
+        cache = DiskLRUCache(self.directory)
+        cache.max_size_bytes = cache.size_bytes() - 1
+        cache.set("newest", "x")
+        self.assertIsNone(cache.get("new"))
+        self.assertEqual(cache.get("old"), "x" * 100)
+
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = LLMResponseCache(self.directory)
+        self.messages = [{"role": "user", "content": "Hello"}]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_key_depends_on_request(self):
+        key = LLMResponseCache.make_key("gpt-4", self.messages, 0, None)
+        self.assertEqual(key, LLMResponseCache.make_key("gpt-4", list(self.messages), 0, None))
+        self.assertNotEqual(key, LLMResponseCache.make_key("gpt-3.5-turbo", self.messages, 0, None))
+        self.assertNotEqual(key, LLMResponseCache.make_key("gpt-4", self.messages, 0, 100))
+
+    def test_counters(self):
+        self.assertIsNone(self.cache.get("gpt-4", self.messages, 0, None))
+        self.cache.set("gpt-4", self.messages, 0, None, "Hi",
+                       {"prompt_tokens": 10, "completion_tokens": 2})
+        self.assertEqual(self.cache.get("gpt-4", self.messages, 0, None), "Hi")
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["saved_prompt_tokens"], 10)
+        self.assertEqual(stats["saved_completion_tokens"], 2)
+
+
+class TestSummaryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = SummaryCache(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("  What is   the PRICE? "), "what is the price")
+
+    def test_chunk_summaries(self):
+        self.assertIsNone(self.cache.get_chunk("chunk", "question", "gpt-3.5-turbo"))
+        self.cache.set_chunk("chunk", "question", "gpt-3.5-turbo", "summary")
+        self.assertEqual(self.cache.get_chunk("chunk", "Question?", "gpt-3.5-turbo"), "summary")
+        self.assertIsNone(self.cache.get_chunk("chunk", "question", "gpt-4"))
+        self.assertIsNone(self.cache.get_page("chunk", "question", "gpt-3.5-turbo"))
+
+    def test_page_summaries_depend_on_the_settings(self):
+        self.cache.set_page("page", "question", "gpt-3.5-turbo", "summary", {"top_k": 5})
+        self.assertEqual(self.cache.get_page("page", "question", "gpt-3.5-turbo", {"top_k": 5}), "summary")
+        self.assertIsNone(self.cache.get_page("page", "question", "gpt-3.5-turbo", {"top_k": 3}))
+
+    def test_stats(self):
+        self.cache.set_page("page", "question", "gpt-3.5-turbo", "summary")
+        self.cache.get_page("page", "question", "gpt-3.5-turbo")
+        self.cache.get_chunk("chunk", "question", "gpt-3.5-turbo")
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["page_hits"], stats["page_misses"]), (1, 0))
+        self.assertEqual((stats["chunk_hits"], stats["chunk_misses"]), (0, 1))
+        self.assertEqual(stats["entries"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
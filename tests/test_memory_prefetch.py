@@ -0,0 +1,67 @@
+import threading
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts.memory.prefetch import MemoryPrefetcher, build_query
+
+
+class TestMemoryPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = mock.Mock()
+        self.memory.get_relevant.return_value = ["b", "c", "d"]
+        self.prefetcher = MemoryPrefetcher(self.memory, num_relevant=3)
+        self.history = [{"role": "user", "content": str(i)} for i in range(12)]
+        self.result_message = {"role": "system", "content": "Command google returned: stock prices fell"}
+
+    def test_lookup_uses_the_last_messages(self):
+        self.prefetcher.start(self.history)
+        self.assertEqual(self.prefetcher.finish(), ["b", "c", "d"])
+        self.memory.get_relevant.assert_called_once_with(build_query(self.history), 3)
+        self.assertEqual(build_query(self.history), str(self.history[-9:]))
+
+    def test_lookup_runs_in_the_background(self):
+        release = threading.Event()
+        self.memory.get_relevant.side_effect = lambda query, k: release.wait(5) and ["b"]
+        self.prefetcher.start(self.history)
+        # start() returned while the lookup is still blocked
+        release.set()
+        self.assertEqual(self.prefetcher.finish(), ["b"])
+
+    def test_query_counts_the_pending_message(self):
+        pending = {"role": "system", "content": "Command google returned: "}
+        self.prefetcher.start(self.history, pending)
+        self.prefetcher.finish()
+        # The pending result takes the place of the oldest message, as it will once appended
+        self.memory.get_relevant.assert_called_once_with(str(self.history[-8:] + [pending]), 3)
+        self.assertEqual(build_query(self.history, pending), str(self.history[-8:] + [pending]))
+
+    def test_added_memory_is_ranked_by_the_result(self):
+        self.memory.get_relevant.return_value = ["weather in paris", "bread recipe", "train times"]
+        self.prefetcher.start(self.history)
+        self.assertEqual(self.prefetcher.finish("Result: stock prices fell", self.result_message),
+                         ["Result: stock prices fell", "weather in paris", "bread recipe"])
+
+    def test_better_matches_stay_ahead_of_the_added_memory(self):
+        self.memory.get_relevant.return_value = ["stock prices fell on monday", "weather in paris", "bread recipe"]
+        self.prefetcher.start(self.history)
+        self.assertEqual(self.prefetcher.finish("Result: bread", self.result_message),
+                         ["stock prices fell on monday", "weather in paris", "Result: bread"])
+
+    def test_added_memory_is_not_duplicated(self):
+        self.prefetcher.start(self.history)
+        self.assertEqual(self.prefetcher.finish("c", self.result_message), ["b", "d", "c"])
+
+    def test_nothing_started(self):
+        self.assertIsNone(self.prefetcher.finish("a"))
+
+    def test_failed_lookup_falls_back(self):
+        self.memory.get_relevant.side_effect = RuntimeError("index unavailable")
+        self.prefetcher.start(self.history)
+        with mock.patch("scripts.memory.prefetch.logger"):
+            self.assertIsNone(self.prefetcher.finish("a"))
+
+
+if __name__ == '__main__':
+    unittest.main()
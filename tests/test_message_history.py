@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import tests.context
+
+from scripts import message_history
+from scripts.message_history import MessageHistory, history_window
+
+
+def count_each_message_tokens(messages, model):
+    # One token per character of content, so tests do not need an encoding
+    return [len(message["content"]) for message in messages]
+
+
+class TestMessageHistory(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(message_history.token_counter, "count_each_message_tokens",
+                                  side_effect=count_each_message_tokens)
+        self.counter = patch.start()
+        self.addCleanup(patch.stop)
+        self.history = MessageHistory(
+            [{"role": "user", "content": "a" * size} for size in (5, 3, 4, 2)])
+
+    def test_prefix_sums(self):
+        self.assertEqual(self.history.prefix_sums("gpt-4"), [0, 5, 8, 12, 14])
+
+    def test_appended_messages_are_counted_once(self):
+        self.history.prefix_sums("gpt-4")
+        self.history.append({"role": "user", "content": "a"})
+        self.assertEqual(self.history.prefix_sums("gpt-4"), [0, 5, 8, 12, 14, 15])
+        counted = sum(len(call.args[0]) for call in self.counter.call_args_list)
+        self.assertEqual(counted, 5)
+
+    def test_other_changes_reset_the_sums(self):
+        self.history.prefix_sums("gpt-4")
+        self.history[0] = {"role": "user", "content": "a"}
+        self.assertEqual(self.history.prefix_sums("gpt-4"), [0, 1, 4, 8, 10])
+        del self.history[0]
+        self.assertEqual(self.history.prefix_sums("gpt-4"), [0, 3, 7, 9])
+
+    def test_window_keeps_the_most_recent_messages_that_fit(self):
+        self.assertEqual(history_window(self.history, 6, "gpt-4"), (2, 6))
+        self.assertEqual(history_window(self.history, 8, "gpt-4"), (2, 6))
+        self.assertEqual(history_window(self.history, 9, "gpt-4"), (1, 9))
+        self.assertEqual(history_window(self.history, 100, "gpt-4"), (0, 14))
+
+    def test_window_when_nothing_fits(self):
+        self.assertEqual(history_window(self.history, 1, "gpt-4"), (4, 0))
+        self.assertEqual(history_window(self.history, -5, "gpt-4"), (4, 0))
+        self.assertEqual(history_window(MessageHistory(), 10, "gpt-4"), (0, 0))
+
+    def test_window_on_a_plain_list(self):
+        self.assertEqual(history_window(list(self.history), 9, "gpt-4"), (1, 9))
+
+
+class TestMessageHistoryCompaction(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch.object(message_history.token_counter, "count_each_message_tokens",
+                                  side_effect=count_each_message_tokens)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.archive_path = os.path.join(self.directory, "history.jsonl")
+        self.summarize = mock.Mock(side_effect=lambda summary, messages: summary + "".join(
+            message["content"] for message in messages))
+        self.history = MessageHistory(max_messages=4, archive_path=self.archive_path, summarize=self.summarize)
+
+    def append(self, *contents):
+        for content in contents:
+            self.history.append({"role": "user", "content": content})
+            self.history.wait_for_compaction()
+
+    def test_history_is_kept_until_max_messages(self):
+        self.append("a", "b", "c", "d")
+        self.assertEqual(len(self.history), 4)
+        self.summarize.assert_not_called()
+
+    def test_oldest_messages_are_summarized_and_archived(self):
+        self.append("a", "b", "c", "d", "e")
+        self.assertEqual([message["content"] for message in self.history], ["d", "e"])
+        self.assertEqual(self.history.summary, "abc")
+        self.assertEqual(self.history.archived_messages, 3)
+        with open(self.archive_path) as f:
+            self.assertEqual([json.loads(line)["content"] for line in f], ["a", "b", "c"])
+
+    def test_summary_is_rolling(self):
+        self.append("a", "b", "c", "d", "e", "f", "g", "h")
+        self.assertEqual(self.history.summary, "abcdef")
+        self.assertEqual([message["content"] for message in self.history], ["g", "h"])
+
+    def test_prefix_sums_are_shifted(self):
+        self.append("a", "bb", "ccc", "dddd")
+        self.history.prefix_sums("gpt-4")
+        self.append("eeeee")
+        self.assertEqual(self.history.prefix_sums("gpt-4"), [0, 4, 9])
+
+    def test_messages_are_kept_until_summarized(self):
+        summarizing = threading.Event()
+        self.summarize.side_effect = lambda summary, messages: summarizing.wait(5) and "abc"
+        for content in "abcde":
+            self.history.append({"role": "user", "content": content})
+        # Appending while the summary is being written drops nothing
+        self.history.append({"role": "user", "content": "f"})
+        self.assertEqual([message["content"] for message in self.history], list("abcdef"))
+        self.assertEqual(self.history.summary, "")
+        summarizing.set()
+        self.history.wait_for_compaction()
+        self.assertEqual([message["content"] for message in self.history], ["d", "e", "f"])
+        self.assertEqual(self.history.summary, "abc")
+
+    def test_failed_summary_keeps_the_messages(self):
+        self.summarize.side_effect = [RuntimeError("API down"), "abcd"]
+        with mock.patch.object(message_history.logger, "error"):
+            self.append("a", "b", "c", "d", "e")
+        self.assertEqual(self.history.summary, "")
+        self.assertEqual(len(self.history), 5)
+        self.assertFalse(os.path.exists(self.archive_path))
+        # Retried on the next append
+        self.append("f")
+        self.assertEqual(self.history.summary, "abcd")
+        self.assertEqual([message["content"] for message in self.history], ["e", "f"])
+
+
+class TestSummarizeMessages(unittest.TestCase):
+
+    def test_messages_are_summarized_in_batches(self):
+        messages = [{"role": "user", "content": "a" * 100} for _ in range(3)]
+        with mock.patch.object(message_history.token_counter, "count_strings_tokens",
+                               side_effect=lambda strings, model: [len(string) for string in strings]), \
+                mock.patch.object(message_history.cfg, "fast_token_limit", 1450), \
+                mock.patch.object(message_history, "create_chat_completion",
+                                  side_effect=["first ", "second "]) as create_chat_completion:
+            summary = message_history.summarize_messages("", messages)
+        # 1450 - 2 * 500 - 200 leaves 250 tokens, two 106 token lines per batch
+        self.assertEqual(summary, "second")
+        self.assertEqual(create_chat_completion.call_count, 2)
+        second_prompt = create_chat_completion.call_args.kwargs["messages"][1]["content"]
+        self.assertIn("Previous summary:\nfirst", second_prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import threading
+import unittest
+import openai
+import requests
+import tests.context
+
+from scripts.mock_openai_server import MockServerSettings, create_server, parse_latency
+
+
+class TestMockOpenAIServer(unittest.TestCase):
+
+    def start_server(self, **settings):
+        server = create_server(port=0, settings=MockServerSettings(**settings))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_port}/v1"
+
+    def test_chat_completion_through_openai_client(self):
+        api_base = self.start_server(replies=[{"command": {"name": "google", "args": {"input": "x"}}}])
+        response = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": "Hello"}],
+            api_base=api_base,
+            api_key="test",
+        )
+        reply = json.loads(response.choices[0].message["content"])
+        self.assertEqual(reply["command"]["name"], "google")
+        self.assertGreater(response["usage"]["total_tokens"], 0)
+
+    def test_streamed_chat_completion(self):
+        api_base = self.start_server()
+        chunks = openai.ChatCompletion.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": "Hello"}],
+            stream=True,
+            api_base=api_base,
+            api_key="test",
+        )
+        content = "".join(chunk.choices[0].delta.get("content", "") for chunk in chunks)
+        self.assertEqual(json.loads(content)["command"]["name"], "do_nothing")
+
+    def test_embeddings_are_deterministic(self):
+        api_base = self.start_server()
+        first = requests.post(f"{api_base}/embeddings", json={"input": ["text"]}).json()
+        second = requests.post(f"{api_base}/embeddings", json={"input": "text"}).json()
+        self.assertEqual(len(first["data"][0]["embedding"]), 1536)
+        self.assertEqual(first["data"][0]["embedding"], second["data"][0]["embedding"])
+
+    def test_rate_limit_injection(self):
+        api_base = self.start_server(rate_limit_rate=1.0)
+        with self.assertRaises(openai.error.RateLimitError):
+            openai.ChatCompletion.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": "Hello"}],
+                api_base=api_base,
+                api_key="test",
+            )
+        stats = requests.get(f"{api_base}/stats").json()
+        self.assertEqual(stats["rate_limited"], 1)
+
+    def test_error_injection(self):
+        api_base = self.start_server(error_rate=1.0, error_status=502)
+        response = requests.post(f"{api_base}/chat/completions", json={"messages": []})
+        self.assertEqual(response.status_code, 502)
+
+    def test_parse_latency(self):
+        self.assertEqual(parse_latency("constant:0.5")(), 0.5)
+        self.assertTrue(0.1 <= parse_latency("uniform:0.1,0.2")() <= 0.2)
+        self.assertGreaterEqual(parse_latency("normal:0,1")(), 0)
+        with self.assertRaises(ValueError):
+            parse_latency("gamma:1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+import openai
+import tests.context
+
+from scripts import llm_utils
+from scripts.llm_utils import ModelRouter
+
+
+def messages_of_length(characters):
+    return [{"role": "user", "content": "x" * characters}]
+
+
+class TestModelRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter("fast", "smart", 4000, 8000, cooldown=60,
+                                  interchangeable_call_sites=["summarize_text"])
+        # Exact counts, without loading a tokenizer: one token per 5 characters
+        patcher = mock.patch("token_counter.count_message_tokens",
+                             side_effect=lambda messages, model: sum(len(m["content"]) // 5 + 4 for m in messages) + 3)
+        self.count_message_tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefers_requested_model(self):
+        self.assertEqual(self.router.candidates("fast", messages_of_length(100)), ["fast", "smart"])
+        self.assertEqual(self.router.candidates("smart", messages_of_length(100)), ["smart", "fast"])
+
+    def test_unknown_model_is_not_routed(self):
+        self.assertEqual(self.router.candidates("other", messages_of_length(100)), ["other"])
+
+    def test_large_prompt_goes_to_larger_model(self):
+        self.assertEqual(self.router.candidates("fast", messages_of_length(20000)), ["smart"])
+        self.assertEqual(self.router.candidates("smart", messages_of_length(20000)), ["smart"])
+
+    def test_chat_remainder_fits_requested_model(self):
+        # chat_with_ai asks for the exact number of tokens left after the prompt
+        messages = [{"role": "system", "content": "x" * 10000}, {"role": "user", "content": "y" * 5000}]
+        max_tokens = 4000 - self.count_message_tokens(messages, "fast")
+        self.assertEqual(self.router.candidates("fast", messages, max_tokens, call_site="chat"), ["fast", "smart"])
+        self.assertEqual(self.router.candidates("fast", messages, max_tokens + 1, call_site="chat"), ["smart"])
+
+    def test_small_prompts_are_not_counted(self):
+        self.router.candidates("fast", messages_of_length(100), 300)
+        self.count_message_tokens.assert_not_called()
+
+    def test_single_model_modes_are_not_routed(self):
+        router = ModelRouter()
+        fast_model = llm_utils.cfg.fast_llm_model
+        # What --gpt3only does once the router exists
+        with mock.patch.object(llm_utils.cfg, "smart_llm_model", fast_model):
+            router.record_failure(fast_model, "rate limit")
+            self.assertIsNone(router.other_model(fast_model))
+            self.assertEqual(router.candidates(fast_model, messages_of_length(100)), [fast_model])
+            self.assertEqual(router.candidates(fast_model, messages_of_length(200000)), [fast_model])
+
+    def test_models_follow_the_config(self):
+        router = ModelRouter()
+        with mock.patch.object(llm_utils.cfg, "fast_llm_model", "fast"), \
+                mock.patch.object(llm_utils.cfg, "smart_llm_model", "smart"):
+            self.assertEqual(router.other_model("fast"), "smart")
+
+    def test_failing_model_goes_last(self):
+        self.router.record_failure("fast", "rate limit")
+        self.assertEqual(self.router.candidates("fast", messages_of_length(100)), ["smart", "fast"])
+
+    def test_interchangeable_call_site_uses_faster_model(self):
+        self.router.record_success("smart", 10.0)
+        self.router.record_success("fast", 1.0)
+        self.assertEqual(self.router.candidates("smart", messages_of_length(100), call_site="summarize_text"),
+                         ["fast", "smart"])
+        self.assertEqual(self.router.candidates("smart", messages_of_length(100), call_site="chat"),
+                         ["smart", "fast"])
+
+
+class TestCompletionFailover(unittest.TestCase):
+
+    def test_rate_limit_falls_back_without_sleeping(self):
+        router = ModelRouter("fast", "smart", 4000, 8000)
+        calls = []
+
+        def create(model, **kwargs):
+            calls.append(model)
+            if model == "fast":
+                raise openai.error.RateLimitError("rate limited")
+            return {"usage": {"prompt_tokens": 3, "completion_tokens": 1}}
+
+        with mock.patch.object(llm_utils, "router", router), \
+                mock.patch.object(llm_utils.cfg, "use_azure", False), \
+                mock.patch("openai.ChatCompletion.create", side_effect=create), \
+                mock.patch("time.sleep") as sleep:
+            response = llm_utils._create_completion_request("fast", messages_of_length(10), 0, None)
+
+        self.assertEqual(response["usage"]["prompt_tokens"], 3)
+        self.assertEqual(calls, ["fast", "smart"])
+        sleep.assert_not_called()
+        self.assertEqual(router.get_stats()["fallbacks"], 1)
+        self.assertEqual(router.get_stats()["cooling_down"], ["fast"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import threading
+import unittest
+import tests.context
+
+from scripts.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_concurrently(self, flight, key, fn, callers=5):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(flight.do(key, fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        threads, results, errors = self.run_concurrently(flight, "key", slow)
+        # Wait until every caller has either started the call or joined it
+        while flight.calls + flight.saved_calls < len(threads):
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ["result"] * 5)
+        self.assertEqual(flight.get_stats(), {"calls": 1, "saved_calls": 4})
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise ValueError("boom")
+
+        threads, results, errors = self.run_concurrently(flight, "key", failing, callers=3)
+        while flight.calls + flight.saved_calls < len(threads):
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+
+    def test_sequential_calls_are_not_shared(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+        self.assertEqual(flight.get_stats(), {"calls": 2, "saved_calls": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import unittest
+import tests.context
+
+from scripts.json_utils import StreamingJsonScanner
+
+
+class TestStreamingJsonScanner(unittest.TestCase):
+
+    def feed_in_pieces(self, text, size):
+        scanner = StreamingJsonScanner()
+        fields = []
+        for i in range(0, len(text), size):
+            fields.extend(scanner.feed(text[i:i + size]))
+        return fields
+
+    def test_reports_top_level_fields_in_order(self):
+        reply = json.dumps({
+            "thoughts": {"text": "thought", "plan": ["- a", "- b"]},
+            "command": {"name": "google", "args": {"input": "query"}},
+        }, indent=4)
+        for size in (1, 3, len(reply)):
+            fields = self.feed_in_pieces(reply, size)
+            self.assertEqual([key for key, _ in fields], ["thoughts", "command"])
+            self.assertEqual(fields[1][1], {"name": "google", "args": {"input": "query"}})
+
+    def test_field_is_reported_as_soon_as_it_completes(self):
+        scanner = StreamingJsonScanner()
+        self.assertEqual(scanner.feed('{"command": {"name": "do_nothing", "args": {}}'),
+                         [("command", {"name": "do_nothing", "args": {}})])
+        self.assertEqual(scanner.feed(', "thoughts": {}}'), [("thoughts", {})])
+        self.assertTrue(scanner.done)
+
+    def test_braces_and_quotes_inside_strings(self):
+        reply = '{"thoughts": {"text": "a } \\" { b"}, "count": 3}'
+        fields = self.feed_in_pieces(reply, 2)
+        self.assertEqual(fields, [("thoughts", {"text": 'a } " { b'}), ("count", 3)])
+
+    def test_ignores_text_before_the_object(self):
+        fields = self.feed_in_pieces('Sure, here is "the" JSON: {"command": {"name": "x"}}', 4)
+        self.assertEqual(fields, [("command", {"name": "x"})])
+
+
+if __name__ == '__main__':
+    unittest.main()
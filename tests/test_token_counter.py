@@ -0,0 +1,145 @@
+import base64
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import tiktoken.registry
+import tests.context
+
+from scripts import token_counter
+from scripts.chat import ChatMessage, create_chat_message
+
+
+def write_byte_level_bpe(path):
+    """Writes a BPE file that maps every byte to its own token"""
+    with open(path, "w") as f:
+        for byte in range(256):
+            f.write(f"{base64.b64encode(bytes([byte])).decode()} {byte}\n")
+
+
+class TestTokenCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        write_byte_level_bpe(os.path.join(self.directory, "cl100k_base.tiktoken"))
+        self.patches = [
+            mock.patch.object(token_counter.cfg, "tiktoken_cache_dir", self.directory),
+            mock.patch.dict(os.environ, {"TIKTOKEN_CACHE_DIR": self.directory}),
+            mock.patch.dict(tiktoken.registry.ENCODINGS, clear=True),
+            # The bundled file must be used, nothing may be downloaded
+            mock.patch("tiktoken.load.read_file", side_effect=AssertionError("network access")),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.clear_caches()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.clear_caches()
+        shutil.rmtree(self.directory)
+
+    def clear_caches(self):
+        token_counter.get_encoding.cache_clear()
+        token_counter._get_encoding_by_name.cache_clear()
+
+    def test_loads_bundled_bpe_without_network(self):
+        self.assertEqual(token_counter.count_string_tokens("hello", "gpt-4"), 5)
+
+    def test_encoding_is_resolved_once_per_model(self):
+        with mock.patch("tiktoken.get_encoding", wraps=tiktoken.get_encoding) as get_encoding:
+            for _ in range(3):
+                token_counter.count_string_tokens("hello", "gpt-3.5-turbo")
+                token_counter.count_message_tokens([{"role": "user", "content": "hi"}], "gpt-3.5-turbo")
+                token_counter.count_message_tokens([{"role": "user", "content": "hi"}], "gpt-4-0314")
+        self.assertEqual(get_encoding.call_count, 1)
+
+    def test_count_message_tokens(self):
+        messages = [{"role": "user", "content": "hi"}]
+        # 4 per message + 4 for "user" + 2 for "hi" + 3 for the reply primer
+        self.assertEqual(token_counter.count_message_tokens(messages, "gpt-3.5-turbo"), 13)
+        # 3 per message + 4 + 2 + 3
+        self.assertEqual(token_counter.count_message_tokens(messages, "gpt-4"), 12)
+
+    def test_chat_messages_are_tokenized_once(self):
+        history = [create_chat_message("user", "hi"), create_chat_message("assistant", "hello")]
+        encoding = token_counter.get_encoding("gpt-4")
+        with mock.patch.object(encoding, "encode", wraps=encoding.encode) as encode:
+            first = token_counter.count_message_tokens(history, "gpt-4")
+            second = token_counter.count_message_tokens(history, "gpt-4")
+        self.assertEqual(first, second)
+        self.assertEqual(encode.call_count, 4)
+
+    def test_chat_message_count_is_reset_on_change(self):
+        message = create_chat_message("user", "hi")
+        self.assertEqual(token_counter.count_message_tokens([message], "gpt-4"), 12)
+        message["content"] = "hello"
+        self.assertEqual(token_counter.count_message_tokens([message], "gpt-4"), 15)
+
+    def test_chat_message_is_a_plain_dict_for_the_api(self):
+        message = create_chat_message("user", "hi")
+        token_counter.count_message_tokens([message], "gpt-4")
+        self.assertIsInstance(message, ChatMessage)
+        self.assertEqual(message, {"role": "user", "content": "hi"})
+
+    def test_remembered_count_is_used(self):
+        message = create_chat_message("system", "a long prompt")
+        token_counter.remember_message_tokens(message, "gpt-4", 1000)
+        self.assertEqual(token_counter.count_message_tokens([message], "gpt-4"), 1003)
+        # Other models count the message themselves
+        self.assertEqual(token_counter.count_message_tokens([message], "gpt-3.5-turbo"), 26)
+
+    def test_count_strings_tokens(self):
+        self.assertEqual(token_counter.count_strings_tokens(["hello", "", "hi"], "gpt-4"), [5, 0, 2])
+        self.assertEqual(token_counter.count_strings_tokens([], "gpt-4"), [])
+
+    def test_count_each_message_tokens(self):
+        messages = [create_chat_message("user", "hi"), {"role": "assistant", "content": "hello", "name": "a"}]
+        # 3 + 4 + 2, then 3 + 9 + 5 + 1 + 1 for the name
+        self.assertEqual(token_counter.count_each_message_tokens(messages, "gpt-4"), [9, 19])
+        self.assertEqual(token_counter.count_message_tokens(messages, "gpt-4"), 9 + 19 + 3)
+        # The chat message remembers its count
+        with mock.patch.object(token_counter, "count_strings_tokens") as count_strings_tokens:
+            token_counter.count_each_message_tokens(messages[:1], "gpt-4")
+        count_strings_tokens.assert_not_called()
+
+    def test_special_tokens_are_counted_as_text(self):
+        # Pages about language models quote the special tokens
+        text = "<|endoftext|>"
+        self.assertEqual(token_counter.count_string_tokens(text, "gpt-4"), 13)
+        self.assertEqual(token_counter.count_strings_tokens([text], "gpt-4"), [13])
+        self.assertEqual(token_counter.count_message_tokens([{"role": "user", "content": text}], "gpt-4"), 23)
+
+    def test_unsupported_model(self):
+        with self.assertRaises(NotImplementedError):
+            token_counter.count_message_tokens([], "text-davinci-003")
+
+
+class TestTokenEstimator(unittest.TestCase):
+
+    def test_estimate(self):
+        estimator = token_counter.TokenEstimator(chars_per_token=4.0)
+        self.assertEqual(estimator.estimate("a" * 400), 100)
+        self.assertEqual(estimator.bounds("a" * 400), (50, 150))
+
+    def test_high_bound_never_exceeds_bytes(self):
+        estimator = token_counter.TokenEstimator(chars_per_token=0.5)
+        self.assertEqual(estimator.bounds("abcd")[1], 4)
+        self.assertLessEqual(*estimator.bounds("abcd"))
+
+    def test_max_string_tokens(self):
+        self.assertEqual(token_counter.max_string_tokens("abcd"), 4)
+        self.assertEqual(token_counter.max_string_tokens("\u20ac"), 3)
+
+    def test_calibration(self):
+        estimator = token_counter.TokenEstimator(chars_per_token=4.0, smoothing=0.5)
+        estimator.observe(200, 100)
+        self.assertEqual(estimator.chars_per_token, 3.0)
+        # Short strings are ignored
+        estimator.observe(10, 10)
+        self.assertEqual(estimator.chars_per_token, 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import tests.context
+
+from scripts.usage_tracker import UsageTracker, estimate_cost
+
+
+class TestUsageTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = UsageTracker(report_file=None)
+
+    def test_estimate_cost_uses_base_model_price(self):
+        self.assertAlmostEqual(estimate_cost("gpt-4-0314", 1000, 1000), 0.09)
+        self.assertAlmostEqual(estimate_cost("gpt-4-32k", 1000, 0), 0.06)
+        self.assertEqual(estimate_cost("unknown-model", 1000, 1000), 0)
+
+    def test_aggregates_per_call_site(self):
+        self.tracker.record("chat", "gpt-3.5-turbo", 1000, 500, latency=2.0, retries=1)
+        self.tracker.record("chat", "gpt-3.5-turbo", 1000, 500, latency=4.0)
+        self.tracker.record("fix_json", "gpt-3.5-turbo", cached=True)
+
+        stats = self.tracker.get_stats()
+        self.assertEqual(stats["chat"]["calls"], 2)
+        self.assertEqual(stats["chat"]["prompt_tokens"], 2000)
+        self.assertEqual(stats["chat"]["completion_tokens"], 1000)
+        self.assertEqual(stats["chat"]["retries"], 1)
+        self.assertEqual(stats["chat"]["mean_latency"], 3.0)
+        self.assertEqual(stats["chat"]["max_latency"], 4.0)
+        self.assertAlmostEqual(stats["chat"]["cost"], 0.006)
+        self.assertEqual(stats["fix_json"]["cached_calls"], 1)
+        self.assertEqual(stats["fix_json"]["cost"], 0)
+        self.assertAlmostEqual(self.tracker.get_total_cost(), 0.006)
+        self.assertIn("chat", self.tracker.summary())
+
+    def test_dump(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.tracker.report_file = os.path.join(directory, "usage.json")
+        self.tracker.record(None, "text-embedding-ada-002", 100)
+        self.tracker.dump()
+        with open(self.tracker.report_file) as f:
+            report = json.load(f)
+        self.assertEqual(report["call_sites"]["unknown"]["prompt_tokens"], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import pytest
+import tests.context
+
+from scripts import browse
+from scripts.browse import download, get_response, is_text_content_type, response_text
+
+
+@pytest.fixture(autouse=True)
+def no_http_cache(mocker):
+    mocker.patch.object(browse, "http_cache", None)
+
+
+def mock_get(mocker, chunks, content_type="text/html", status_code=200):
+    headers = {"Content-Type": content_type} if content_type is not None else {}
+    response = mocker.Mock(status_code=status_code, headers=headers)
+    response.iter_content.return_value = iter(chunks)
+    mocker.patch("requests.Session.get", return_value=response)
+    return response
+
+
+class TestDownload:
+
+    def test_streams_the_body(self, mocker):
+        response = mock_get(mocker, [b"<p>Hello ", b"world</p>"])
+        assert download("https://example.com").decoded_text == "<p>Hello world</p>"
+        assert response._content == b"<p>Hello world</p>"
+        assert not response.truncated
+        response.close.assert_called_once()
+
+    def test_host_slot_is_held_while_reading(self, mocker):
+        session = browse.http_pool.session
+        held = []
+        response = mock_get(mocker, [])
+        response.iter_content.side_effect = lambda chunk_size: held.append(set(session._held.hosts)) or iter([b"a"])
+        download("https://example.com/page")
+        assert held == [{"example.com"}]
+        assert not session._held.hosts
+
+    def test_large_pages_are_truncated(self, mocker):
+        mocker.patch.object(browse.cfg, "browse_max_bytes", 10)
+        chunks = iter([b"a" * 6, b"b" * 6, b"c" * 6])
+        mock_get(mocker, chunks)
+        response = download("https://example.com")
+        assert response.decoded_text == "aaaaaabbbb"
+        assert response.truncated
+        # The rest of the body is never read
+        assert next(chunks) == b"c" * 6
+        assert response_text(response).endswith("[Content truncated: the page is larger than 10 bytes]")
+
+    def test_non_text_content_is_not_downloaded(self, mocker):
+        response = mock_get(mocker, [b"%PDF"], content_type="application/pdf")
+        assert get_response("https://example.com/file.pdf") == (None, "Error: Unsupported content type application/pdf")
+        response.iter_content.assert_not_called()
+
+    def test_binary_content_without_content_type(self, mocker):
+        mock_get(mocker, [b"\x89PNG\r\n\x1a\n\x00\x00"], content_type=None)
+        assert get_response("https://example.com/image")[1] == "Error: Unsupported content type: the page is binary"
+
+    def test_characters_split_across_chunks(self, mocker):
+        encoded = "café ünïcode".encode("utf-8")
+        mock_get(mocker, [encoded[i:i + 1] for i in range(len(encoded))], content_type="text/plain; charset=utf-8")
+        assert download("https://example.com").decoded_text == "café ünïcode"
+
+    def test_charset_from_meta_tag(self, mocker):
+        html = '<html><head><meta charset="iso-8859-1"></head><body>café</body></html>'
+        mock_get(mocker, [html.encode("iso-8859-1")])
+        assert "café" in download("https://example.com").decoded_text
+
+    def test_errors_have_no_body(self, mocker):
+        response = mock_get(mocker, [b"Not found"], status_code=404)
+        assert get_response("https://example.com") == (None, "Error: HTTP 404 error")
+        response.iter_content.assert_not_called()
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("text/html; charset=utf-8", True),
+    ("application/xhtml+xml", True),
+    ("application/rss+xml", True),
+    ("application/json", True),
+    ("application/pdf", False),
+    ("image/png", False),
+    ("application/octet-stream", False),
+])
+def test_is_text_content_type(content_type, expected):
+    assert is_text_content_type(content_type) == expected
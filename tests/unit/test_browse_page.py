@@ -0,0 +1,68 @@
+from unittest import mock
+
+import pytest
+import tests.context
+
+from scripts import browse
+from scripts.browse import WebPage, get_page
+
+HTML = "<html><head><style>p {}</style></head><body><p>Hello <b>world</b></p>" \
+       "<a href='https://example.com/a'>A</a><script>var a;</script></body></html>"
+
+
+@pytest.fixture(autouse=True)
+def empty_page_cache():
+    browse._page_cache.clear()
+    yield
+    browse._page_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_http_cache(mocker):
+    mocker.patch.object(browse, "http_cache", None)
+
+
+def mock_get(mocker, html=HTML, status_code=200):
+    response = mocker.Mock(status_code=status_code, headers={"Content-Type": "text/html"})
+    response.iter_content.return_value = [html.encode()]
+    return mocker.patch("requests.Session.get", return_value=response)
+
+
+class TestWebPage:
+
+    def test_text_and_links_share_one_parse(self):
+        page = WebPage("https://example.com", HTML)
+        with mock.patch.object(browse.html_extractor, "extract", wraps=browse.html_extractor.extract) as extract:
+            assert page.text == "Hello worldA"
+            assert page.links == [("A", "https://example.com/a")]
+        assert extract.call_count == 1
+
+
+class TestGetPage:
+
+    def test_page_is_fetched_once(self, mocker):
+        get = mock_get(mocker)
+        first, _ = get_page("https://example.com")
+        second, _ = get_page("https://example.com")
+        assert first is second
+        assert get.call_count == 1
+
+    def test_page_expires(self, mocker):
+        get = mock_get(mocker)
+        mocker.patch.object(browse.cfg, "browse_page_ttl", 0)
+        get_page("https://example.com")
+        get_page("https://example.com")
+        assert get.call_count == 2
+
+    def test_errors_are_not_cached(self, mocker):
+        get = mock_get(mocker, status_code=404)
+        assert get_page("https://example.com") == (None, "Error: HTTP 404 error")
+        get_page("https://example.com")
+        assert get.call_count == 2
+
+    def test_cache_is_bounded(self, mocker):
+        mock_get(mocker)
+        mocker.patch.object(browse, "PAGE_CACHE_SIZE", 2)
+        for i in range(3):
+            get_page(f"https://example.com/{i}")
+        assert list(browse._page_cache) == ["https://example.com/1", "https://example.com/2"]
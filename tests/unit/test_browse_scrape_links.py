@@ -5,6 +5,7 @@
 # pip install pytest-mock
 import pytest
 
+from scripts import browse
 from scripts.browse import scrape_links
 
 """
@@ -38,6 +39,11 @@ requests and parse HTML content, respectively.
 """
 
 
+@pytest.fixture(autouse=True)
+def no_http_cache(mocker):
+    mocker.patch.object(browse, "http_cache", None)
+
+
 class TestScrapeLinks:
 
     # Tests that the function returns a list of formatted hyperlinks when
@@ -51,11 +57,13 @@ class TestScrapeLinks:
 
     # Tests that the function returns correctly formatted hyperlinks when given a valid url.
     def test_valid_url(self, mocker):
-        # Mock the requests.get() function to return a response with sample HTML containing hyperlinks
+        # Mock the requests.Session.get() function to return a response with sample HTML containing hyperlinks
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = "<html><body><a href='https://www.google.com'>Google</a></body></html>"
-        mocker.patch('requests.get', return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch('requests.Session.get', return_value=mock_response)
 
         # Call the function with a valid URL
         result = scrape_links("https://www.example.com")
@@ -65,10 +73,10 @@ class TestScrapeLinks:
 
     # Tests that the function returns "error" when given an invalid url.
     def test_invalid_url(self, mocker):
-        # Mock the requests.get() function to return an HTTP error response
+        # Mock the requests.Session.get() function to return an HTTP error response
         mock_response = mocker.Mock()
         mock_response.status_code = 404
-        mocker.patch('requests.get', return_value=mock_response)
+        mocker.patch('requests.Session.get', return_value=mock_response)
 
         # Call the function with an invalid URL
         result = scrape_links("https://www.invalidurl.com")
@@ -78,11 +86,13 @@ class TestScrapeLinks:
 
     # Tests that the function returns an empty list when the html contains no hyperlinks.
     def test_no_hyperlinks(self, mocker):
-        # Mock the requests.get() function to return a response with sample HTML containing no hyperlinks
+        # Mock the requests.Session.get() function to return a response with sample HTML containing no hyperlinks
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = "<html><body><p>No hyperlinks here</p></body></html>"
-        mocker.patch('requests.get', return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch('requests.Session.get', return_value=mock_response)
 
         # Call the function with a URL containing no hyperlinks
         result = scrape_links("https://www.example.com")
@@ -93,7 +103,7 @@ class TestScrapeLinks:
     # Tests that scrape_links() correctly extracts and formats hyperlinks from
     # a sample HTML containing a few hyperlinks.
     def test_scrape_links_with_few_hyperlinks(self, mocker):
-        # Mock the requests.get() function to return a response with a sample HTML containing hyperlinks
+        # Mock the requests.Session.get() function to return a response with a sample HTML containing hyperlinks
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = """
@@ -105,7 +115,9 @@ class TestScrapeLinks:
                 </body>
             </html>
         """
-        mocker.patch('requests.get', return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch('requests.Session.get', return_value=mock_response)
 
         # Call the function being tested
         result = scrape_links("https://www.example.com")
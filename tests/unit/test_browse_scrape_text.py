@@ -1,8 +1,10 @@
 
 # Generated by CodiumAI
 
+import pytest
 import requests
 
+from scripts import browse
 from scripts.browse import scrape_text
 
 """
@@ -34,16 +36,23 @@ Additional aspects:
 """
 
 
+@pytest.fixture(autouse=True)
+def no_http_cache(mocker):
+    mocker.patch.object(browse, "http_cache", None)
+
+
 class TestScrapeText:
 
     # Tests that scrape_text() returns the expected text when given a valid URL.
     def test_scrape_text_with_valid_url(self, mocker):
-        # Mock the requests.get() method to return a response with expected text
+        # Mock the requests.Session.get() method to return a response with expected text
         expected_text = "This is some sample text"
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = f"<html><body><div><p style='color: blue;'>{expected_text}</p></div></body></html>"
-        mocker.patch("requests.get", return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch("requests.Session.get", return_value=mock_response)
 
         # Call the function with a valid URL and assert that it returns the expected text
         url = "http://www.example.com"
@@ -51,8 +60,8 @@ class TestScrapeText:
 
     # Tests that the function returns an error message when an invalid or unreachable url is provided.
     def test_invalid_url(self, mocker):
-        # Mock the requests.get() method to raise an exception
-        mocker.patch("requests.get", side_effect=requests.exceptions.RequestException)
+        # Mock the requests.Session.get() method to raise an exception
+        mocker.patch("requests.Session.get", side_effect=requests.exceptions.RequestException)
 
         # Call the function with an invalid URL and assert that it returns an error message
         url = "http://www.invalidurl.com"
@@ -61,11 +70,13 @@ class TestScrapeText:
 
     # Tests that the function returns an empty string when the html page contains no text to be scraped.
     def test_no_text(self, mocker):
-        # Mock the requests.get() method to return a response with no text
+        # Mock the requests.Session.get() method to return a response with no text
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = "<html><body></body></html>"
-        mocker.patch("requests.get", return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch("requests.Session.get", return_value=mock_response)
 
         # Call the function with a valid URL and assert that it returns an empty string
         url = "http://www.example.com"
@@ -73,8 +84,8 @@ class TestScrapeText:
 
     # Tests that the function returns an error message when the response status code is an http error (>=400).
     def test_http_error(self, mocker):
-        # Mock the requests.get() method to return a response with a 404 status code
-        mocker.patch('requests.get', return_value=mocker.Mock(status_code=404))
+        # Mock the requests.Session.get() method to return a response with a 404 status code
+        mocker.patch('requests.Session.get', return_value=mocker.Mock(status_code=404))
 
         # Call the function with a URL
         result = scrape_text("https://www.example.com")
@@ -89,7 +100,9 @@ class TestScrapeText:
         mock_response = mocker.Mock()
         mock_response.status_code = 200
         mock_response.text = html
-        mocker.patch("requests.get", return_value=mock_response)
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_response.iter_content.return_value = [mock_response.text.encode()]
+        mocker.patch("requests.Session.get", return_value=mock_response)
 
         # Call the function with a URL
         result = scrape_text("https://www.example.com")
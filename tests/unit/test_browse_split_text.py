@@ -0,0 +1,99 @@
+import pytest
+import tiktoken
+import tests.context
+
+import token_counter
+from scripts import browse
+from scripts.browse import split_text
+
+
+class CharacterEncoding:
+    """One token per character"""
+
+    def encode(self, string, **kwargs):
+        return list(string)
+
+    def decode_single_token_bytes(self, token):
+        return token.encode("utf-8")
+
+
+# The exact counter, before the fixture replaces it
+count_strings_tokens = token_counter.count_strings_tokens
+
+
+def byte_encoding():
+    """A tiktoken encoding with one token per UTF-8 byte, so tokens end inside multi-byte characters"""
+    return tiktoken.Encoding("bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)},
+                             special_tokens={"<|endoftext|>": 256})
+
+
+@pytest.fixture(autouse=True)
+def character_tokens(mocker):
+    mocker.patch("token_counter.get_encoding", return_value=CharacterEncoding())
+    # Calibrated to the fake encoding, with no margin so that only clear cases skip counting
+    mocker.patch("token_counter.estimator", token_counter.TokenEstimator(1.0, margin=0.0))
+    return mocker.patch("token_counter.count_strings_tokens",
+                        side_effect=lambda strings, model: [len(s) for s in strings])
+
+
+class TestSplitText:
+
+    def test_short_text_is_one_chunk(self):
+        assert list(split_text("one\ntwo", max_tokens=100, overlap=0)) == ["one\ntwo"]
+
+    def test_short_text_is_not_counted(self, character_tokens):
+        assert list(split_text("one\ntwo", max_tokens=100, overlap=0)) == ["one\ntwo"]
+        character_tokens.assert_not_called()
+
+    def test_margin_covers_a_wrong_estimate(self, mocker, character_tokens):
+        # Estimated at 4 tokens but 7 exactly, the margin makes it close enough to the budget to count
+        mocker.patch("token_counter.estimator", token_counter.TokenEstimator(2.0, margin=1.0))
+        assert list(split_text("one\ntwo", max_tokens=5, overlap=0)) == ["one", "two"]
+        character_tokens.assert_called()
+
+    def test_splits_on_paragraphs(self):
+        assert list(split_text("aaaa\nbbbb\ncccc", max_tokens=10, overlap=0)) == ["aaaa\nbbbb", "cccc"]
+
+    def test_long_paragraph_is_split_into_sentences(self):
+        text = "First one. Second one. Third one."
+        assert list(split_text(text, max_tokens=23, overlap=0)) == ["First one. Second one.", "Third one."]
+
+    def test_long_sentence_is_hard_split(self):
+        chunks = list(split_text("x" * 25, max_tokens=10, overlap=0))
+        assert chunks == ["x" * 10, "x" * 10, "x" * 5]
+
+    def test_hard_split_cuts_between_characters(self, mocker, character_tokens):
+        mocker.patch("token_counter.get_encoding", return_value=byte_encoding())
+        mocker.patch("token_counter.estimator", token_counter.TokenEstimator(0.5, margin=0.0))
+        character_tokens.side_effect = lambda strings, model: [len(s.encode("utf-8")) for s in strings]
+        # Two bytes per character, a cut every 5 bytes would halve the third one
+        chunks = list(split_text("\u00e9" * 5, max_tokens=5, overlap=0))
+        assert chunks == ["\u00e9" * 2, "\u00e9" * 2, "\u00e9"]
+
+    def test_special_tokens_are_split_as_text(self, mocker, character_tokens):
+        mocker.patch("token_counter.get_encoding", return_value=byte_encoding())
+        character_tokens.side_effect = count_strings_tokens
+        text = "<|endoftext|>" * 3
+        chunks = list(split_text(text, max_tokens=20, overlap=0))
+        assert "".join(chunks) == text
+        assert all(len(chunk) <= 20 for chunk in chunks)
+
+    def test_chunks_respect_the_budget(self):
+        text = "\n".join(f"Sentence {i} is here. And another {i}." * (i % 4 + 1) for i in range(50))
+        for chunk in split_text(text, max_tokens=60, overlap=0):
+            assert len(chunk) <= 60
+
+    def test_overlap_repeats_the_end_of_the_previous_chunk(self):
+        chunks = list(split_text("aaaa\nbbbb\ncccc\ndddd", max_tokens=10, overlap=5))
+        assert chunks == ["aaaa\nbbbb", "bbbb\ncccc", "cccc\ndddd"]
+
+    def test_default_budget_follows_the_model(self, mocker):
+        mocker.patch.object(browse.cfg, "browse_chunk_tokens", 2000)
+        mocker.patch.object(browse.cfg, "fast_token_limit", 1000)
+        assert browse.chunk_token_budget(browse.cfg.fast_llm_model) == \
+            1000 - browse.SUMMARY_MAX_TOKENS - browse.SUMMARY_PROMPT_TOKENS
+
+    def test_text_is_split_lazily(self, character_tokens):
+        text = "\n".join(["a" * 5] * (browse.SPLIT_BATCH_SIZE * 10))
+        next(split_text(text, max_tokens=6, overlap=0))
+        assert character_tokens.call_count == 1
@@ -0,0 +1,136 @@
+import threading
+
+import pytest
+import tests.context
+
+import token_counter
+from scripts import browse
+from scripts.browse import group_summaries, summarize_text
+from scripts.llm_cache import SummaryCache
+
+
+@pytest.fixture
+def completions(mocker):
+    """Answers every summary request with the chunk it was given, tagged with the call number"""
+    calls = []
+    lock = threading.Lock()
+
+    def create_chat_completion(model, messages, max_tokens, call_site):
+        chunk = messages[0]["content"].split('"""')[1]
+        with lock:
+            calls.append(chunk)
+            return f"<{chunk.replace(chr(10), '|')}>"
+
+    mocker.patch.object(browse, "create_chat_completion", side_effect=create_chat_completion)
+    mocker.patch.object(browse, "summary_cache", None)
+    mocker.patch("token_counter.count_strings_tokens", side_effect=lambda strings, model: [len(s) for s in strings])
+    # Calibrated to the fake counter, with no margin so that only clear cases skip counting
+    mocker.patch("token_counter.estimator", token_counter.TokenEstimator(1.0, margin=0.0))
+    return calls
+
+
+class TestGroupSummaries:
+
+    def test_groups_fit_the_budget(self, completions):
+        assert group_summaries(["aaa", "bbb", "ccc", "ddd"], 8, "gpt-3.5-turbo") == [["aaa", "bbb"], ["ccc", "ddd"]]
+
+    def test_groups_hold_at_least_two_summaries(self, completions):
+        assert group_summaries(["aaa", "bbb", "ccc"], 1, "gpt-3.5-turbo") == [["aaa", "bbb"], ["ccc"]]
+
+    def test_summaries_clearly_within_the_budget_are_not_counted(self, completions):
+        assert group_summaries(["aaa", "bbb"], 100, "gpt-3.5-turbo") == [["aaa", "bbb"]]
+        token_counter.count_strings_tokens.assert_not_called()
+
+
+class TestSummarizeText:
+
+    def test_empty_text(self, completions):
+        assert summarize_text("", "question") == "Error: No text to summarize"
+
+    def test_chunks_are_summarized_concurrently(self, completions, mocker):
+        mocker.patch.object(browse, "split_text", return_value=iter(["a", "b", "c", "d"]))
+        mocker.patch.object(browse.cfg, "browse_summary_workers", 4)
+        barrier = threading.Barrier(4, timeout=5)
+        summarize_chunk = browse.summarize_chunk
+
+        def wait_for_all(chunk, question):
+            if len(chunk) == 1:
+                # Fails with BrokenBarrierError unless the four chunks run at once
+                barrier.wait()
+            return summarize_chunk(chunk, question)
+
+        mocker.patch.object(browse, "summarize_chunk", side_effect=wait_for_all)
+        assert summarize_text("abcd", "question") == "<<a>|<b>|<c>|<d>>"
+
+    def test_summaries_are_reduced_in_rounds_when_too_long(self, completions, mocker):
+        mocker.patch.object(browse, "split_text", return_value=iter(["a", "b", "c", "d"]))
+        mocker.patch.object(browse.cfg, "fast_token_limit", browse.SUMMARY_MAX_TOKENS + browse.SUMMARY_PROMPT_TOKENS + 8)
+        result = summarize_text("abcd", "question")
+        assert result == "<<<a>|<b>>|<<c>|<d>>>"
+        assert len(completions) == 7
+
+    def test_progress_is_logged_not_printed(self, completions, mocker, capsys):
+        mocker.patch.object(browse, "split_text", return_value=iter(["a", "b"]))
+        debug = mocker.patch.object(browse.logger, "debug")
+        summarize_text("ab", "question")
+        assert capsys.readouterr().out == ""
+        assert any("Summarized 2 chunks" in call.args[0] for call in debug.call_args_list)
+
+
+class TestSummaryCache:
+
+    @pytest.fixture
+    def cache(self, completions, mocker, tmp_path):
+        cache = SummaryCache(str(tmp_path))
+        mocker.patch.object(browse, "summary_cache", cache)
+        mocker.patch.object(browse, "split_text", side_effect=lambda text: iter(text.split("|")))
+        return cache
+
+    def test_page_summaries_are_reused(self, cache, completions):
+        first = summarize_text("a|b", "What is it?")
+        calls = len(completions)
+        assert summarize_text("a|b", "  what is IT ") == first
+        assert len(completions) == calls
+        assert cache.get_stats()["page_hits"] == 1
+
+    def test_chunks_shared_by_pages_are_summarized_once(self, cache, completions):
+        summarize_text("menu|first article", "question")
+        summarize_text("menu|second article", "question")
+        assert completions.count("menu") == 1
+        assert cache.get_stats()["chunk_hits"] >= 1
+
+    @pytest.mark.parametrize("setting, value", [
+        ("browse_summary_top_k", 1), ("browse_chunk_tokens", 100), ("browse_chunk_overlap", 10)])
+    def test_pages_are_cached_per_settings(self, cache, completions, mocker, setting, value):
+        summarize_text("a|b|c", "question")
+        mocker.patch.object(browse.cfg, setting, value)
+        summarize_text("a|b|c", "question")
+        assert cache.get_stats()["page_hits"] == 0
+
+    def test_other_questions_are_not_shared(self, cache, completions):
+        summarize_text("a|b", "first question")
+        summarize_text("a|b", "second question")
+        assert completions.count("a") == 2
+
+
+class TestRelevantChunks:
+
+    @pytest.fixture(autouse=True)
+    def chunks_from_pipes(self, mocker):
+        mocker.patch.object(browse, "split_text", side_effect=lambda text: iter(text.split("|")))
+
+    def test_short_pages_take_one_call(self, completions):
+        assert summarize_text("a short page", "question") == "<a short page>"
+        assert completions == ["a short page"]
+
+    def test_only_the_most_relevant_chunks_are_summarized(self, completions, mocker):
+        mocker.patch.object(browse.cfg, "browse_summary_top_k", 2)
+        text = "our team|pricing starts at 10 dollars|contact|the pricing of plans|careers"
+        summarize_text(text, "What is the pricing?")
+        assert completions[:2] == ["pricing starts at 10 dollars", "the pricing of plans"]
+        assert len(completions) == 3
+
+    def test_top_k_zero_summarizes_every_chunk(self, completions, mocker):
+        mocker.patch.object(browse.cfg, "browse_summary_top_k", 0)
+        summarize_text("a|b|c|d|e|f|g", "question")
+        assert len(completions) == 8
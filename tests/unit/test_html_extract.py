@@ -0,0 +1,51 @@
+import pytest
+import tests.context
+
+from scripts.html_extract import EXTRACTORS, HTMLExtractor, LxmlExtractor, SoupExtractor, get_extractor
+
+HTML = """<!DOCTYPE html>
+<html><head><title>Title</title><style>p { color: red }</style></head>
+<body>
+  <h1>Heading</h1>
+  <p>Some <b>bold</b> text.  Two phrases.</p>
+  <script>var hidden = "not shown";</script>
+  <!-- a comment -->
+  <a href="https://example.com/a">First <i>link</i></a>
+  <a name="anchor">No href</a>
+  <ul><li><a href="/b">Second</a></li></ul>
+  <p>Caf&eacute; &amp; more</p>
+</body></html>"""
+
+
+@pytest.mark.parametrize("name", sorted(EXTRACTORS))
+class TestExtractors:
+
+    def test_text(self, name):
+        text, _ = get_extractor(name).extract(HTML)
+        assert text == "Title\nHeading\nSome bold text.\nTwo phrases.\nFirst link\nNo href\nSecond\nCafé & more"
+
+    def test_links(self, name):
+        _, links = get_extractor(name).extract(HTML)
+        assert links == [("First link", "https://example.com/a"), ("Second", "/b")]
+
+    def test_empty_page(self, name):
+        assert get_extractor(name).extract("") == ("", [])
+
+
+class TestGetExtractor:
+
+    def test_backends(self):
+        assert isinstance(get_extractor("soup"), SoupExtractor)
+        assert isinstance(get_extractor("lxml"), LxmlExtractor)
+
+    def test_falls_back_without_lxml(self, mocker):
+        mocker.patch("scripts.html_extract.etree", None)
+        assert isinstance(get_extractor("lxml"), SoupExtractor)
+
+    def test_base_class_is_abstract(self):
+        with pytest.raises(TypeError):
+            HTMLExtractor()
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            get_extractor("regex")